@@ -1,5 +1,4 @@
 import os
-import time
 import json
 import logging
 import subprocess
@@ -17,6 +16,7 @@ import re
 import uuid
 import asyncio
 from abc import ABC, abstractmethod
+from poll_scheduler import PollScheduler
 
 load_dotenv()
 
@@ -25,11 +25,11 @@ class BaseErrorAnalyzer(ABC):
         self.agent = agent
 
     @abstractmethod
-    async def initial_broadcast(self, ref, timestamp, error_message):
+    async def initial_broadcast(self, ref, timestamp, error_message, incident=None):
         pass
 
     @abstractmethod
-    def extract_info(self, error_message):
+    def extract_info(self, error_message, incident=None):
         pass
 
     @abstractmethod
@@ -73,8 +73,12 @@ class WindowsErrorAnalyzer(BaseErrorAnalyzer):
             self.agent.logger.error(f"Error querying dependencies for {service_name}: {e}")
             return []
 
-    def extract_info(self, error_message: str) -> dict:
-        if not re.search(r"EventID: 7003", error_message):
+    def extract_info(self, error_message: str, incident=None) -> dict:
+        if incident is not None and incident.get("event_id") is not None:
+            is_7003 = str(incident.get("event_id")) == "7003"
+        else:
+            is_7003 = bool(re.search(r"EventID: 7003", error_message))
+        if not is_7003:
             self.agent.logger.debug(f"Skipping non-7003 error log entry: {error_message[:100]}...")
             return {
                 "service_name": None,
@@ -98,44 +102,52 @@ class WindowsErrorAnalyzer(BaseErrorAnalyzer):
             "- 'record_number': the event record number\n"
             "If any information cannot be extracted, set the field to null. Return valid JSON without any explanation."
         )
+        # Fields parsed by the monitor at detection time make the first LLM extraction unnecessary
+        known = None
+        if incident is not None and incident.get("service_name") and incident.get("computer_name"):
+            known = {name: incident.get(name) for name in ("service_name", "dependency", "computer_name", "time_generated", "record_number")}
         try:
-            response = self.agent.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=200
-            )
-            reply_content = response.choices[0].message.content.strip()
-            self.agent.logger.info(f"LLM reply for Windows error (Step 1): {reply_content[:200]}...")
-            try:
-                match = re.search(r"```json\s*(\{.*?\})\s*```", reply_content, re.DOTALL)
-                if match:
-                    json_str = match.group(1)
-                else:
-                    json_str = reply_content
-                result = json.loads(json_str)
-            except json.JSONDecodeError as json_err:
-                self.agent.logger.error(f"JSON parsing error in LLM response: {json_err}, Response: {reply_content[:200]}...")
+            if known is not None:
+                self.agent.logger.info("Using incident fields for Windows error, skipping LLM extraction (Step 1)")
+                result = known
+            else:
+                response = self.agent.client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=[
+                        {"role": "system", "content": "You are a helpful assistant."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=200
+                )
+                reply_content = response.choices[0].message.content.strip()
+                self.agent.logger.info(f"LLM reply for Windows error (Step 1): {reply_content[:200]}...")
                 try:
-                    event_data = json.loads(error_message)
-                    result = {
-                        "service_name": event_data.get("Message", [None, None])[0],
-                        "dependency": event_data.get("Message", [None, None])[1],
-                        "computer_name": event_data.get("ComputerName"),
-                        "time_generated": event_data.get("TimeGenerated"),
-                        "record_number": event_data.get("RecordNumber")
-                    }
-                except json.JSONDecodeError:
-                    self.agent.logger.error(f"Failed to parse error_message as JSON: {error_message[:200]}...")
-                    result = {
-                        "service_name": None,
-                        "dependency": None,
-                        "computer_name": None,
-                        "time_generated": None,
-                        "record_number": None
-                    }
+                    match = re.search(r"```json\s*(\{.*?\})\s*```", reply_content, re.DOTALL)
+                    if match:
+                        json_str = match.group(1)
+                    else:
+                        json_str = reply_content
+                    result = json.loads(json_str)
+                except json.JSONDecodeError as json_err:
+                    self.agent.logger.error(f"JSON parsing error in LLM response: {json_err}, Response: {reply_content[:200]}...")
+                    try:
+                        event_data = json.loads(error_message)
+                        result = {
+                            "service_name": event_data.get("Message", [None, None])[0],
+                            "dependency": event_data.get("Message", [None, None])[1],
+                            "computer_name": event_data.get("ComputerName"),
+                            "time_generated": event_data.get("TimeGenerated"),
+                            "record_number": event_data.get("RecordNumber")
+                        }
+                    except json.JSONDecodeError:
+                        self.agent.logger.error(f"Failed to parse error_message as JSON: {error_message[:200]}...")
+                        result = {
+                            "service_name": None,
+                            "dependency": None,
+                            "computer_name": None,
+                            "time_generated": None,
+                            "record_number": None
+                        }
             service_name = result.get("service_name")
             dependency = result.get("dependency")
             computer_name = result.get("computer_name")
@@ -224,12 +236,13 @@ class WindowsErrorAnalyzer(BaseErrorAnalyzer):
                 "service_details": None
             }
 
-    async def initial_broadcast(self, ref, timestamp, error_message):
+    async def initial_broadcast(self, ref, timestamp, error_message, incident=None):
+        service_name = (incident.get("service_name") if incident is not None else None) or "Unknown"
         await self.agent._async_broadcast(
             "ErrorAnalyzer",
             "error detected",
             timestamp,
-            f"Windows Event ID 7003 detected: Service Unknown failed to start",  # Service name extracted later
+            f"Windows Event ID 7003 detected: Service {service_name} failed to start",
             ref
         )
 
@@ -357,7 +370,7 @@ class WindowsErrorAnalyzer(BaseErrorAnalyzer):
             return final_result
 
 class SnowflakeErrorAnalyzer(BaseErrorAnalyzer):
-    async def initial_broadcast(self, ref, timestamp, error_message):
+    async def initial_broadcast(self, ref, timestamp, error_message, incident=None):
         await self.agent._async_broadcast(
             "ErrorAnalyzer",
             "error detected",
@@ -366,7 +379,7 @@ class SnowflakeErrorAnalyzer(BaseErrorAnalyzer):
             ref
         )
 
-    def extract_info(self, error_message: str) -> dict:
+    def extract_info(self, error_message: str, incident=None) -> dict:
         return {}  # No specific extraction needed; analysis done via LLM
 
     async def analyze_and_broadcast(self, info, error_message, ref, timestamp):
@@ -448,7 +461,9 @@ class SnowflakeErrorAnalyzer(BaseErrorAnalyzer):
             return result
 
 class KubernetesErrorAnalyzer(BaseErrorAnalyzer):
-    def _extract_pod_info(self, error_message: str) -> tuple:
+    def _extract_pod_info(self, error_message: str, incident=None) -> tuple:
+        if incident is not None and incident.get("pod"):
+            return incident.get("pod"), incident.get("namespace"), incident.get("container")
         pattern = r"Container\s+([^\s]+)\s+in\s+pod\s+([^\s]+)/([^\s]+)\s+killed\s+due\s+to\s+OutOfMemory"
         match = re.search(pattern, error_message)
         if match:
@@ -656,16 +671,16 @@ class KubernetesErrorAnalyzer(BaseErrorAnalyzer):
             return None, []
 
 
-    def extract_info(self, error_message: str) -> dict:
-        pod_name, namespace, container_name = self._extract_pod_info(error_message)
+    def extract_info(self, error_message: str, incident=None) -> dict:
+        pod_name, namespace, container_name = self._extract_pod_info(error_message, incident)
         return {
             "pod_name": pod_name,
             "namespace": namespace,
             "container_name": container_name
         }
 
-    async def initial_broadcast(self, ref, timestamp, error_message):
-        pod_name, namespace, container_name = self._extract_pod_info(error_message)  # Preliminary extraction for broadcast
+    async def initial_broadcast(self, ref, timestamp, error_message, incident=None):
+        pod_name, namespace, container_name = self._extract_pod_info(error_message, incident)  # Preliminary extraction for broadcast
         error_details = (
             f"Kubernetes OOMKilled Error Detected\n"
             f"Pod: {pod_name or 'Unknown'}\n"
@@ -750,11 +765,17 @@ class KubernetesErrorAnalyzer(BaseErrorAnalyzer):
         return result
 
 class DatabricksErrorAnalyzer(BaseErrorAnalyzer):
-    def _extract_databricks_info(self, error_message: str) -> dict:
+    def _extract_databricks_info(self, error_message: str, incident=None) -> dict:
         try:
-            # Try parsing as JSON first
-            json_match = re.search(r'\{.*\}', error_message, re.DOTALL)
-            if json_match:
+            # Prefer the fields the monitor parsed at detection, then try parsing the message as JSON
+            known = incident is not None and incident.get('table_name') and incident.get('user_name')
+            json_match = None if known else re.search(r'\{.*\}', error_message, re.DOTALL)
+            if known:
+                table_name = incident.get('table_name')
+                user_name = incident.get('user_name')
+                error_message_text = incident.get('error_message') or ''
+                query_text = incident.get('query_text') or ''
+            elif json_match:
                 event_data = json.loads(json_match.group(0))
                 table_name = event_data.get('table_name', None)
                 user_name = event_data.get('user_name', None)
@@ -796,11 +817,11 @@ class DatabricksErrorAnalyzer(BaseErrorAnalyzer):
                 'required_permission': 'MODIFY'
             }
 
-    def extract_info(self, error_message: str) -> dict:
-        return self._extract_databricks_info(error_message)
+    def extract_info(self, error_message: str, incident=None) -> dict:
+        return self._extract_databricks_info(error_message, incident)
 
-    async def initial_broadcast(self, ref, timestamp, error_message):
-        info = self._extract_databricks_info(error_message)  # Preliminary extraction for broadcast
+    async def initial_broadcast(self, ref, timestamp, error_message, incident=None):
+        info = self._extract_databricks_info(error_message, incident)  # Preliminary extraction for broadcast
         table_name = info.get('table_name')
         user_name = info.get('user_name')
         error_message_text = info.get('error_message')
@@ -992,6 +1013,12 @@ class ErrorAnalyzerAgent(AssistantAgent):
         self.last_position_snowflake = 0
         self.last_position_kubernetes = 0
         self.last_position_databricks = 0
+        self.poll_sources = ["windows", "snowflake", "kubernetes", "databricks"]
+        self.poll_scheduler = PollScheduler(
+            base_interval=10,
+            min_interval=float(os.getenv("ANALYZER_POLL_MIN_SECONDS", "2")),
+            max_interval=float(os.getenv("ANALYZER_POLL_MAX_SECONDS", "60"))
+        )
         self.OPENAI_API_KEY = os.getenv("OPEN_API_KEY")
         self.client = OpenAI(api_key=self.OPENAI_API_KEY)
         self.snowflake_conn = None
@@ -1065,9 +1092,12 @@ class ErrorAnalyzerAgent(AssistantAgent):
             elif not loop.is_running():
                 loop.close()
 
-    async def analyze_error(self, error_message: str, source: str) -> dict:
-        ref_match = re.search(r"Reference:\s*(\S+)", error_message)
-        ref = ref_match.group(1) if ref_match else str(uuid.uuid4())
+    async def analyze_error(self, error_message: str, source: str, incident=None) -> dict:
+        if incident is not None:
+            ref = incident.reference
+        else:
+            ref_match = re.search(r"Reference:\s*(\S+)", error_message)
+            ref = ref_match.group(1) if ref_match else str(uuid.uuid4())
         timestamp = datetime.now().strftime("%H:%M:%S")
         if source not in self.analyzers:
             result = {
@@ -1085,8 +1115,8 @@ class ErrorAnalyzerAgent(AssistantAgent):
             )
             return result
         analyzer = self.analyzers[source]
-        await analyzer.initial_broadcast(ref, timestamp, error_message)
-        info = analyzer.extract_info(error_message)
+        await analyzer.initial_broadcast(ref, timestamp, error_message, incident)
+        info = analyzer.extract_info(error_message, incident)
         result = await analyzer.analyze_and_broadcast(info, error_message, ref, timestamp)
         result["reference"] = ref
         result["source"] = source
@@ -1115,11 +1145,14 @@ class ErrorAnalyzerAgent(AssistantAgent):
             if not os.path.exists(log_file):
                 open(log_file, 'a').close()
         while True:
-            if os.path.exists(self.ERROR_LOG_WINDOWS):
+            due = self.poll_scheduler.due(self.poll_sources)
+            found = dict.fromkeys(due, 0)
+            if "windows" in due and os.path.exists(self.ERROR_LOG_WINDOWS):
                 with open(self.ERROR_LOG_WINDOWS, 'r', encoding='utf-8') as f:
                     f.seek(self.last_position_windows)
                     new_entries = f.read()
                     self.last_position_windows = f.tell()
+                found["windows"] = new_entries.count('-' * 60)
                 if new_entries:
                     errors = new_entries.strip().split('-' * 60)
                     for err in errors:
@@ -1140,11 +1173,12 @@ class ErrorAnalyzerAgent(AssistantAgent):
                         with open("C:/Users/Quadrant/Loganalytics/Backend/fix_queue.json", 'w', encoding='utf-8') as out:
                             json.dump(output, out, indent=4)
                         self.logger.info("Windows analysis written to fix_queue.json")
-            if self.snowflake_conn and os.path.exists(self.ERROR_LOG_SNOWFLAKE):
+            if "snowflake" in due and self.snowflake_conn and os.path.exists(self.ERROR_LOG_SNOWFLAKE):
                 with open(self.ERROR_LOG_SNOWFLAKE, 'r', encoding='utf-8') as f:
                     f.seek(self.last_position_snowflake)
                     new_entries = f.read()
                     self.last_position_snowflake = f.tell()
+                found["snowflake"] = new_entries.count('-' * 60)
                 if new_entries:
                     errors = new_entries.strip().split('-' * 60)
                     for err in errors:
@@ -1162,11 +1196,12 @@ class ErrorAnalyzerAgent(AssistantAgent):
                         with open("C:/Users/Quadrant/Loganalytics/Backend/fix_queue.json", 'w', encoding='utf-8') as out:
                             json.dump(output, out, indent=4)
                         self.logger.info("Snowflake analysis written to fix_queue.json")
-            if os.path.exists(self.ERROR_LOG_KUBERNETES):
+            if "kubernetes" in due and os.path.exists(self.ERROR_LOG_KUBERNETES):
                 with open(self.ERROR_LOG_KUBERNETES, 'r', encoding='utf-8') as f:
                     f.seek(self.last_position_kubernetes)
                     new_entries = f.read()
                     self.last_position_kubernetes = f.tell()
+                found["kubernetes"] = new_entries.count('-' * 60)
                 if new_entries:
                     errors = new_entries.strip().split('-' * 60)
                     for err in errors:
@@ -1188,11 +1223,12 @@ class ErrorAnalyzerAgent(AssistantAgent):
                         with open("C:/Users/Quadrant/Loganalytics/Backend/fix_queue.json", 'w', encoding='utf-8') as out:
                             json.dump(output, out, indent=4)
                         self.logger.info("Kubernetes analysis written to fix_queue.json")
-            if os.path.exists(self.ERROR_LOG_DATABRICKS):
+            if "databricks" in due and os.path.exists(self.ERROR_LOG_DATABRICKS):
                 with open(self.ERROR_LOG_DATABRICKS, 'r', encoding='utf-8') as f:
                     f.seek(self.last_position_databricks)
                     new_entries = f.read()
                     self.last_position_databricks = f.tell()
+                found["databricks"] = new_entries.count('-' * 60)
                 if new_entries:
                     errors = new_entries.strip().split('-' * 60)
                     for err in errors:
@@ -1210,7 +1246,9 @@ class ErrorAnalyzerAgent(AssistantAgent):
                         with open("C:/Users/Quadrant/Loganalytics/Backend/fix_queue.json", 'w', encoding='utf-8') as out:
                             json.dump(output, out, indent=4)
                         self.logger.info("Databricks analysis written to fix_queue.json")
-            time.sleep(10)
+            for source, count in found.items():
+                self.poll_scheduler.record(source, count)
+            self.poll_scheduler.wait_blocking(self.poll_sources)
 
 if __name__ == "__main__":
     llm_config = {"model": "gpt-4o", "api_key": os.getenv("OPEN_API_KEY")}
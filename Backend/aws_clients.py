@@ -0,0 +1,63 @@
+import hashlib
+import os
+import threading
+import boto3
+from botocore.config import Config
+
+# Sized to cover the monitor scan pool plus the forwarder, so concurrent scans never queue for a socket
+MAX_POOL_CONNECTIONS = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "50"))
+CONNECT_TIMEOUT = int(os.getenv("AWS_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = int(os.getenv("AWS_READ_TIMEOUT", "30"))
+
+_lock = threading.Lock()
+_sessions = {}
+_clients = {}
+
+
+def _client_config(governed):
+    return Config(
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        tcp_keepalive=True,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=READ_TIMEOUT,
+        # Calls made through the rate governor must surface every throttle to it, so botocore makes a single attempt
+        # and the governor retries throttles, connection errors, timeouts and 5xx responses itself
+        retries={"total_max_attempts": 1, "mode": "standard"} if governed else {"max_attempts": 3, "mode": "standard"}
+    )
+
+
+def get_client(service, region_name=None, profile_name=None, aws_access_key_id=None, aws_secret_access_key=None, aws_session_token=None, governed=False):
+    """Return the process-wide boto3 client for (service, region, credentials), creating it on first use.
+
+    Pass governed=True for clients whose calls all go through rate_governor.governor, which does the retrying.
+    """
+    # Hashed so rotated secrets or session tokens under the same key ID get a new client without caching the secrets
+    secret_digest = hashlib.sha256(f"{aws_secret_access_key}\0{aws_session_token}".encode("utf-8")).hexdigest()
+    credentials_key = (profile_name, aws_access_key_id, secret_digest)
+    key = (service, region_name, credentials_key, governed)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            # boto3 sessions are not thread-safe to create clients from, so creation stays under the lock
+            session = _sessions.get(credentials_key)
+            if session is None:
+                session = boto3.session.Session(
+                    profile_name=profile_name,
+                    aws_access_key_id=aws_access_key_id,
+                    aws_secret_access_key=aws_secret_access_key,
+                    aws_session_token=aws_session_token
+                )
+                _sessions[credentials_key] = session
+            client = session.client(service, region_name=region_name, config=_client_config(governed))
+            _clients[key] = client
+    return client
+
+
+def clear_clients():
+    """Drop every cached client and session, e.g. after rotating credentials."""
+    with _lock:
+        _clients.clear()
+        _sessions.clear()
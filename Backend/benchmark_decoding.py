@@ -0,0 +1,155 @@
+"""Benchmark KubernetesMonitor.process_event with eager json.loads against LazyEvent decoding.
+
+Usage:
+    python benchmark_decoding.py [recorded_events ...]
+
+Each recorded file may be a filter_log_events/get_log_events JSON dump ({"events": [...]}), or JSON lines
+holding either such events or raw audit messages, in UTF-8 or UTF-16 (as PowerShell writes them). Without
+files, a synthetic mix of OOMKilled status updates, Forbidden and invalid-manifest audit events is used.
+Both runs drive the real monitor path; only the decoder the monitor uses is swapped.
+"""
+import asyncio
+import codecs
+import json
+import logging
+import sys
+import time
+import monitor
+from event_decoder import LazyEvent
+from monitor import KubernetesMonitor
+
+
+class EagerEvent(LazyEvent):
+    """The previous path: the whole message is decoded when the first field is read."""
+    __slots__ = ()
+
+    def path(self, dotted, default=None):
+        self.document()
+        return super().path(dotted, default)
+
+
+def _decode(data):
+    if data.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return data.decode("utf-16")
+    return data.decode("utf-8-sig")
+
+
+def _read_messages(path):
+    with open(path, "rb") as f:
+        text = _decode(f.read())
+    try:
+        data = json.loads(text)
+        records = data.get("events", []) if isinstance(data, dict) else data
+    except json.JSONDecodeError:
+        records = [json.loads(line) for line in text.splitlines() if line.strip()]
+    return [record["message"] if isinstance(record, dict) and "message" in record else json.dumps(record) for record in records]
+
+
+def _pod(name, reason, padding):
+    return {
+        "metadata": {
+            "name": name, "namespace": "demo-app", "uid": "6f1c1f0e-0000-4000-8000-000000000000",
+            "labels": {"app": "stress-demo"},
+            "annotations": {"kubectl.kubernetes.io/last-applied-configuration": padding},
+            "managedFields": [{"manager": "kubelet", "operation": "Update", "fieldsV1": {"f:status": {"f:conditions": {}}}}] * 8
+        },
+        "spec": {"containers": [{"name": "stress", "image": "polinux/stress", "args": ["--vm", "1", "--vm-bytes", "250M"], "resources": {"limits": {"memory": "100Mi"}}}]},
+        "status": {
+            "phase": "Running",
+            "conditions": [{"type": "Ready", "status": "False", "reason": "ContainersNotReady"}],
+            "containerStatuses": [{
+                "name": "stress", "restartCount": 3, "ready": False,
+                "state": {"waiting": {"reason": "CrashLoopBackOff"}},
+                "lastState": {"terminated": {"reason": reason, "exitCode": 137}}
+            }]
+        }
+    }
+
+
+def synthetic_messages(count=5000):
+    padding = "x" * 2048
+    messages = []
+    for i in range(count):
+        kind = i % 4
+        event = {
+            "kind": "Event", "apiVersion": "audit.k8s.io/v1", "level": "RequestResponse", "auditID": f"audit-{i}",
+            "stage": "ResponseComplete", "verb": "patch",
+            "requestURI": f"/api/v1/namespaces/demo-app/pods/stress-demo-{i}/status",
+            "user": {"username": "system:node:ip-10-0-0-1", "groups": ["system:nodes"]},
+            "objectRef": {"resource": "pods", "namespace": "demo-app", "name": f"stress-demo-{i}", "subresource": "status"},
+            "responseStatus": {"metadata": {}, "code": 200}
+        }
+        if kind == 0:
+            event["requestObject"] = _pod(f"stress-demo-{i}", "OOMKilled", padding)
+        elif kind == 1:
+            event["responseStatus"] = {"code": 403, "reason": "Forbidden", "message": "pods is forbidden after OOMKilled restart"}
+        elif kind == 2:
+            event["responseStatus"] = {"code": 422, "message": 'Pod "oom-test" is invalid: OOMKilled limit'}
+        else:
+            event["requestObject"] = _pod(f"stress-demo-{i}", "Completed", padding)
+        event["responseObject"] = _pod(f"stress-demo-{i}", "Completed", padding)
+        messages.append(json.dumps(event))
+    return messages
+
+
+class _Detections:
+    """Stands in for open_incident, recording what the monitor would have raised."""
+
+    def __init__(self):
+        self.found = []
+
+    async def __call__(self, log_group, event, error_message, fields, entity=None):
+        self.found.append((fields["namespace"], fields["pod"], fields["container"]))
+        return None  # No incident: nothing is written, broadcast or queued, and no cooldown starts
+
+
+def _monitor(detections):
+    """A real KubernetesMonitor whose incidents are recorded instead of raised; nothing calls CloudWatch."""
+    logger = logging.getLogger("benchmark_decoding")
+    logger.disabled = True
+    kubernetes = KubernetesMonitor({"region": "us-east-1"}, logger, None, None, None, "semi-autonomous")
+    kubernetes.open_incident = detections
+    return kubernetes
+
+
+async def _process(messages, decoder):
+    detections = _Detections()
+    kubernetes = _monitor(detections)
+    events = [{"timestamp": 0, "logStreamName": "benchmark", "message": msg} for msg in messages]
+    monitor.LazyEvent = decoder
+    try:
+        started = time.perf_counter()
+        for event in events:
+            await kubernetes.process_event("benchmark", event)
+        return time.perf_counter() - started, detections.found
+    finally:
+        monitor.LazyEvent = LazyEvent
+
+
+def run(messages, rounds=5):
+    if not messages:
+        raise SystemExit("No events to benchmark: the recorded files hold no log events")
+    results = {}
+    for name, decoder in (("json.loads", EagerEvent), ("LazyEvent", LazyEvent)):
+        best = None
+        for _ in range(rounds):
+            elapsed, detected = asyncio.run(_process(messages, decoder))
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = (best, detected)
+    full_time, full_detected = results["json.loads"]
+    lazy_time, lazy_detected = results["LazyEvent"]
+    if not full_detected or not lazy_detected:
+        # Detection failing outright (the monitor swallows its own errors) would otherwise pass as agreement
+        raise SystemExit("No OOMKilled containers detected: the benchmark is not exercising the monitor")
+    if full_detected != lazy_detected:
+        raise SystemExit("LazyEvent and json.loads disagree on the detected OOMKilled containers")
+    size = sum(len(msg) for msg in messages)
+    print(f"{len(messages)} events, {size / len(messages):.0f} bytes average, {len(full_detected)} OOMKilled")
+    for name, (elapsed, _) in results.items():
+        print(f"  {name:<10} {elapsed * 1000:8.1f} ms  {elapsed / len(messages) * 1e6:6.1f} us/event")
+    print(f"  speedup    {full_time / lazy_time:8.2f}x")
+
+
+if __name__ == "__main__":
+    paths = sys.argv[1:]
+    run([msg for path in paths for msg in _read_messages(path)] if paths else synthetic_messages())
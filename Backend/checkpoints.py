@@ -0,0 +1,154 @@
+import json
+import logging
+import os
+import threading
+from filelock import FileLock
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+from cloudwatch_reader import LogGroupCursor
+
+
+class CheckpointStore:
+    """Durable per-source, per-log-group cursor checkpoints kept in a JSON file.
+
+    Several processes may share the file, each scanning its own log groups: a save only writes the groups this
+    store has updated since it last released them, merged into what is on disk.
+    """
+    def __init__(self, path, logger=None):
+        self.path = path
+        self.logger = logger or logging.getLogger("MONITOR")
+        self.file_lock = FileLock(self.path + ".lock")
+        self.lock = threading.Lock()
+        self.owned = {}  # source -> log groups whose checkpoints this store writes
+        self.checkpoints = self.load()
+
+    def load(self):
+        """Load checkpoints from disk, starting empty if the file is missing or corrupt."""
+        try:
+            with self.file_lock:
+                return self._read()
+        except json.JSONDecodeError as e:
+            self.logger.error(f"Failed to parse checkpoint file {self.path}: {e}. Starting without checkpoints")
+            return {}
+        except Exception as e:
+            self.logger.error(f"Failed to load checkpoints from {self.path}: {e}")
+            return {}
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def reload(self):
+        """Re-read the file, e.g. before adopting log groups another process was scanning."""
+        checkpoints = self.load()
+        with self.lock:
+            for source, groups in self.owned.items():
+                for log_group in groups:
+                    if log_group in self.checkpoints.get(source, {}):
+                        checkpoints.setdefault(source, {})[log_group] = self.checkpoints[source][log_group]
+            self.checkpoints = checkpoints
+
+    def release(self, source, log_groups):
+        """Stop writing checkpoints for log groups that another process now scans."""
+        with self.lock:
+            self.owned.get(source, set()).difference_update(log_groups)
+
+    def cursors(self, source):
+        """Return the stored cursors for a source as LogGroupCursor objects keyed by log group."""
+        with self.lock:
+            groups = dict(self.checkpoints.get(source, {}))
+        return {
+            log_group: LogGroupCursor(entry.get("timestamp", 0), entry.get("event_ids", []), streams=entry.get("streams"))
+            for log_group, entry in groups.items()
+        }
+
+    def update(self, source, cursors):
+        """Record the current cursors for a source in memory."""
+        snapshot = {
+            log_group: {
+                "timestamp": cursor.timestamp,
+                "event_ids": {event_id: ts for event_id, ts in list(cursor.seen.items()) if ts >= cursor.start},
+                "streams": dict(cursor.streams)
+            }
+            for log_group, cursor in list(cursors.items())
+        }
+        with self.lock:
+            self.checkpoints.setdefault(source, {}).update(snapshot)
+            self.owned.setdefault(source, set()).update(snapshot)
+
+    def save(self):
+        """Atomically write this store's checkpoints to disk, keeping the other entries already there."""
+        tmp_path = self.path + ".tmp"
+        try:
+            with self.file_lock:
+                try:
+                    merged = self._read()
+                except json.JSONDecodeError:
+                    merged = {}
+                with self.lock:
+                    for source, groups in self.owned.items():
+                        for log_group in groups:
+                            merged.setdefault(source, {})[log_group] = self.checkpoints[source][log_group]
+                    self.checkpoints = merged
+                    data = json.dumps(merged, indent=4)
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(data)
+                os.replace(tmp_path, self.path)
+        except Exception as e:
+            self.logger.error(f"Failed to save checkpoints to {self.path}: {e}")
+
+
+class MongoCheckpointStore(CheckpointStore):
+    """CheckpointStore kept in a MongoDB collection, so a replica on another host can resume a log group where its
+    previous owner stopped.
+
+    One document per source and log group. Event IDs and stream marks are stored as [key, value] pairs, since
+    stream names may contain characters MongoDB does not allow in field names.
+    """
+    def __init__(self, collection, logger=None):
+        self.collection = collection
+        self.logger = logger or logging.getLogger("MONITOR")
+        self.lock = threading.Lock()
+        self.owned = {}
+        self.checkpoints = self.load()
+
+    def load(self):
+        """Load checkpoints from the collection, starting empty if it cannot be read."""
+        try:
+            return self._read()
+        except PyMongoError as e:
+            self.logger.error(f"Failed to load checkpoints from {self.collection.name}: {e}")
+            return {}
+
+    def _read(self):
+        checkpoints = {}
+        for doc in self.collection.find({}):
+            checkpoints.setdefault(doc["source"], {})[doc["log_group"]] = {
+                "timestamp": doc.get("timestamp", 0),
+                "event_ids": {event_id: ts for event_id, ts in doc.get("event_ids", [])},
+                "streams": {stream: mark for stream, mark in doc.get("streams", [])}
+            }
+        return checkpoints
+
+    def save(self):
+        """Write the checkpoints of the log groups this store owns."""
+        writes = []
+        with self.lock:
+            for source, groups in self.owned.items():
+                for log_group in groups:
+                    entry = self.checkpoints[source][log_group]
+                    writes.append(UpdateOne({"_id": f"{source}\t{log_group}"}, {"$set": {
+                        "source": source,
+                        "log_group": log_group,
+                        "timestamp": entry["timestamp"],
+                        "event_ids": [[event_id, ts] for event_id, ts in entry["event_ids"].items()],
+                        "streams": [[stream, mark] for stream, mark in entry["streams"].items()]
+                    }}, upsert=True))
+        if not writes:
+            return
+        try:
+            self.collection.bulk_write(writes, ordered=False)
+        except PyMongoError as e:
+            self.logger.error(f"Failed to save checkpoints to {self.collection.name}: {e}")
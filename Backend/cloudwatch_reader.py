@@ -0,0 +1,177 @@
+import time
+import zlib
+from rate_governor import governor
+
+
+def event_key(event):
+    """Return the de-duplication key of an event, the same whether it was polled, streamed or found by Insights.
+
+    filter_log_events, live tail and Logs Insights each identify events differently (eventId, none, @ptr), so
+    events are keyed on what all three return: timestamp, log stream and message.
+    """
+    message = event.get("message") or ""
+    return f"{event.get('timestamp', 0)}:{event.get('logStreamName')}:{zlib.crc32(message.encode('utf-8')):08x}"
+
+
+class LogGroupCursor:
+    """Watermarks for one CloudWatch log group.
+
+    timestamp is the high-water mark (newest event time consumed or scanned). Each log stream also keeps its
+    own watermark, and reads start allowed_lateness before the oldest stream watermark still active, so events
+    ingested late or out of order are fetched again and de-duplicated by the event keys seen since then.
+    """
+    def __init__(self, timestamp, event_ids=None, allowed_lateness=0, stream_idle=120000, streams=None):
+        self.timestamp = timestamp
+        # event_key() -> timestamp for events at or after start; older checkpoints store a plain list of keys
+        self.seen = dict(event_ids) if isinstance(event_ids, dict) else {event_id: timestamp for event_id in event_ids or ()}
+        self.streams = dict(streams or {})  # logStreamName -> newest event time consumed from it
+        self.allowed_lateness = allowed_lateness
+        self.stream_idle = stream_idle  # Streams quiet for longer stop holding back the read start
+        self.start = timestamp
+        self.prune_at = 1024
+        self.refresh()
+
+    @property
+    def event_ids(self):
+        return set(self.seen)
+
+    def refresh(self):
+        """Recompute where reads start and forget stream marks and event IDs that fell behind it."""
+        floor = self.timestamp
+        idle_before = self.timestamp - self.stream_idle
+        for stream, mark in list(self.streams.items()):
+            if mark < idle_before:
+                del self.streams[stream]
+            elif mark < floor:
+                floor = mark
+        self.start = floor - self.allowed_lateness
+        if len(self.seen) > self.prune_at:
+            self.seen = {event_id: ts for event_id, ts in self.seen.items() if ts >= self.start}
+            self.prune_at = max(1024, 2 * len(self.seen))
+
+    def is_new(self, event):
+        """Return True if the event is inside the read window and has not been consumed yet."""
+        return event.get("timestamp", 0) >= self.start and event_key(event) not in self.seen
+
+    def advance(self, event):
+        """Record an event as consumed; returns how many milliseconds it arrived behind the high-water mark."""
+        timestamp = event.get("timestamp", 0)
+        lateness = self.timestamp - timestamp
+        self.seen[event_key(event)] = timestamp
+        if timestamp > self.timestamp:
+            self.timestamp = timestamp
+        stream = event.get("logStreamName")
+        if stream is not None and timestamp > self.streams.get(stream, timestamp - 1):
+            self.streams[stream] = timestamp
+        self.refresh()
+        return max(0, lateness)
+
+    def skip_to(self, timestamp):
+        """Move the high-water mark past a fully scanned time slice that ended at timestamp."""
+        if timestamp + 1 > self.timestamp:
+            self.timestamp = timestamp + 1
+            self.refresh()
+
+
+class IncrementalLogReader:
+    """Paginated filter_log_events reader that only returns events newer than each log group's cursor.
+
+    With reorder_delay_ms set, events newer than end_time - reorder_delay_ms are held back (and fetched again on
+    the next read) so stragglers ingested just behind them are returned first, in timestamp order. At most
+    reorder_max_events are held per log group; beyond that the oldest are released anyway.
+    """
+    def __init__(self, cloudwatch, start_time=None, allowed_lateness_ms=0, reorder_delay_ms=0, reorder_max_events=1000, stream_idle_ms=120000):
+        self.cloudwatch = cloudwatch
+        self.start_time = start_time if start_time is not None else int(time.time() * 1000)
+        self.cursors = {}
+        self.allowed_lateness_ms = allowed_lateness_ms
+        self.reorder_delay_ms = reorder_delay_ms
+        self.reorder_max_events = reorder_max_events
+        self.stream_idle_ms = stream_idle_ms
+        self.held = {}  # log_group -> events held back by the last read
+        self.stats = {"late_events": 0, "max_lateness_ms": 0, "total_lateness_ms": 0, "forced_releases": 0}
+
+    def configure(self, allowed_lateness_ms=None, reorder_delay_ms=None, reorder_max_events=None, stream_idle_ms=None):
+        """Change the lateness settings, applying them to existing cursors too."""
+        if allowed_lateness_ms is not None:
+            self.allowed_lateness_ms = allowed_lateness_ms
+        if reorder_delay_ms is not None:
+            self.reorder_delay_ms = reorder_delay_ms
+        if reorder_max_events is not None:
+            self.reorder_max_events = reorder_max_events
+        if stream_idle_ms is not None:
+            self.stream_idle_ms = stream_idle_ms
+        for cursor in self.cursors.values():
+            self._apply_settings(cursor)
+
+    def _apply_settings(self, cursor):
+        # Held-back events must stay inside the read window even after a slice is skipped past them
+        cursor.allowed_lateness = max(self.allowed_lateness_ms, self.reorder_delay_ms)
+        cursor.stream_idle = self.stream_idle_ms
+        cursor.refresh()
+
+    def cursor(self, log_group):
+        """Return the cursor for a log group, creating it at the reader's start time."""
+        if log_group not in self.cursors:
+            self.restore(log_group, LogGroupCursor(self.start_time))
+        return self.cursors[log_group]
+
+    def restore(self, log_group, cursor):
+        """Install a cursor loaded from a checkpoint."""
+        self._apply_settings(cursor)
+        self.cursors[log_group] = cursor
+
+    def read(self, log_group, filter_pattern=None, end_time=None):
+        """Read every page of new events for a log group, ordered by timestamp then event ID."""
+        cursor = self.cursor(log_group)
+        end_time = end_time if end_time is not None else int(time.time() * 1000)
+        kwargs = {
+            "logGroupName": log_group,
+            "startTime": max(0, cursor.start),
+            "endTime": end_time,
+        }
+        if filter_pattern:
+            kwargs["filterPattern"] = filter_pattern
+        events = []
+        while True:
+            response = governor.call(self.cloudwatch, "filter_log_events", **kwargs)
+            events.extend(event for event in response.get("events", []) if cursor.is_new(event))
+            next_token = response.get("nextToken")
+            if not next_token or next_token == kwargs.get("nextToken"):
+                break
+            kwargs["nextToken"] = next_token
+        events.sort(key=lambda event: (event.get("timestamp", 0), event.get("eventId", "")))
+        if self.reorder_delay_ms and events:
+            release_until = end_time - self.reorder_delay_ms
+            ready = sum(1 for event in events if event.get("timestamp", 0) <= release_until)
+            if len(events) - ready > self.reorder_max_events:
+                self.stats["forced_releases"] += len(events) - ready - self.reorder_max_events
+                ready = len(events) - self.reorder_max_events
+            self.held[log_group] = len(events) - ready
+            events = events[:ready]
+        return events
+
+    def advance(self, log_group, event):
+        """Record an event as consumed for its log group."""
+        lateness = self.cursor(log_group).advance(event)
+        if lateness:
+            self.stats["late_events"] += 1
+            self.stats["total_lateness_ms"] += lateness
+            self.stats["max_lateness_ms"] = max(self.stats["max_lateness_ms"], lateness)
+
+    def skip_to(self, log_group, timestamp):
+        """Record that a log group has been fully scanned up to timestamp."""
+        self.cursor(log_group).skip_to(timestamp)
+
+    def get_stats(self):
+        """Return lateness of out-of-order events consumed so far and the current reorder backlog."""
+        late = self.stats["late_events"]
+        return {
+            "late_events": late,
+            "max_lateness_ms": self.stats["max_lateness_ms"],
+            "mean_lateness_ms": round(self.stats["total_lateness_ms"] / late, 1) if late else 0,
+            "held_events": sum(self.held.values()),
+            "forced_releases": self.stats["forced_releases"],
+            "allowed_lateness_ms": self.allowed_lateness_ms,
+            "tracked_streams": sum(len(cursor.streams) for cursor in list(self.cursors.values()))
+        }
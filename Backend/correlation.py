@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import threading
+from bisect import bisect_left, bisect_right
+from dataclasses import replace
+
+# Incident fields that identify a shared resource, by join key kind; a key needs every field of one of its tuples
+JOIN_FIELDS = {
+    "host": (("computer_name",), ("node",)),
+    "pod": (("namespace", "pod"),),
+    "user": (("user_name",),),
+    "table": (("table_name",),),
+}
+# Fields naming what an incident's remediation acts on. Incidents from the same source only join when these all
+# match, so two pods, services or tables behind one shared key are each still analysed and remediated.
+RESOURCE_FIELDS = ("computer_name", "service_name", "node", "namespace", "pod", "container", "table_name", "warehouse_name", "database_name", "user_name")
+
+
+def join_keys(incident):
+    """Return the (kind, value) keys an incident can be joined on."""
+    keys = set()
+    for kind, alternatives in JOIN_FIELDS.items():
+        for names in alternatives:
+            values = [incident.get(name) for name in names]
+            if all(values):
+                keys.add((kind, "/".join(str(value).lower() for value in values)))
+    return keys
+
+
+def resource_of(incident):
+    """Return the source and resource an incident's remediation acts on."""
+    return incident.source, tuple((name, str(incident.get(name)).lower()) for name in RESOURCE_FIELDS if incident.get(name))
+
+
+class CorrelatedGroup:
+    """Incidents that share a host, pod, user or table within the window, across sources or on one resource."""
+    __slots__ = ("reference", "primary", "related", "members", "keys", "resources", "first_seen", "last_seen", "released")
+
+    def __init__(self, primary, keys):
+        self.reference = primary.reference
+        self.primary = primary
+        self.related = []
+        self.members = {}  # source -> (incident, release) analysed for that source when the group is released
+        self.keys = set(keys)
+        self.resources = {primary.source: resource_of(primary)}  # source -> the one resource joined from it
+        self.first_seen = primary.detected_at
+        self.last_seen = primary.detected_at
+        self.released = False
+
+    def accepts(self, incident):
+        """True while the group is held and the incident comes from another source or the same resource."""
+        if self.released:
+            return False
+        resource = self.resources.get(incident.source)
+        return resource is None or resource == resource_of(incident)
+
+    def incident(self, window_seconds, member=None):
+        """A member's incident (the primary by default), with the group's other incidents appended to its summary."""
+        member = member or self.primary
+        others = [incident for incident in [self.primary] + self.related if incident is not member]
+        if not others:
+            return member
+        lines = [
+            f"- [{incident.source}] {incident.summary.splitlines()[0] if incident.summary else ''} (Ref: {incident.reference})"
+            for incident in others
+        ]
+        shared = ", ".join(sorted(f"{kind}={value}" for kind, value in self.keys))
+        summary = f"{member.summary}\n\nCorrelated incidents within {window_seconds}s ({shared}):\n" + "\n".join(lines)
+        fields = dict(member.fields, correlated_references=[incident.reference for incident in others])
+        return replace(member, summary=summary, fields=fields)
+
+
+class IncidentCorrelator:
+    """Joins new incidents to recent ones sharing a join key, so one root cause gets one analysis.
+
+    Each join key keeps a time-ordered index of the groups seen under it; an incident detected within
+    window_seconds of an indexed entry joins that entry's group. The first incident of a group is held for
+    hold_seconds so near-simultaneous incidents from other sources are included before it is analysed. Only
+    held groups take new incidents: once a group is released for analysis, a related incident starts its own.
+    On release, the first incident of every source in the group is analysed for that source, each with the
+    others as context, so every joined source still reaches its own remediator.
+    """
+    def __init__(self, window_seconds=300, hold_seconds=5, max_related=20, logger=None):
+        self.window_seconds = window_seconds
+        self.hold_seconds = hold_seconds
+        self.max_related = max_related
+        self.logger = logger or logging.getLogger("MONITOR")
+        self.index = {}  # join key -> ([detected_at, ...], [group, ...]) sorted by time
+        self.high_water = 0.0
+        self.lock = threading.Lock()
+        self.tasks = set()
+        self.flushed = None
+        self.stats = {"groups": 0, "correlated": 0}
+
+    def _expire(self):
+        cutoff = self.high_water - self.window_seconds
+        for key in list(self.index):
+            times, groups = self.index[key]
+            stale = bisect_left(times, cutoff)
+            if stale:
+                del times[:stale]
+                del groups[:stale]
+            if not times:
+                del self.index[key]
+
+    def _related_group(self, incident, keys, timestamp):
+        best = None
+        for key in keys:
+            entry = self.index.get(key)
+            if entry is None:
+                continue
+            times, groups = entry
+            low = bisect_left(times, timestamp - self.window_seconds)
+            high = bisect_right(times, timestamp + self.window_seconds)
+            for group in groups[low:high]:
+                if not group.accepts(incident):
+                    continue
+                if best is None or group.first_seen < best.first_seen:
+                    best = group
+        return best
+
+    def correlate(self, incident):
+        """Return (group, is_primary); is_primary is False when the incident joined an existing group."""
+        keys = join_keys(incident)
+        timestamp = incident.detected_at
+        with self.lock:
+            self.high_water = max(self.high_water, timestamp)
+            self._expire()
+            group = self._related_group(incident, keys, timestamp)
+            is_primary = group is None
+            if is_primary:
+                group = CorrelatedGroup(incident, keys)
+                # Without a hold the incident is analysed at once, so nothing can join it afterwards
+                group.released = self.hold_seconds <= 0
+                self.stats["groups"] += 1
+            else:
+                if len(group.related) < self.max_related:
+                    group.related.append(incident)
+                group.resources.setdefault(incident.source, resource_of(incident))
+                group.keys |= keys
+                group.last_seen = max(group.last_seen, timestamp)
+                self.stats["correlated"] += 1
+            for key in keys:
+                times, groups = self.index.setdefault(key, ([], []))
+                position = bisect_right(times, timestamp)
+                times.insert(position, timestamp)
+                groups.insert(position, group)
+        return group, is_primary
+
+    def attach(self, group, incident, release):
+        """Have a joined incident analysed for its own source, with the group as context, when the group is released.
+
+        Returns False when the group already has an analysis for the incident's source, which then covers it:
+        incidents from one source only join a group when they act on the same resource.
+        """
+        with self.lock:
+            if incident.source == group.primary.source or incident.source in group.members:
+                return False
+            group.members[incident.source] = (incident, release)
+            return True
+
+    def hold(self, group, release):
+        """Run async release(incident) with the group's correlated incident once its hold time has passed."""
+        if self.flushed is None:
+            self.flushed = asyncio.Event()
+        task = asyncio.ensure_future(self._release(group, release))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _release(self, group, release):
+        try:
+            await asyncio.wait_for(self.flushed.wait(), timeout=self.hold_seconds)
+        except asyncio.TimeoutError:
+            pass
+        with self.lock:
+            group.released = True
+            releases = [(group.incident(self.window_seconds), release)] + [
+                (group.incident(self.window_seconds, member), member_release)
+                for member, member_release in group.members.values()
+            ]
+        if group.related:
+            self.logger.info(f"Correlated {len(group.related)} incidents into {group.reference}")
+        for incident, incident_release in releases:
+            try:
+                await incident_release(incident)
+            except Exception as e:
+                self.logger.error(f"Failed to release correlated incident {incident.reference}: {e}")
+
+    async def flush(self):
+        """Release every held group now, e.g. on shutdown."""
+        if self.flushed is not None:
+            self.flushed.set()
+        if self.tasks:
+            await asyncio.gather(*list(self.tasks), return_exceptions=True)
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, join_keys=len(self.index), held=len(self.tasks))
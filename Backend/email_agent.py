@@ -18,6 +18,7 @@ import ssl
 import http.client
 import time
 import re
+from incident import Incident
 
 load_dotenv()
 
@@ -118,14 +119,14 @@ class EmailAgent(AssistantAgent):
         raw = base64.urlsafe_b64encode(message.as_bytes()).decode()
         return {'raw': raw}
 
-    async def send_email(self, error_message, reference, source):
+    async def send_email(self, error_message, reference, source, incident=None):
         """Draft and send email to human for approval with retry."""
         max_retries = 3
         retry_delay = 2
         for attempt in range(max_retries):
             try:
                 subject = f"Error Detected - Approval Required (Ref: {reference})"
-                error_summary = error_message.split('\nReference:')[0].strip()
+                error_summary = incident.summary if incident is not None else error_message.split('\nReference:')[0].strip()
                 body = (
                     f"Dear User,\n\n"
                     f"We have detected an error from the {source} source:\n\n"
@@ -160,6 +161,8 @@ class EmailAgent(AssistantAgent):
                     "message_id": message_id,
                     "timestamp": datetime.now().isoformat()
                 }
+                if incident is not None:
+                    self.pending_requests[reference]["incident"] = incident.to_dict()
                 self.save_pending_requests()
                 await self.broadcast_message(
                     agent="EmailAgent",
@@ -318,9 +321,11 @@ class EmailAgent(AssistantAgent):
                 
                 if self.analyzer_agent:
                     self.analyzer_agent.logger.info(f"AnalyzerAgent triggered for approved error (Ref: {reference})")
+                    incident = Incident.from_dict(request['incident']) if request.get('incident') else None
                     analysis_result = await self.analyzer_agent.analyze_error(
                         request['error_message'],
-                        source=request['source']
+                        source=request['source'],
+                        incident=incident
                     )
                     analysis_timestamp = datetime.now().strftime("%H:%M:%S")
                     analysis_details = f"Root cause identified: {analysis_result.get('root_cause', 'Unknown')}"
@@ -338,6 +343,8 @@ class EmailAgent(AssistantAgent):
                         "remediation_steps": analysis_result.get('remediation_steps', []),
                         "source": request['source']
                     }
+                    if incident is not None:
+                        output["incident"] = incident.to_dict()
                     if request['source'] == "kubernetes":
                         output["manifest_file"] = analysis_result.get("manifest_file", None)
                     with open(f"C:/Users/Quadrant/Loganalytics/Backend/fix_queue.json", 'w', encoding='utf-8') as out:
@@ -365,10 +372,10 @@ class EmailAgent(AssistantAgent):
         if self.ws_manager:
             await self.ws_manager.broadcast(message)
 
-    async def handle_error(self, error_message, source, reference):
+    async def handle_error(self, error_message, source, reference, incident=None):
         """Handle error received from MonitorAgent."""
         try:
-            success = await self.send_email(error_message, reference, source)
+            success = await self.send_email(error_message, reference, source, incident)
             if success:
                 self.logger.info(f"Error handled and email sent for reference {reference}")
             else:
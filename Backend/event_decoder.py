@@ -0,0 +1,118 @@
+import json
+import re
+
+_DECODER = json.JSONDecoder()
+_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+_MISSING = object()
+_COLON = re.compile(r'\s*:\s*')
+_NON_BRACKETS = bytes(code for code in range(256) if code not in b"{}[]")
+
+
+def _depth(raw, start, end):
+    """Nesting depth at raw[end] inside the value opening at raw[start], or 0 once that value has closed.
+
+    Brackets inside string values are ignored.
+    """
+    span = raw[start:end]
+    # Without escapes every other quote opens a string, and splitting on quotes is far cheaper than a regex scan
+    span = _STRING.sub("", span) if "\\" in span else "".join(span.split('"')[::2])
+    depth = span.count("{") + span.count("[") - span.count("}") - span.count("]")
+    if depth != 1 or start == 0:
+        return depth
+    # The net depth alone cannot tell a key of this object from one in a later sibling object
+    depth = 0
+    for bracket in span.encode().translate(None, _NON_BRACKETS):
+        depth += 1 if bracket in b"{[" else -1
+        if depth == 0:
+            return 0
+    return depth
+
+
+class LazyEvent:
+    """A raw JSON log message decoded only as far as detection needs.
+
+    Keys are located in the raw text and only the value of the requested path is decoded, so a multi-kilobyte
+    audit event can be prefiltered and classified without materialising the whole document.
+    """
+    __slots__ = ("raw", "_values", "_document")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self._values = {}  # dotted path -> decoded value
+        self._document = None
+
+    def contains(self, *needles):
+        """Cheap substring prefilter on the undecoded message: True if any needle occurs."""
+        return any(needle in self.raw for needle in needles)
+
+    def _find(self, key, parent):
+        """Return the offset of key's value directly inside the object whose value starts at parent, or -1."""
+        raw = self.raw
+        quoted = f'"{key}"'
+        position = parent
+        while True:
+            # str.find is far cheaper than a regex scan; quotes inside string values are always escaped
+            start = raw.find(quoted, position)
+            if start < 0:
+                return -1
+            position = start + len(quoted)
+            colon = _COLON.match(raw, position)
+            if colon is None or raw[start - 1] == "\\":
+                continue
+            depth = _depth(raw, parent, start)
+            if depth == 1:
+                return colon.end()
+            if depth < 1:
+                return -1  # Past the end of the parent object
+
+    def path(self, dotted, default=None):
+        """Decode the value at a dotted path such as 'requestObject.status.containerStatuses'."""
+        if dotted not in self._values:
+            self._values[dotted] = self._resolve(dotted.split("."))
+        value = self._values[dotted]
+        return default if value is _MISSING else value
+
+    def _resolve(self, keys):
+        start = len(self.raw) - len(self.raw.lstrip())
+        if self._document is not None or not self.raw.startswith("{", start):
+            return _walk(self.document(), keys)  # Raises JSONDecodeError for messages that are not JSON
+        # Each key is located inside the span of its parent's value, so only the leaf value is ever decoded
+        parent = start
+        for level, key in enumerate(keys):
+            offset = self._find(key, parent)
+            if offset < 0:
+                if level == 0:
+                    return _MISSING
+                # Decoding the parent raises for a truncated message rather than reading the key as absent
+                return _walk(_DECODER.raw_decode(self.raw, parent)[0], keys[level:])
+            if level < len(keys) - 1 and not self.raw.startswith("{", offset):
+                return _MISSING
+            parent = offset
+        return _DECODER.raw_decode(self.raw, parent)[0]
+
+    def get(self, key, default=None):
+        """Decode a single top-level field."""
+        return self.path(key, default)
+
+    def field(self, dotted):
+        """Value at a dotted path, or None when it is missing or the message is not JSON."""
+        if not self.raw.lstrip().startswith(("{", "[")):
+            return None  # Plain text, e.g. a syslog line; never attempt a decode
+        try:
+            return self.path(dotted)
+        except ValueError:
+            return None
+
+    def document(self):
+        """Decode the whole message, for handlers that need most of its fields."""
+        if self._document is None:
+            self._document = json.loads(self.raw)
+        return self._document
+
+
+def _walk(value, keys):
+    for key in keys:
+        if not isinstance(value, dict) or key not in value:
+            return _MISSING
+        value = value[key]
+    return value
@@ -0,0 +1,254 @@
+import logging
+import re
+import threading
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from rule_compiler import AllWords, Contains, FieldCompare, compile_condition
+
+
+@dataclass(frozen=True)
+class PatternTerm:
+    """One CloudWatch filter-pattern clause: a JSON selector expression or a literal text term."""
+    kind: str  # 'json' or 'text'
+    expression: str
+    log_group_suffix: Optional[str] = None  # Only applies to log groups ending with this suffix
+    # For JSON clauses: text terms, one of which every matching event contains, used when OR-ed with text clauses
+    fallback: Tuple[str, ...] = ()
+
+    def applies_to(self, log_group):
+        return self.log_group_suffix is None or log_group.rstrip("/").endswith(self.log_group_suffix)
+
+
+# Sources forwarded into one log group per record type, named after the record's top-level key: a
+# /snowflake/QUERY_HISTORY log group holds {"QUERY_HISTORY": {...}} records only
+PER_VIEW_SOURCES = {"snowflake"}
+
+
+def _view_suffix(data_source, path):
+    """Return the log group suffix of the only log groups whose records can carry path, or None for any."""
+    if data_source in PER_VIEW_SOURCES and "." in path:
+        return "/" + path.split(".", 1)[0]
+    return None
+
+
+def _json(expression, fallback=(), log_group_suffix=None):
+    return PatternTerm("json", expression, log_group_suffix, tuple(fallback))
+
+
+def _text(term, log_group_suffix=None):
+    return PatternTerm("text", term, log_group_suffix)
+
+
+def _spellings(text):
+    """Spellings of a literal to push down: CloudWatch matches terms case-sensitively, the rule predicates do not."""
+    return list(dict.fromkeys([text, text.lower(), text.upper(), text[:1].upper() + text[1:].lower()]))
+
+
+def _json_value(value):
+    return value if re.fullmatch(r"-?\d+(?:\.\d+)?", value) else '"' + value.replace('"', '\\"') + '"'
+
+
+def predicate_terms(predicate, data_source=None):
+    """Translate a compiled rule predicate into PatternTerms matching at least every event it matches, or None.
+
+    Field terms of a per-view source only apply to the log group of the view their field belongs to.
+    """
+    if isinstance(predicate, FieldCompare):
+        if predicate.op != "=" or (predicate.number is not None and not predicate.literals):
+            # Ranges, inequalities and scaled numbers need the field's value: keep every event that has the field
+            return [_text(path.split(".")[-1], _view_suffix(data_source, path)) for path, _ in predicate.paths]
+        if predicate.number is not None:
+            values = predicate.literals
+        else:
+            values = [spelling for value in predicate.spellings for spelling in _spellings(value)]
+        values = list(dict.fromkeys(values))
+        return [
+            _json(f"$.{path} = {_json_value(value)}", [value], _view_suffix(data_source, path))
+            for path, _ in predicate.paths for value in values
+        ]
+    if isinstance(predicate, Contains):
+        return [_text(spelling) for substring in predicate.spellings for spelling in _spellings(substring)]
+    if isinstance(predicate, AllWords):
+        # Every word must appear, so any one of them selects a superset; the longest is the most selective
+        return [_text(spelling) for spelling in _spellings(max(predicate.spellings, key=len))]
+    return None
+
+
+def sampler_terms(sampler, data_source=None):
+    """Translate a metric sampler into text terms matching every event it can take a sample from.
+
+    Sustained rules need the samples under the threshold too, so the terms select the metric's fields and
+    name rather than its value.
+    """
+    terms = [_text(path.split(".")[-1], _view_suffix(data_source, path)) for path, _ in sampler.paths]
+    terms.extend(_text(start.split(".")[-1], _view_suffix(data_source, start)) for start, _, _ in sampler.spans)
+    # The message-text fallback needs every subject word, so the longest one selects a superset
+    terms.extend(_text(spelling) for spelling in _spellings(max(sampler.words, key=len)))
+    return terms
+
+
+def translate_condition(data_source, condition):
+    """Translate a rule condition into PatternTerms, or None if it cannot be pushed down to CloudWatch.
+
+    The terms come from the condition's compiled predicate, or its metric sampler for sustained rules, so the
+    server-side filter never drops an event the rule would match locally. A rule no event can match needs no
+    terms.
+    """
+    predicate, aggregation = compile_condition(data_source, condition)
+    if predicate is not None:
+        return predicate_terms(predicate, data_source)
+    sampler = getattr(aggregation, "sampler", None)
+    return sampler_terms(sampler, data_source) if sampler is not None else []
+
+
+def _quote_text(term):
+    if re.fullmatch(r"[A-Za-z0-9_]+", term):
+        return term
+    return '"' + term.replace('"', '\\"') + '"'
+
+
+MAX_FILTER_PATTERN_LENGTH = 1024  # FilterLogEvents rejects longer patterns
+
+
+def build_filter_pattern(terms):
+    """Combine terms into one filter pattern matching any of them, or None when they cannot be combined."""
+    terms = list(dict.fromkeys(terms))
+    if not terms:
+        return None
+    kinds = {term.kind for term in terms}
+    if kinds == {"json", "text"}:
+        # JSON and text clauses cannot be OR-ed in one pattern, so JSON clauses fall back to their text terms
+        if any(term.kind == "json" and not term.fallback for term in terms):
+            return None
+        terms = list(dict.fromkeys(
+            fallback for term in terms for fallback in ((_text(text) for text in term.fallback) if term.kind == "json" else [term])
+        ))
+        kinds = {"text"}
+    if kinds == {"json"}:
+        if len(terms) == 1:
+            pattern = f"{{ {terms[0].expression} }}"
+        else:
+            pattern = "{ " + " || ".join(f"({term.expression})" for term in terms) + " }"
+    elif kinds == {"text"}:
+        if len(terms) == 1:
+            pattern = _quote_text(terms[0].expression)
+        else:
+            pattern = " ".join(f"?{_quote_text(term.expression)}" for term in terms)
+    else:
+        return None
+    return pattern if len(pattern) <= MAX_FILTER_PATTERN_LENGTH else None
+
+
+_JSON_COMPARISON = re.compile(r"^\$\.([\w.]+)\s*(=|!=|>=|<=|>|<)\s*(.+)$")
+
+
+def _insights_regex(text):
+    return "/" + re.escape(text).replace("/", "\\/") + "/"
+
+
+def to_insights_expression(term):
+    """Translate a PatternTerm into a Logs Insights filter expression, or None if it has no equivalent."""
+    if term.kind == "text":
+        return f"@message like {_insights_regex(term.expression)}"
+    match = _JSON_COMPARISON.match(term.expression.strip())
+    if not match:
+        return None
+    field, op, value = match.groups()
+    if value.startswith('"') and value.endswith('"') and "*" in value:
+        # Filter-pattern wildcards become a substring match on the discovered JSON field
+        parts = [part for part in value[1:-1].split("*") if part]
+        if op not in ("=", "!=") or len(parts) != 1:
+            return None
+        return f"{field} {'not ' if op == '!=' else ''}like {_insights_regex(parts[0])}"
+    return f"{field} {op} {value}"
+
+
+def build_insights_filter(terms):
+    """Combine terms into one Logs Insights filter expression matching any of them, or None for no filter."""
+    expressions = []
+    for term in dict.fromkeys(terms):
+        expression = to_insights_expression(term)
+        if expression is None:
+            return None
+        expressions.append(f"({expression})")
+    return " or ".join(expressions) or None
+
+
+class FilterPatternCompiler:
+    """Compiles the active rules into the narrowest filter pattern for each (source, log group).
+
+    A pattern must keep every event some rule or the monitor's own detection could match, so a log group is read
+    unfiltered when that cannot be expressed: a rule whose predicate has no pattern equivalent, terms that cannot
+    be combined into one pattern under the length limit, or a monitor without a base_term, which inspects every
+    record itself. Sustained metric rules (e.g. "CPU usage > 90% for 5 minutes") push down their metric's field
+    names, which keeps every sample including those under the threshold.
+    """
+    def __init__(self, logger=None):
+        self.logger = logger or logging.getLogger("MONITOR")
+        self.lock = threading.Lock()
+        self.rules_key = None
+        self.terms = {}
+        self.untranslatable = {}
+        self.patterns = {}
+        self.insights_filters = {}
+
+    def update(self, rules):
+        """Recompile from the active rules if they changed; returns True when patterns were rebuilt."""
+        rules_key = tuple(sorted((rule.get("data_source", ""), rule.get("condition", "")) for rule in rules))
+        with self.lock:
+            if rules_key == self.rules_key:
+                return False
+        names = {(rule.get("data_source", ""), rule.get("condition", "")): rule.get("name", "") for rule in rules}
+        terms, untranslatable = {}, {}
+        for data_source, condition in rules_key:
+            translated = translate_condition(data_source, condition)
+            if translated is None:
+                untranslatable.setdefault(data_source, []).append(condition)
+                self.logger.info(
+                    f"Rule '{names[(data_source, condition)]}' ('{condition}') for {data_source} cannot be pushed down, "
+                    f"reading {data_source} log groups unfiltered"
+                )
+            else:
+                terms.setdefault(data_source, []).extend(translated)
+        with self.lock:
+            self.rules_key = rules_key
+            self.terms = terms
+            self.untranslatable = untranslatable
+            self.patterns = {}
+            self.insights_filters = {}
+        return True
+
+    def pattern_for(self, data_source, log_group, base_term=None):
+        """Return the filter pattern for a log group, including the monitor's own detection term.
+
+        Without a base_term the monitor's built-in detection needs every event, so rule terms are not pushed down.
+        """
+        key = (data_source, log_group, base_term)
+        with self.lock:
+            if key in self.patterns:
+                return self.patterns[key]
+            if base_term is None or self.untranslatable.get(data_source):
+                pattern = None
+            else:
+                terms = [term for term in self.terms.get(data_source, []) if term.applies_to(log_group)]
+                terms.insert(0, base_term)
+                pattern = build_filter_pattern(terms)
+                if pattern is None:
+                    self.logger.info(f"Rule terms for {data_source} do not fit one filter pattern, reading {log_group} unfiltered")
+            self.patterns[key] = pattern
+            return pattern
+
+    def insights_filter_for(self, data_source, log_group, base_term=None):
+        """Return the Logs Insights filter expression for a log group, or None to query it unfiltered."""
+        key = (data_source, log_group, base_term)
+        with self.lock:
+            if key in self.insights_filters:
+                return self.insights_filters[key]
+            if base_term is None or self.untranslatable.get(data_source):
+                expression = None
+            else:
+                terms = [term for term in self.terms.get(data_source, []) if term.applies_to(log_group)]
+                terms.insert(0, base_term)
+                expression = build_insights_filter(terms)
+            self.insights_filters[key] = expression
+            return expression
@@ -16,6 +16,10 @@ import asyncio
 import requests
 from abc import ABC, abstractmethod
 import openai
+import hashlib
+from poll_scheduler import PollScheduler
+from leases import close_lease_manager, open_lease_manager
+from incident import Incident
 
 load_dotenv()
 
@@ -24,11 +28,11 @@ class BaseRemediator(ABC):
         self.agent = agent
 
     @abstractmethod
-    async def apply_remediation(self, remediation_steps, error_message, root_cause, manifest_file, reference):
+    async def apply_remediation(self, remediation_steps, error_message, root_cause, manifest_file, reference, incident=None):
         pass
 
 class WindowsRemediator(BaseRemediator):
-    async def apply_remediation(self, remediation_steps, error_message, root_cause, manifest_file, reference):
+    async def apply_remediation(self, remediation_steps, error_message, root_cause, manifest_file, reference, incident=None):
         max_retries = 3
         current_steps = remediation_steps.copy()
         attempt = 1
@@ -162,7 +166,7 @@ class WindowsRemediator(BaseRemediator):
         return success
 
 class SnowflakeRemediator(BaseRemediator):
-    async def apply_remediation(self, remediation_steps, error_message, root_cause, manifest_file, reference):
+    async def apply_remediation(self, remediation_steps, error_message, root_cause, manifest_file, reference, incident=None):
         cursor = self.agent.snowflake_conn.cursor()
         step_success = True
         for step in remediation_steps:
@@ -202,7 +206,7 @@ class SnowflakeRemediator(BaseRemediator):
         return False
 
 class KubernetesRemediator(BaseRemediator):
-    async def apply_remediation(self, remediation_steps, error_message, root_cause, manifest_file, reference):
+    async def apply_remediation(self, remediation_steps, error_message, root_cause, manifest_file, reference, incident=None):
         step_success = True
         for step in remediation_steps:
             try:
@@ -239,10 +243,12 @@ class KubernetesRemediator(BaseRemediator):
         return False
 
 class DatabricksRemediator(BaseRemediator):
-    async def apply_remediation(self, remediation_steps, error_message, root_cause, manifest_file, reference):
-        # Extract table name from error_message string instead of assuming JSON
-        table_match = re.search(r'QueryText: INSERT INTO\s+([a-zA-Z0-9_\.]+)\s', error_message, re.IGNORECASE)
-        table_name = table_match.group(1) if table_match else None
+    async def apply_remediation(self, remediation_steps, error_message, root_cause, manifest_file, reference, incident=None):
+        # Use the table parsed at detection, else extract it from the error_message string
+        table_name = incident.get("table_name") if incident is not None else None
+        if not table_name:
+            table_match = re.search(r'QueryText: INSERT INTO\s+([a-zA-Z0-9_\.]+)\s', error_message, re.IGNORECASE)
+            table_name = table_match.group(1) if table_match else None
         if not table_name:
             self.agent.logger.error("Table name not found in error message")
             return False
@@ -326,6 +332,13 @@ class FixerAgent(AssistantAgent):
         }
         if self.snowflake_conn:
             self.remediators["snowflake"] = SnowflakeRemediator(self)
+        self.poll_scheduler = PollScheduler(
+            base_interval=10,
+            min_interval=float(os.getenv("FIXER_POLL_MIN_SECONDS", "1")),
+            max_interval=float(os.getenv("FIXER_POLL_MAX_SECONDS", "30"))
+        )
+        self.leases = None  # LeaseManager when replicas coordinate through MongoDB leases
+        self.claim_seconds = float(os.getenv("FIXER_CLAIM_SECONDS", "3600"))
 
     async def broadcast_message(self, agent, status, timestamp, details, reference):
         message = {
@@ -509,19 +522,32 @@ class FixerAgent(AssistantAgent):
                 f.write(f"[{datetime.now()}] {error_msg}\n{'-' * 60}\n")
             return {"success": False, "output": error_msg}
 
-    async def receive_error(self, error_message, root_cause, remediation_steps, source, manifest_file=None, reference=None):
+    async def receive_error(self, error_message, root_cause, remediation_steps, source, manifest_file=None, reference=None, incident=None):
         self.logger.info(f"Received {source} error from analyzer. Root cause: {root_cause}")
         if source not in self.remediators:
             self.logger.warning(f"Skipping {source} remediation: Invalid source or no Snowflake/Databricks connection")
             return
         remediator = self.remediators[source]
-        await remediator.apply_remediation(remediation_steps, error_message, root_cause, manifest_file, reference)
+        await remediator.apply_remediation(remediation_steps, error_message, root_cause, manifest_file, reference, incident)
+
+    def claim_fix(self, data):
+        """Claim a fix request so only one replica applies it; always True without replica leases."""
+        if self.leases is None:
+            return True
+        reference = data.get("reference")
+        if not reference:
+            reference = hashlib.sha1(json.dumps([data.get("source"), data.get("error"), data.get("root_cause")], default=str).encode("utf-8")).hexdigest()
+        return self.leases.claim(f"fixer:{reference}", self.claim_seconds)
 
     async def run_async(self):
         self.logger.info(f"FixerAgent is now running for Windows ({self.hostname}), Snowflake, Kubernetes, and Databricks...")
+        loop = asyncio.get_running_loop()
         try:
+            self.leases = await loop.run_in_executor(None, open_lease_manager, self.logger)
             while True:
+                found = 0
                 if os.path.exists("C:/Users/Quadrant/Loganalytics/Backend/fix_queue.json") and os.path.getsize("C:/Users/Quadrant/Loganalytics/Backend/fix_queue.json") > 0:
+                    found = 1
                     try:
                         with open("C:/Users/Quadrant/Loganalytics/Backend/fix_queue.json", 'r', encoding='utf-8') as f:
                             data = json.load(f)
@@ -529,14 +555,19 @@ class FixerAgent(AssistantAgent):
                         source = data.get("source", "unknown")
                         manifest_file = data.get("manifest_file", None)
                         reference = data.get("reference", None)
-                        await self.receive_error(
-                            data.get("error"),
-                            data.get("root_cause"),
-                            remediation_steps,
-                            source,
-                            manifest_file,
-                            reference
-                        )
+                        incident = Incident.from_dict(data["incident"]) if data.get("incident") else None
+                        if await loop.run_in_executor(None, self.claim_fix, data):
+                            await self.receive_error(
+                                data.get("error"),
+                                data.get("root_cause"),
+                                remediation_steps,
+                                source,
+                                manifest_file,
+                                reference,
+                                incident
+                            )
+                        else:
+                            self.logger.info(f"Skipping fix {reference}: another replica is already applying it")
                         open("C:/Users/Quadrant/Loganalytics/Backend/fix_queue.json", 'w').close()
                     except json.JSONDecodeError as e:
                         self.logger.error(f"Failed to parse fix_queue.json: {e}")
@@ -547,11 +578,16 @@ class FixerAgent(AssistantAgent):
                         self.logger.error(f"FixerAgent error: {e}")
                         with open("C:/Users/Quadrant/Loganalytics/Backend/fixer.log", "a", encoding="utf-8") as f:
                             f.write(f"[{datetime.now()}] FixerAgent error: {e}\n{'-' * 60}\n")
-                await asyncio.sleep(10)
+                self.poll_scheduler.record("fix_queue", found)
+                await self.poll_scheduler.wait(["fix_queue"])
         except asyncio.CancelledError:
             self.logger.info("FixerAgent stopped by user")
         except Exception as e:
             self.logger.error(f"Error in FixerAgent loop: {e}")
+        finally:
+            if self.leases is not None:
+                close_lease_manager()
+                self.leases = None
 
     def run(self):
         """Synchronous wrapper for running the async fixer loop."""
@@ -0,0 +1,78 @@
+import json
+import time
+from dataclasses import dataclass, field, replace
+from types import MappingProxyType
+from typing import Any, Mapping, Optional
+
+# Short keys keep fix_queue.json, pending email requests and queue payloads small
+_WIRE_KEYS = {
+    "reference": "ref",
+    "source": "src",
+    "summary": "sum",
+    "log_group": "grp",
+    "fields": "f",
+    "fingerprint": "fp",
+    "occurrences": "n",
+    "detected_at": "at",
+}
+
+
+@dataclass(frozen=True, slots=True)
+class Incident:
+    """A detected error with its parsed fields, passed from the monitor through email, analyzer and fixer."""
+    reference: str
+    source: str  # windows, snowflake, kubernetes or databricks
+    summary: str  # Human-readable description, without the reference line
+    log_group: str = ""
+    fields: Mapping[str, Any] = field(default_factory=dict)  # Values parsed from the event, e.g. pod or table_name
+    fingerprint: Optional[str] = None
+    occurrences: int = 1
+    detected_at: float = field(default_factory=time.time)
+
+    def __post_init__(self):
+        object.__setattr__(self, "fields", MappingProxyType(dict(self.fields)))
+
+    def __hash__(self):
+        return hash(self.reference)
+
+    def get(self, name, default=None):
+        """Return a parsed field of the event."""
+        return self.fields.get(name, default)
+
+    @property
+    def error_message(self):
+        """The formatted message the agents log, email and prompt with."""
+        return f"{self.summary}\nReference: {self.reference}"
+
+    def with_occurrences(self, occurrences):
+        """Return a copy counting the repeats folded into the incident since it was detected."""
+        return replace(self, occurrences=occurrences)
+
+    def to_dict(self):
+        """Serialize to a compact dict, omitting fields left at their defaults."""
+        data = {
+            "ref": self.reference,
+            "src": self.source,
+            "sum": self.summary,
+            "at": self.detected_at,
+        }
+        if self.log_group:
+            data["grp"] = self.log_group
+        if self.fields:
+            data["f"] = dict(self.fields)
+        if self.fingerprint:
+            data["fp"] = self.fingerprint
+        if self.occurrences != 1:
+            data["n"] = self.occurrences
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{name: data[key] for name, key in _WIRE_KEYS.items() if key in data})
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), separators=(",", ":"), default=str)
+
+    @classmethod
+    def from_json(cls, text):
+        return cls.from_dict(json.loads(text))
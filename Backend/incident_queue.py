@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from itertools import count
+
+POLICIES = ("block", "drop-oldest", "coalesce")
+
+
+class AnalysisJob:
+    """An incident waiting for root-cause analysis by the monitor that detected it."""
+    __slots__ = ("monitor", "incident", "key")
+
+    def __init__(self, monitor, incident, key=None):
+        self.monitor = monitor
+        self.incident = incident
+        self.key = key
+
+    @property
+    def reference(self):
+        return self.incident.reference
+
+    @property
+    def error_message(self):
+        return self.incident.error_message
+
+
+class IncidentQueue:
+    """Bounded asyncio queue feeding detected incidents to a pool of analysis workers.
+
+    When the queue is full, 'block' makes producers wait for a free slot, 'drop-oldest' discards the longest
+    waiting incident, and 'coalesce' folds an incident into a queued one with the same key (dropping the oldest
+    when there is none).
+    """
+    def __init__(self, handler, maxsize=100, workers=2, policy="block", logger=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown incident queue policy '{policy}', expected one of {POLICIES}")
+        self.handler = handler  # async callable(job)
+        self.maxsize = max(1, maxsize)
+        self.worker_count = max(1, workers)
+        self.policy = policy
+        self.logger = logger or logging.getLogger("MONITOR")
+        self.pending = OrderedDict()  # key -> (enqueued_at, job), oldest first
+        self.sequence = count()
+        self.condition = None
+        self.workers = []
+        self.busy = 0
+        self.stats = {"enqueued": 0, "processed": 0, "failed": 0, "dropped": 0, "coalesced": 0, "max_depth": 0, "wait_seconds": 0.0}
+
+    def start(self):
+        """Start the analysis workers on the running event loop."""
+        if self.workers:
+            return
+        self.condition = asyncio.Condition()
+        self.workers = [asyncio.create_task(self._worker(index)) for index in range(self.worker_count)]
+        self.logger.info(f"Started {self.worker_count} incident analysis workers (queue size {self.maxsize}, policy {self.policy})")
+
+    async def put(self, job):
+        """Queue a job, applying the backpressure policy when the queue is full."""
+        key = job.key
+        if self.condition is None:
+            await self.handler(job)  # Not started, so analyse inline
+            return
+        async with self.condition:
+            if self.policy == "coalesce" and key is not None and key in self.pending:
+                self.stats["coalesced"] += 1
+                self.logger.info(f"Coalesced incident into queued analysis for {key}")
+                return
+            if len(self.pending) >= self.maxsize:
+                if self.policy == "block":
+                    await self.condition.wait_for(lambda: len(self.pending) < self.maxsize)
+                else:
+                    _, (_, dropped) = self.pending.popitem(last=False)
+                    self.stats["dropped"] += 1
+                    self.logger.warning(f"Incident queue full, dropped oldest incident {dropped.reference}")
+            self.pending[key if key is not None and self.policy == "coalesce" else ("job", next(self.sequence))] = (time.monotonic(), job)
+            self.stats["enqueued"] += 1
+            self.stats["max_depth"] = max(self.stats["max_depth"], len(self.pending))
+            self.condition.notify_all()
+
+    async def _worker(self, index):
+        while True:
+            async with self.condition:
+                await self.condition.wait_for(lambda: self.pending)
+                _, (enqueued_at, job) = self.pending.popitem(last=False)
+                self.busy += 1
+                self.condition.notify_all()
+            self.stats["wait_seconds"] += time.monotonic() - enqueued_at
+            try:
+                await self.handler(job)
+                self.stats["processed"] += 1
+            except Exception as e:
+                self.stats["failed"] += 1
+                self.logger.error(f"Incident analysis worker {index} failed: {e}")
+            finally:
+                async with self.condition:
+                    self.busy -= 1
+                    self.condition.notify_all()
+
+    async def stop(self, drain_timeout=0):
+        """Cancel the workers, first waiting up to drain_timeout seconds for the queued incidents to be analysed.
+
+        Incidents still queued after that are discarded.
+        """
+        if drain_timeout > 0 and self.condition is not None and (self.pending or self.busy):
+            self.logger.info(f"Waiting up to {drain_timeout}s for {len(self.pending) + self.busy} incidents to be analysed")
+            try:
+                async with self.condition:
+                    await asyncio.wait_for(self.condition.wait_for(lambda: not self.pending and not self.busy), timeout=drain_timeout)
+            except asyncio.TimeoutError:
+                pass
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        if self.pending:
+            self.logger.warning(f"Discarding {len(self.pending)} queued incidents on shutdown")
+        self.workers = []
+        self.pending.clear()
+        self.condition = None
+
+    def get_stats(self):
+        """Return queue depth and throughput counters."""
+        done = self.stats["processed"] + self.stats["failed"]
+        stats = dict(self.stats, depth=len(self.pending), in_flight=self.busy, policy=self.policy, workers=self.worker_count)
+        stats["avg_wait_seconds"] = round(self.stats["wait_seconds"] / done, 3) if done else 0.0
+        del stats["wait_seconds"]
+        return stats
@@ -0,0 +1,154 @@
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from rate_governor import governor
+
+MAX_GROUPS_PER_QUERY = 50
+RESULT_LIMIT = 10000
+TERMINAL_STATUSES = {"Complete", "Failed", "Cancelled", "Timeout", "Unknown"}
+
+
+def _parse_timestamp(value):
+    """Convert an Insights @timestamp ('2024-01-01 00:00:00.000') to epoch milliseconds."""
+    parsed = datetime.strptime(value, "%Y-%m-%d %H:%M:%S.%f").replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+
+class InsightsBatchScanner:
+    """Scans many log groups with Logs Insights queries of up to 50 groups each instead of one read per group."""
+    def __init__(self, cloudwatch, poll_interval=1.0, timeout=60, logger=None):
+        self.cloudwatch = cloudwatch
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.logger = logger or logging.getLogger("MONITOR")
+
+    @staticmethod
+    def query_string(filter_expression):
+        query = "fields @timestamp, @message, @log, @logStream"
+        if filter_expression:
+            query += f" | filter {filter_expression}"
+        return query + f" | sort @timestamp asc | limit {RESULT_LIMIT}"
+
+    def _start(self, log_groups, start_ms, end_seconds, filter_expression):
+        response = governor.call(
+            self.cloudwatch, "start_query",
+            logGroupNames=log_groups,
+            startTime=start_ms // 1000,
+            endTime=end_seconds,
+            queryString=self.query_string(filter_expression),
+            limit=RESULT_LIMIT
+        )
+        return response["queryId"]
+
+    @staticmethod
+    def _to_event(row):
+        fields = {field["field"]: field["value"] for field in row}
+        log = fields.get("@log", "")
+        return log.split(":", 1)[-1], {
+            "timestamp": _parse_timestamp(fields["@timestamp"]),
+            "message": fields.get("@message", ""),
+            "logStreamName": fields.get("@logStream"),
+            # @ptr never equals a filter_log_events eventId; cursors de-duplicate on event_key() instead
+            "eventId": None
+        }
+
+    def scan(self, reader, batches):
+        """Run one query per batch of (log_groups, filter_expression) from each group's cursor up to now.
+
+        Returns (events_by_group, scanned_until_ms, fallback_groups): the new events per group, the time every
+        queried group has been fully scanned to, and the groups whose query failed or hit the result limit
+        and must be read per group instead.
+        """
+        end_seconds = int(time.time()) - 1
+        scanned_until_ms = (end_seconds + 1) * 1000 - 1  # endTime is inclusive of its whole second
+        queries, fallback_groups, events_by_group = {}, [], {}
+        for log_groups, filter_expression in batches:
+            start_ms = max(0, min(reader.cursor(group).start for group in log_groups))
+            if start_ms > scanned_until_ms:
+                continue
+            try:
+                queries[self._start(log_groups, start_ms, end_seconds, filter_expression)] = log_groups
+            except Exception as e:
+                self.logger.warning(f"Failed to start Insights query for {len(log_groups)} log groups: {e}")
+                fallback_groups.extend(log_groups)
+        deadline = time.monotonic() + self.timeout
+        while queries:
+            for query_id, log_groups in list(queries.items()):
+                response = governor.call(self.cloudwatch, "get_query_results", queryId=query_id)
+                status = response.get("status")
+                if status not in TERMINAL_STATUSES:
+                    continue
+                del queries[query_id]
+                results = response.get("results", [])
+                if status != "Complete" or len(results) >= RESULT_LIMIT:
+                    self.logger.warning(f"Insights query {query_id} ended {status} with {len(results)} results, reading its {len(log_groups)} log groups individually")
+                    fallback_groups.extend(log_groups)
+                    continue
+                for group in log_groups:
+                    events_by_group.setdefault(group, [])
+                for row in results:
+                    group, event = self._to_event(row)
+                    if group in events_by_group and reader.cursor(group).is_new(event):
+                        events_by_group[group].append(event)
+            if queries and time.monotonic() > deadline:
+                for query_id, log_groups in queries.items():
+                    try:
+                        governor.call(self.cloudwatch, "stop_query", queryId=query_id)
+                    except Exception:
+                        pass
+                    fallback_groups.extend(log_groups)
+                self.logger.warning(f"{len(queries)} Insights queries exceeded {self.timeout}s, falling back to per-group reads")
+                break
+            if queries:
+                time.sleep(self.poll_interval)
+        for events in events_by_group.values():
+            events.sort(key=lambda event: (event["timestamp"], event["logStreamName"] or ""))
+        return events_by_group, scanned_until_ms, fallback_groups
+
+
+class ScanStrategySelector:
+    """Chooses per source between per-group filter_log_events reads and batched Insights queries.
+
+    Insights is only considered from min_groups log groups upward; between the two, the strategy with the
+    lower smoothed seconds-per-group wins, and the other is re-probed every probe_every passes.
+    """
+    def __init__(self, mode="auto", min_groups=20, probe_every=10, alpha=0.3):
+        self.mode = mode  # 'auto', 'filter' or 'insights'
+        self.min_groups = min_groups
+        self.probe_every = probe_every
+        self.alpha = alpha
+        self.latency = {}  # (source, strategy) -> smoothed seconds per log group
+        self.passes = {}
+        self.lock = threading.Lock()
+
+    def choose(self, source, group_count):
+        if self.mode != "auto":
+            return self.mode
+        if group_count < self.min_groups:
+            return "filter"
+        with self.lock:
+            filter_latency = self.latency.get((source, "filter"))
+            insights_latency = self.latency.get((source, "insights"))
+            if insights_latency is None:
+                return "insights"
+            if filter_latency is None:
+                return "filter"
+            best = "insights" if insights_latency <= filter_latency else "filter"
+            passes = self.passes.get(source, 0) + 1
+            self.passes[source] = passes
+            if passes % self.probe_every == 0:
+                return "filter" if best == "insights" else "insights"
+            return best
+
+    def record(self, source, strategy, seconds, group_count):
+        if not group_count:
+            return
+        per_group = seconds / group_count
+        with self.lock:
+            previous = self.latency.get((source, strategy))
+            self.latency[(source, strategy)] = per_group if previous is None else previous + self.alpha * (per_group - previous)
+
+    def get_stats(self):
+        with self.lock:
+            return {f"{source}:{strategy}": round(value, 4) for (source, strategy), value in self.latency.items()}
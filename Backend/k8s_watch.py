@@ -0,0 +1,386 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import ssl
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+WATCH_LOG_GROUP = "k8s-watch"  # Label used in place of a log group for watched events
+IMAGE_PULL_REASONS = ("ImagePullBackOff", "ErrImagePull")
+SERVICE_ACCOUNT_DIR = "/var/run/secrets/kubernetes.io/serviceaccount"
+_FIELD_CONTAINER = re.compile(r"spec\.(?:initC|c)ontainers\{(?P<name>[^}]+)\}")
+
+
+class WatchExpired(Exception):
+    """The watch's resourceVersion is too old (HTTP 410 Gone); the resource must be listed again."""
+
+
+class WatchTransport(ABC):
+    """Source of Kubernetes objects and watch events for a cluster-wide resource such as 'pods'."""
+    @abstractmethod
+    def list_objects(self, resource):
+        """Return (items, resource_version) for every object of the resource."""
+
+    @abstractmethod
+    def watch(self, resource, resource_version, stopped):
+        """Yield watch events ({"type", "object"}) after resource_version until stopped is set or the server ends the watch.
+
+        Raises WatchExpired when resource_version can no longer be resumed from.
+        """
+
+
+class KubernetesApiTransport(WatchTransport):
+    """List and watch over the Kubernetes REST API with a bearer token.
+
+    Any server speaking the same protocol works, so a fake API server on localhost can stand in for a cluster.
+    """
+    def __init__(self, server, token=None, ca_file=None, verify=True, timeout_seconds=300):
+        self.server = server.rstrip("/")
+        self.token = token
+        self.timeout_seconds = timeout_seconds
+        if self.server.startswith("https"):
+            self.ssl_context = ssl.create_default_context(cafile=ca_file)
+            if not verify:
+                self.ssl_context.check_hostname = False
+                self.ssl_context.verify_mode = ssl.CERT_NONE
+        else:
+            self.ssl_context = None
+
+    @classmethod
+    def from_env(cls):
+        """Configure from K8S_API_SERVER/K8S_TOKEN/K8S_CA_FILE, falling back to the in-cluster service account."""
+        server = os.getenv("K8S_API_SERVER")
+        if not server and os.getenv("KUBERNETES_SERVICE_HOST"):
+            server = f"https://{os.getenv('KUBERNETES_SERVICE_HOST')}:{os.getenv('KUBERNETES_SERVICE_PORT', '443')}"
+        if not server:
+            raise ValueError("K8S_API_SERVER is not set and the monitor is not running in a cluster")
+        token = os.getenv("K8S_TOKEN")
+        token_file = os.getenv("K8S_TOKEN_FILE", os.path.join(SERVICE_ACCOUNT_DIR, "token"))
+        if not token and os.path.exists(token_file):
+            with open(token_file, "r", encoding="utf-8") as f:
+                token = f.read().strip()
+        ca_file = os.getenv("K8S_CA_FILE", os.path.join(SERVICE_ACCOUNT_DIR, "ca.crt"))
+        return cls(
+            server, token=token,
+            ca_file=ca_file if os.path.exists(ca_file) else None,
+            verify=os.getenv("K8S_VERIFY_SSL", "true").lower() != "false",
+            timeout_seconds=int(os.getenv("K8S_WATCH_TIMEOUT_SECONDS", "300"))
+        )
+
+    def _open(self, resource, params, timeout):
+        url = f"{self.server}/api/v1/{resource}?{urllib.parse.urlencode(params)}"
+        request = urllib.request.Request(url, headers={"Accept": "application/json"})
+        if self.token:
+            request.add_header("Authorization", f"Bearer {self.token}")
+        return urllib.request.urlopen(request, timeout=timeout, context=self.ssl_context)
+
+    def list_objects(self, resource):
+        items, params = [], {"limit": 500}
+        while True:
+            with self._open(resource, params, timeout=60) as response:
+                page = json.load(response)
+            items.extend(page.get("items", []))
+            metadata = page.get("metadata", {})
+            if not metadata.get("continue"):
+                return items, metadata.get("resourceVersion")
+            params["continue"] = metadata["continue"]
+
+    def watch(self, resource, resource_version, stopped):
+        params = {"watch": "true", "allowWatchBookmarks": "true", "timeoutSeconds": self.timeout_seconds}
+        if resource_version:
+            params["resourceVersion"] = resource_version
+        try:
+            # The read timeout outlasts the server-side one, so a silently dropped connection is noticed
+            response = self._open(resource, params, timeout=self.timeout_seconds + 30)
+        except urllib.error.HTTPError as e:
+            if e.code == 410:
+                raise WatchExpired(str(e))
+            raise
+        with response:
+            for line in response:
+                if stopped.is_set():
+                    return
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if event.get("type") == "ERROR" and event.get("object", {}).get("code") == 410:
+                    raise WatchExpired(event["object"].get("message", "resourceVersion too old"))
+                yield event
+
+
+def _audit_event(kind, metadata, status, node=None, reason=None, resource="pods"):
+    """Shape a watched object like the audit events KubernetesMonitor already detects on."""
+    message = {
+        "kind": "Event",
+        "source": "watch",
+        "objectRef": {"resource": resource, "namespace": metadata.get("namespace"), "name": metadata.get("name")},
+        "requestObject": {"kind": kind, "status": status},
+        "user": {"username": f"system:node:{node}" if node else ""},
+    }
+    if reason:
+        message["reason"] = reason
+    return message
+
+
+def container_states(statuses):
+    """Return (container status, reason) for the OOMKilled, image pull and crash-loop states in containerStatuses."""
+    states = []
+    for status in statuses or []:
+        if not isinstance(status, dict):
+            continue
+        state = status.get("state") or {}
+        last_state = status.get("lastState") or {}
+        if ((state.get("terminated") or {}).get("reason") == "OOMKilled" or
+                (last_state.get("terminated") or {}).get("reason") == "OOMKilled"):
+            states.append((status, "OOMKilled"))
+        waiting = (state.get("waiting") or {}).get("reason")
+        if waiting in IMAGE_PULL_REASONS:
+            states.append((status, "ImagePullBackOff"))
+        elif waiting == "CrashLoopBackOff":
+            states.append((status, waiting))
+    return states
+
+
+def pod_detections(pod):
+    """Return (key, state, message) for the OOMKilled, image pull and crash-loop container states of a pod.
+
+    key identifies one occurrence (it includes the restart count); state is (pod uid, container, reason).
+    """
+    metadata = pod.get("metadata", {})
+    node = pod.get("spec", {}).get("nodeName")
+    detections = []
+    for status, reason in container_states(pod.get("status", {}).get("containerStatuses")):
+        detected = (metadata.get("uid"), status.get("name"), reason)
+        message = _audit_event("Pod", metadata, {"containerStatuses": [status]}, node, reason)
+        detections.append((detected + (status.get("restartCount", 0),), detected, message))
+    return detections
+
+
+def node_not_ready_since(node):
+    """Return when a node's Ready condition left True (epoch seconds), or None while it is Ready."""
+    for condition in node.get("status", {}).get("conditions", []) or []:
+        if condition.get("type") == "Ready":
+            if condition.get("status") == "True":
+                return None
+            try:
+                changed = datetime.strptime(condition.get("lastTransitionTime", ""), "%Y-%m-%dT%H:%M:%SZ")
+            except ValueError:
+                return time.time()
+            return changed.replace(tzinfo=timezone.utc).timestamp()
+    return None
+
+
+def event_detections(event):
+    """Return (key, state, message) for kubelet back-off Events, which usually arrive before the pod status update."""
+    note = event.get("message", "")
+    involved = event.get("involvedObject", {})
+    if event.get("reason") != "BackOff" or involved.get("kind") != "Pod":
+        return []
+    if "pulling image" in note.lower():
+        reason = "ImagePullBackOff"
+    elif "restarting failed container" in note.lower():
+        reason = "CrashLoopBackOff"
+    else:
+        return []
+    container = _FIELD_CONTAINER.search(involved.get("fieldPath", ""))
+    detected = (involved.get("uid"), container.group("name") if container else None, reason)
+    metadata = {"namespace": involved.get("namespace"), "name": involved.get("name")}
+    message = _audit_event("Pod", metadata, {"message": note}, event.get("source", {}).get("host"), reason)
+    return [((event.get("metadata", {}).get("uid"), event.get("count")), detected, message)]
+
+
+class ResourceWatch:
+    """One resumable watch on a resource, reconnecting with exponential backoff and relisting when it expires."""
+    def __init__(self, detector, resource):
+        self.detector = detector
+        self.resource = resource
+        self.resource_version = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f"k8s-watch-{resource}", daemon=True)
+        self.failures = 0
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def _run(self):
+        detector = self.detector
+        while not self.stopped.is_set():
+            try:
+                if self.resource_version is None:
+                    items, self.resource_version = detector.transport.list_objects(self.resource)
+                    detector.observe_list(self.resource, items)
+                for event in detector.transport.watch(self.resource, self.resource_version, self.stopped):
+                    self.failures = 0
+                    version = event.get("object", {}).get("metadata", {}).get("resourceVersion")
+                    if version:
+                        self.resource_version = version
+                    if event.get("type") == "BOOKMARK":
+                        detector.stats["bookmarks"] += 1
+                        continue
+                    detector.observe(self.resource, event.get("type"), event.get("object", {}))
+                # The server ended the watch at its timeout; resume from the last bookmark
+            except WatchExpired as e:
+                detector.logger.info(f"Kubernetes {self.resource} watch expired ({e}), relisting")
+                detector.stats["relists"] += 1
+                self.resource_version = None
+            except Exception as e:
+                self.failures += 1
+                detector.stats["reconnects"] += 1
+                delay = min(detector.max_backoff, detector.base_backoff * 2 ** (self.failures - 1)) * random.uniform(0.5, 1)
+                detector.logger.warning(f"Kubernetes {self.resource} watch failed: {e}, reconnecting in {delay:.1f}s")
+                self.stopped.wait(delay)
+
+
+class KubernetesWatchDetector:
+    """Feeds pod, node and event watches into KubernetesMonitor's detection path with sub-second latency.
+
+    Container states and node readiness are rendered as audit-shaped events, so OOMKilled goes through the
+    monitor's own OOMKilled handling and the other states through the compiled rules. States already present
+    at the first list are recorded without being reported; later relists only report states not seen before.
+    A back-off Event and the pod status update for the same container state within dedupe_seconds of each
+    other are reported once. A NotReady node is reported after not_ready_seconds and again as it reaches the
+    duration of each active NotReady-style sustained rule, so longer rules still fire.
+    """
+    def __init__(self, monitor, transport, loop, resources=("pods", "nodes", "events"), not_ready_seconds=120,
+                 dedupe_seconds=30, base_backoff=1.0, max_backoff=60.0, max_seen=10000, logger=None):
+        self.monitor = monitor
+        self.transport = transport
+        self.loop = loop
+        self.not_ready_seconds = not_ready_seconds
+        self.dedupe_seconds = dedupe_seconds
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_seen = max_seen
+        self.logger = logger or logging.getLogger("MONITOR")
+        self.watches = [ResourceWatch(self, resource) for resource in resources]
+        self.seen = OrderedDict()  # occurrence key -> None, oldest first
+        self.recent = OrderedDict()  # (pod uid, container, reason) -> time last reported, oldest first
+        self.primed = set()  # Resources whose first list has been recorded
+        self.not_ready = {}  # node name -> (since, future reporting it once the duration has passed)
+        self.lock = threading.Lock()
+        self.stats = {"events": 0, "detections": 0, "bookmarks": 0, "reconnects": 0, "relists": 0}
+
+    def start(self):
+        for watch in self.watches:
+            watch.start()
+        self.logger.info(f"Watching Kubernetes {', '.join(watch.resource for watch in self.watches)} for {self.monitor.service_name} detection")
+
+    def stop(self):
+        for watch in self.watches:
+            watch.stop()
+        with self.lock:
+            for _, pending in self.not_ready.values():
+                pending.cancel()
+            self.not_ready = {}
+
+    def observe_list(self, resource, items):
+        """Process a full list of a resource; the first one only primes the seen states."""
+        report = resource in self.primed
+        self.primed.add(resource)
+        for item in items:
+            self.observe(resource, "ADDED", item, report)
+
+    def observe(self, resource, event_type, obj, report=True):
+        """Turn one watched object into detections and deliver the new ones."""
+        self.stats["events"] += 1
+        if resource == "nodes":
+            self._observe_node(obj, event_type, report)
+            return
+        detections = pod_detections(obj) if resource == "pods" else event_detections(obj)
+        now = time.time()
+        for key, state, message in detections:
+            with self.lock:
+                if key in self.seen:
+                    continue
+                self.seen[key] = None
+                duplicate = now - self.recent.get(state, 0) < self.dedupe_seconds
+                self.recent[state] = now
+                self.recent.move_to_end(state)
+                for tracked in (self.seen, self.recent):
+                    if len(tracked) > self.max_seen:
+                        tracked.popitem(last=False)
+            if report and not duplicate:
+                self.deliver(key, message)
+
+    def _observe_node(self, node, event_type, report):
+        name = node.get("metadata", {}).get("name")
+        since = None if event_type == "DELETED" else node_not_ready_since(node)
+        with self.lock:
+            current = self.not_ready.get(name)
+            if current is not None and current[0] == since:
+                return
+            if current is not None:
+                current[1].cancel()
+                del self.not_ready[name]
+            if since is None:
+                return
+            # Report as the node stays NotReady for each reportable duration, until it recovers
+            pending = asyncio.run_coroutine_threadsafe(self._report_not_ready(name, node, since), self.loop)
+            self.not_ready[name] = (since, pending)
+
+    def _next_report(self, reported):
+        """Return the next NotReady duration worth reporting after reported seconds, or None if there is none."""
+        durations = {self.not_ready_seconds}
+        compiler = self.monitor.rule_compiler
+        if compiler is not None:
+            durations.update(
+                rule.aggregation.duration_seconds for rule in compiler.rules_for(self.monitor.source)
+                if rule.kind == "sustained" and rule.aggregation.sampler is None
+            )
+        later = [duration for duration in durations if duration > reported]
+        return min(later) if later else None
+
+    async def _report_not_ready(self, name, node, since):
+        message = _audit_event("Node", node.get("metadata", {}), node.get("status", {}), name, "NotReady", resource="nodes")
+        reported = None
+        while True:
+            due = self._next_report(-1 if reported is None else reported)
+            if due is None:
+                return
+            await asyncio.sleep(max(0.0, since + due - time.time()))
+            with self.lock:
+                current = self.not_ready.get(name)
+                if current is None or current[0] != since:
+                    return
+            held = time.time() - since
+            self.stats["detections"] += 1
+            event = self._event((name, since, "NotReady", int(due)), message, held, reported)
+            await self.monitor.process_new_events(WATCH_LOG_GROUP, [event], advance=False)
+            reported = held
+
+    def _event(self, key, message, held_seconds=None, reported_seconds=None):
+        event = {
+            "timestamp": int(time.time() * 1000),
+            "eventId": "watch-" + "-".join(str(part) for part in key),
+            "logStreamName": "watch",
+            "message": json.dumps(message),
+        }
+        if held_seconds is not None:
+            event["held_seconds"] = held_seconds  # How long the reported state has lasted, for sustained state rules
+        if reported_seconds is not None:
+            event["reported_seconds"] = reported_seconds  # How long it had lasted when last reported
+        return event
+
+    def deliver(self, key, message):
+        """Run detection for one watched state on the monitor's event loop, waiting so each watch stays in order."""
+        self.stats["detections"] += 1
+        future = asyncio.run_coroutine_threadsafe(
+            self.monitor.process_new_events(WATCH_LOG_GROUP, [self._event(key, message)], advance=False), self.loop
+        )
+        future.result()
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, not_ready_nodes=len(self.not_ready), tracked_states=len(self.seen))
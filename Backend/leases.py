@@ -0,0 +1,328 @@
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from pymongo import MongoClient, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from sharding import HashRing
+
+LEASE_COLLECTION = "partition_leases"
+REPLICA_COLLECTION = "replicas"
+K8S_WATCH_LEASE = "k8s-watch"
+
+
+class LeaseManager:
+    """Lease-based ownership of work partitions shared by backend replicas through MongoDB.
+
+    Every replica heartbeats a membership document, and the live replicas are placed on a consistent hash ring
+    that picks each partition's owner. The owner holds a lease document {_id: partition, owner, expires_at} and
+    renews it on every heartbeat. A replica that stops heartbeating drops out of the ring, and its leases expire
+    lease_seconds later, so the rest take over its partitions within lease_seconds + heartbeat_seconds.
+
+    A partition moving to another live replica is reported lost at once but released one heartbeat later, which
+    gives its consumer time to persist progress. owns() also checks a local deadline, so a replica cut off from
+    MongoDB stops working on its partitions before any other replica can acquire them, as long as host clocks
+    differ by less than clock_skew_seconds.
+    """
+    def __init__(self, leases, replicas, replica_id=None, lease_seconds=10, heartbeat_seconds=3, clock_skew_seconds=1, logger=None):
+        self.leases = leases
+        self.replicas = replicas
+        self.replica_id = replica_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.clock_skew_seconds = clock_skew_seconds
+        self.logger = logger or logging.getLogger("LEASES")
+        self.scopes = {}  # scope -> partition keys offered under it
+        self.held = {}  # partition key -> monotonic time the lease stops being safe to use
+        self.handing_over = set()  # Keys no longer ours, released on the next heartbeat
+        self.states = {}  # partition key -> consumer state stored with the lease
+        self.dirty_states = set()
+        self.members = {self.replica_id}
+        self.ring = HashRing(self.members)
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.tick_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.stats = {"heartbeats": 0, "failed_heartbeats": 0, "acquired": 0, "released": 0, "lost": 0, "claims": 0, "claims_denied": 0}
+
+    def add_listener(self, callback):
+        """Register a callable run (on the heartbeat thread) whenever this replica gains or loses partitions."""
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def _notify(self):
+        for callback in list(self.listeners):
+            try:
+                callback()
+            except Exception as e:
+                self.logger.error(f"Lease listener failed: {e}")
+
+    def offer(self, scope, keys):
+        """Set the partitions known under scope; new ones are claimed on an early heartbeat if they map here."""
+        keys = set(keys)
+        with self.lock:
+            added = keys - self.scopes.get(scope, set())
+            self.scopes[scope] = keys
+        if added:
+            self.wake.set()
+
+    def withdraw(self, scope):
+        """Forget a scope's partitions, handing over any held under it."""
+        self.offer(scope, ())
+
+    def owns(self, key):
+        """Return True while this replica holds an unexpired lease on the partition."""
+        deadline = self.held.get(key)
+        return deadline is not None and deadline > time.monotonic()
+
+    def owned(self, prefix=""):
+        """Return the held partition keys starting with prefix."""
+        now = time.monotonic()
+        with self.lock:
+            return {key for key, deadline in self.held.items() if deadline > now and key.startswith(prefix)}
+
+    def state(self, key):
+        """Return the state stored with a held partition's lease, as left by whichever replica held it last."""
+        with self.lock:
+            return self.states.get(key)
+
+    def set_state(self, key, state):
+        """Store consumer state (e.g. a read position) with a held lease; it is written on the next heartbeat."""
+        with self.lock:
+            self.states[key] = state
+            self.dirty_states.add(key)
+
+    def claim(self, key, seconds):
+        """Take a one-off lease on a work item for seconds; returns False if another replica already has it.
+
+        If MongoDB cannot be reached the item is not blocked: the claim succeeds and a warning is logged.
+        """
+        now = datetime.utcnow()
+        try:
+            self.leases.find_one_and_update(
+                {"_id": key, "$or": [{"owner": self.replica_id}, {"expires_at": {"$lte": now}}]},
+                {"$set": {"owner": self.replica_id, "expires_at": now + timedelta(seconds=seconds), "acquired_at": now}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            self.stats["claims_denied"] += 1
+            return False
+        except PyMongoError as e:
+            self.logger.warning(f"Could not claim {key}, proceeding without a lease: {e}")
+        self.stats["claims"] += 1
+        return True
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, name="lease-heartbeat", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            self.heartbeat()
+            self.wake.wait(self.heartbeat_seconds)
+            self.wake.clear()
+
+    def heartbeat(self):
+        """Renew membership, then renew, release and acquire leases to match this replica's share of the ring."""
+        with self.tick_lock:
+            try:
+                changed = self._heartbeat()
+            except PyMongoError as e:
+                self.stats["failed_heartbeats"] += 1
+                self.logger.error(f"Lease heartbeat failed for replica {self.replica_id}: {e}")
+                return
+            self.stats["heartbeats"] += 1
+        if changed:
+            self._notify()
+
+    def _heartbeat(self):
+        started = time.monotonic()
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.lease_seconds)
+        deadline = started + self.lease_seconds - self.clock_skew_seconds
+        self.replicas.update_one(
+            {"_id": self.replica_id},
+            {"$set": {"host": socket.gethostname(), "pid": os.getpid(), "heartbeat_at": now, "expires_at": expires_at}},
+            upsert=True
+        )
+        members = {doc["_id"] for doc in self.replicas.find({"expires_at": {"$gt": now}}, {"_id": 1})} | {self.replica_id}
+        if members != self.members:
+            self.logger.info(f"Replica membership changed: {len(members)} live ({', '.join(sorted(members))})")
+            self.members = members
+            self.ring = HashRing(members)
+
+        with self.lock:
+            known = set().union(*self.scopes.values())
+            held = {key for key, held_until in self.held.items() if held_until > started}
+            expired = set(self.held) - held
+            releasing = set(self.handing_over)
+            states = {key: self.states[key] for key in self.dirty_states}
+            self.dirty_states.clear()
+        wanted = {key for key in known if self.ring.owner(key) == self.replica_id}
+
+        writes = [
+            UpdateOne({"_id": key, "owner": self.replica_id}, {"$set": {"state": state}})
+            for key, state in states.items() if key in held or key in releasing
+        ]
+        if writes:
+            self.leases.bulk_write(writes, ordered=False)
+        if releasing:
+            # A released lease keeps its document, and with it the state, for the next owner
+            self.leases.update_many(
+                {"_id": {"$in": sorted(releasing)}, "owner": self.replica_id},
+                {"$set": {"expires_at": now}, "$unset": {"owner": ""}}
+            )
+            self.stats["released"] += len(releasing)
+
+        renew = sorted(held & wanted)
+        kept = set()
+        if renew:
+            result = self.leases.update_many({"_id": {"$in": renew}, "owner": self.replica_id}, {"$set": {"expires_at": expires_at}})
+            if result.matched_count == len(renew):
+                kept = set(renew)
+            else:
+                kept = {doc["_id"] for doc in self.leases.find({"_id": {"$in": renew}, "owner": self.replica_id}, {"_id": 1})}
+
+        acquired = {}
+        candidates = sorted(wanted - kept)
+        if candidates:
+            current = {doc["_id"]: doc for doc in self.leases.find({"_id": {"$in": candidates}}, {"owner": 1, "expires_at": 1})}
+            for key in candidates:
+                doc = current.get(key)
+                if doc is not None and doc.get("owner") not in (None, self.replica_id) and doc.get("expires_at", now) > now:
+                    continue  # Still held by a live replica, which hands it over once it sees the new ring
+                try:
+                    doc = self.leases.find_one_and_update(
+                        {"_id": key, "$or": [{"owner": self.replica_id}, {"expires_at": {"$lte": now}}]},
+                        {"$set": {"owner": self.replica_id, "expires_at": expires_at, "acquired_at": now}},
+                        upsert=True, return_document=ReturnDocument.AFTER
+                    )
+                except DuplicateKeyError:
+                    continue
+                acquired[key] = doc.get("state")
+
+        lost = set(renew) - kept
+        handing_over = held - wanted
+        with self.lock:
+            self.held = {key: deadline for key in kept | set(acquired)}
+            self.handing_over = handing_over
+            for key, state in acquired.items():
+                self.states[key] = state
+            for key in releasing | lost | expired:
+                if key not in self.held:
+                    self.states.pop(key, None)
+        self.stats["acquired"] += len(acquired)
+        self.stats["lost"] += len(lost) + len(expired - set(acquired))
+        if lost:
+            self.logger.warning(f"Lost {len(lost)} leases to other replicas before handing them over")
+        if acquired or handing_over:
+            self.logger.info(f"Leases: acquired {len(acquired)}, handing over {len(handing_over)}, holding {len(kept) + len(acquired)}")
+        return bool(acquired or handing_over or lost or expired)
+
+    def stop(self):
+        """Stop heartbeating and release every lease and the membership so other replicas take over at once."""
+        self.stopped.set()
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join(self.heartbeat_seconds + 5)
+            self.thread = None
+        with self.tick_lock:
+            with self.lock:
+                keys = sorted(set(self.held) | self.handing_over)
+                states = {key: self.states[key] for key in self.dirty_states if key in keys}
+                self.held = {}
+                self.handing_over = set()
+                self.dirty_states.clear()
+            try:
+                if states:
+                    self.leases.bulk_write([
+                        UpdateOne({"_id": key, "owner": self.replica_id}, {"$set": {"state": state}}) for key, state in states.items()
+                    ], ordered=False)
+                if keys:
+                    self.leases.update_many({"_id": {"$in": keys}, "owner": self.replica_id}, {"$set": {"expires_at": datetime.utcnow()}, "$unset": {"owner": ""}})
+                self.replicas.delete_one({"_id": self.replica_id})
+            except PyMongoError as e:
+                self.logger.error(f"Failed to release leases for replica {self.replica_id}, they expire in {self.lease_seconds}s: {e}")
+        self.stats["released"] += len(keys)
+
+    def get_stats(self):
+        with self.lock:
+            known = sum(len(keys) for keys in self.scopes.values())
+            handing_over = len(self.handing_over)
+        return dict(
+            self.stats,
+            replica_id=self.replica_id,
+            replicas=len(self.members),
+            partitions=known,
+            held=len(self.owned()),
+            handing_over=handing_over
+        )
+
+
+def leases_enabled():
+    return os.getenv("REPLICA_LEASES", "false").lower() == "true"
+
+
+_shared = None
+_shared_users = 0
+_shared_lock = threading.Lock()
+
+
+def open_lease_manager(logger=None):
+    """Return this process's LeaseManager, started for the first agent that asks; None unless REPLICA_LEASES is on.
+
+    Agents in one process share a replica identity, so every caller must pair this with close_lease_manager().
+    """
+    global _shared, _shared_users
+    if not leases_enabled():
+        return None
+    with _shared_lock:
+        if _shared is None:
+            client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+            db = client["rules_engine"]
+            try:
+                # Membership documents of replicas that never stopped cleanly are removed an hour after they expire
+                db[REPLICA_COLLECTION].create_index("expires_at", expireAfterSeconds=3600)
+            except PyMongoError as e:
+                (logger or logging.getLogger("LEASES")).warning(f"Could not create the replica expiry index: {e}")
+            _shared = LeaseManager(
+                db[LEASE_COLLECTION], db[REPLICA_COLLECTION],
+                replica_id=os.getenv("REPLICA_ID") or None,
+                lease_seconds=float(os.getenv("REPLICA_LEASE_SECONDS", "10")),
+                heartbeat_seconds=float(os.getenv("REPLICA_HEARTBEAT_SECONDS", "3")),
+                clock_skew_seconds=float(os.getenv("REPLICA_CLOCK_SKEW_SECONDS", "1")),
+                logger=logger
+            )
+            _shared.client = client
+            _shared.start()
+            _shared.logger.info(f"Replica {_shared.replica_id} joined lease coordination")
+        _shared_users += 1
+        return _shared
+
+
+def close_lease_manager(listener=None, scopes=()):
+    """Drop one agent's use of the shared LeaseManager; the last one out releases every lease."""
+    global _shared, _shared_users
+    with _shared_lock:
+        if _shared is None:
+            return
+        if listener is not None:
+            _shared.remove_listener(listener)
+        for scope in scopes:
+            _shared.withdraw(scope)
+        _shared_users -= 1
+        if _shared_users > 0:
+            return
+        manager, _shared = _shared, None
+    manager.stop()
+    manager.client.close()
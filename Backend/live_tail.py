@@ -0,0 +1,267 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from abc import ABC, abstractmethod
+from rate_governor import governor
+
+MAX_GROUPS_PER_SESSION = 10  # StartLiveTail accepts at most 10 log group identifiers
+
+
+class StreamTransport(ABC):
+    """Source of pushed log events for a set of log groups."""
+    def available(self):
+        """Return False when streaming cannot work at all here, so log groups stay on polling."""
+        return True
+
+    @abstractmethod
+    def stream(self, log_groups, filter_pattern, stopped):
+        """Yield (log_group, events) batches as they arrive until stopped is set or the session ends.
+
+        Events use the filter_log_events shape (timestamp, message, eventId, logStreamName), eventId may be None.
+        """
+
+
+class CloudWatchLiveTailTransport(StreamTransport):
+    """StartLiveTail sessions on a CloudWatch Logs client."""
+    def __init__(self, cloudwatch):
+        self.cloudwatch = cloudwatch
+        self.arns = {}
+
+    def available(self):
+        # StartLiveTail needs boto3/botocore 1.35 or newer; older clients have no start_live_tail
+        return hasattr(self.cloudwatch, "start_live_tail")
+
+    def _arn(self, log_group):
+        if log_group not in self.arns:
+            page = governor.call(self.cloudwatch, "describe_log_groups", logGroupNamePrefix=log_group)
+            for group in page.get("logGroups", []):
+                if group["logGroupName"] == log_group:
+                    arn = group.get("logGroupArn") or group["arn"]
+                    self.arns[log_group] = arn[:-2] if arn.endswith(":*") else arn
+                    break
+            else:
+                raise ValueError(f"Log group {log_group} not found")
+        return self.arns[log_group]
+
+    def stream(self, log_groups, filter_pattern, stopped):
+        names = {self._arn(group): group for group in log_groups}
+        kwargs = {"logGroupIdentifiers": list(names)}
+        if filter_pattern:
+            kwargs["logEventFilterPattern"] = filter_pattern
+        response_stream = governor.call(self.cloudwatch, "start_live_tail", **kwargs)["responseStream"]
+        try:
+            for item in response_stream:
+                if stopped.is_set():
+                    return
+                for error in ("SessionTimeoutException", "SessionStreamingException"):
+                    if error in item:
+                        raise RuntimeError(f"{error}: {item[error].get('message', '')}")
+                batches = {}
+                for result in item.get("sessionUpdate", {}).get("sessionResults", []):
+                    identifier = result.get("logGroupIdentifier", "")
+                    log_group = names.get(identifier) or identifier.split(":log-group:")[-1]
+                    batches.setdefault(log_group, []).append({
+                        "timestamp": result.get("timestamp", 0),
+                        "ingestionTime": result.get("ingestionTime"),
+                        "logStreamName": result.get("logStreamName"),
+                        # Live tail results carry no eventId; cursors de-duplicate on event_key() instead
+                        "message": result.get("message", ""),
+                        "eventId": None
+                    })
+                for log_group, events in batches.items():
+                    events.sort(key=lambda event: event["timestamp"])
+                    yield log_group, events
+        finally:
+            response_stream.close()
+
+
+class LocalStreamTransport(StreamTransport):
+    """In-process stand-in stream: events pushed with push() are delivered to the subscribed sessions."""
+    def __init__(self, poll_interval=0.05):
+        self.poll_interval = poll_interval
+        self.queues = {}
+        self.lock = threading.Lock()
+
+    def _queue(self, log_group):
+        with self.lock:
+            return self.queues.setdefault(log_group, queue.Queue())
+
+    def push(self, log_group, events):
+        self._queue(log_group).put(list(events))
+
+    def stream(self, log_groups, filter_pattern, stopped):
+        queues = [(group, self._queue(group)) for group in log_groups]
+        while not stopped.is_set():
+            delivered = False
+            for log_group, pending in queues:
+                try:
+                    events = pending.get_nowait()
+                except queue.Empty:
+                    continue
+                delivered = True
+                yield log_group, events
+            if not delivered:
+                stopped.wait(self.poll_interval)
+
+
+class TailSession:
+    """One streaming session for up to MAX_GROUPS_PER_SESSION log groups sharing a filter pattern."""
+    def __init__(self, ingestor, log_groups, filter_pattern):
+        self.ingestor = ingestor
+        self.log_groups = list(log_groups)
+        self.filter_pattern = filter_pattern
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="live-tail", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def _run(self):
+        ingestor = self.ingestor
+        while not self.stopped.is_set():
+            try:
+                for log_group, events in ingestor.transport.stream(self.log_groups, self.filter_pattern, self.stopped):
+                    ingestor.deliver(log_group, events)
+                    if self.stopped.is_set():
+                        return
+                if self.stopped.is_set():
+                    return
+                # Sessions end after their maximum duration; reopen, and poll once to cover the reconnect gap
+                ingestor.logger.info(f"Live tail session for {len(self.log_groups)} {ingestor.monitor.service_name} log groups ended, reconnecting")
+                ingestor.request_poll(self.log_groups)
+            except Exception as e:
+                ingestor.session_failed(self, e)
+                return
+
+
+class LiveTailIngestor:
+    """Feeds pushed events into a monitor's detection path, falling back to polling for groups whose stream fails.
+
+    subscribe() is called for every log group on each scan pass: it returns True while the group is served by a
+    live session (so the pass skips polling it) and False when the group must still be polled. Whenever a
+    group's session is (re)started, events written while no session was open are only reachable by polling,
+    so the group is polled from its cursor once more on the next pass.
+    """
+    def __init__(self, monitor, transport, loop, retry_seconds=300, logger=None):
+        self.monitor = monitor
+        self.transport = transport
+        self.loop = loop
+        self.retry_seconds = retry_seconds
+        self.logger = logger or logging.getLogger("MONITOR")
+        self.sessions = []
+        self.group_sessions = {}  # log_group -> TailSession
+        self.retry_at = {}  # log_group -> monotonic time streaming may be retried
+        self.poll_once = set()  # Groups whose session restarted since they were last polled
+        self.available = None  # Whether the transport can stream, checked on the first subscribe
+        self.lock = threading.Lock()
+        self.stats = {"batches": 0, "events": 0, "session_failures": 0, "gap_polls": 0}
+
+    def request_poll(self, log_groups):
+        """Have the next scan pass poll these groups from their cursors, covering a session restart."""
+        with self.lock:
+            self.poll_once.update(log_groups)
+
+    def subscribe(self, log_group):
+        """Ensure a log group is being streamed; returns True if polling it can be skipped."""
+        if self.available is None:
+            self.available = self.transport.available()
+            if not self.available:
+                self.logger.warning(f"Live tail is not supported by this AWS SDK, polling {self.monitor.service_name} log groups instead")
+        if not self.available:
+            return False
+        filter_pattern = self.monitor.filter_pattern_for(log_group)
+        with self.lock:
+            session = self.group_sessions.get(log_group)
+            if session is not None and session.filter_pattern == filter_pattern and not session.stopped.is_set():
+                if log_group in self.poll_once:
+                    self.poll_once.discard(log_group)
+                    self.stats["gap_polls"] += 1
+                    return False
+                return True
+            if time.monotonic() < self.retry_at.get(log_group, 0):
+                return False
+            if session is not None:
+                self._remove(log_group)
+            # Join an open session with the same pattern by restarting it with one more group
+            peer = next(
+                (s for s in self.sessions if s.filter_pattern == filter_pattern and len(s.log_groups) < MAX_GROUPS_PER_SESSION),
+                None
+            )
+            log_groups = [log_group]
+            if peer is not None:
+                peer.stop()
+                self.sessions.remove(peer)
+                log_groups = peer.log_groups + log_groups
+            new_session = TailSession(self, log_groups, filter_pattern)
+            self.sessions.append(new_session)
+            for group in log_groups:
+                self.group_sessions[group] = new_session
+            new_session.start()
+            # The peer's groups were not streamed while it restarted
+            self.poll_once.update(group for group in log_groups if group != log_group)
+            self.poll_once.discard(log_group)
+        self.logger.info(f"Streaming {self.monitor.service_name} log group {log_group} via live tail")
+        # Poll this pass once more so events written before the session opened are not missed
+        return False
+
+    def _remove(self, log_group):
+        session = self.group_sessions.pop(log_group, None)
+        if session is None:
+            return
+        session.stop()
+        if session in self.sessions:
+            self.sessions.remove(session)
+        remaining = [group for group in session.log_groups if group != log_group]
+        if remaining:
+            replacement = TailSession(self, remaining, session.filter_pattern)
+            self.sessions.append(replacement)
+            for group in remaining:
+                self.group_sessions[group] = replacement
+            replacement.start()
+            self.poll_once.update(remaining)
+
+    def deliver(self, log_group, events):
+        """Run detection for streamed events on the monitor's event loop, in arrival order."""
+        future = asyncio.run_coroutine_threadsafe(self._process(log_group, events), self.loop)
+        future.result()  # Wait so one session's batches are processed in order
+
+    async def _process(self, log_group, events):
+        # Runs on the event loop, the only thread that reads or advances the reader's cursors
+        cursor = self.monitor.reader.cursor(log_group)
+        events = [event for event in events if cursor.is_new(event)]
+        if not events:
+            return
+        self.stats["batches"] += 1
+        self.stats["events"] += len(events)
+        await self.monitor.process_new_events(log_group, events)
+
+    def session_failed(self, session, error):
+        """Fall back to polling for a failed session's groups until the retry time."""
+        self.logger.warning(f"Live tail failed for {self.monitor.service_name} log groups {session.log_groups}: {error}, polling for {self.retry_seconds}s")
+        with self.lock:
+            self.stats["session_failures"] += 1
+            if session in self.sessions:
+                self.sessions.remove(session)
+            retry_at = time.monotonic() + self.retry_seconds
+            for group in session.log_groups:
+                if self.group_sessions.get(group) is session:
+                    del self.group_sessions[group]
+                self.retry_at[group] = retry_at
+                self.poll_once.discard(group)
+
+    def stop(self):
+        with self.lock:
+            for session in self.sessions:
+                session.stop()
+            self.sessions = []
+            self.group_sessions = {}
+            self.poll_once = set()
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, sessions=len(self.sessions), streaming_groups=len(self.group_sessions))
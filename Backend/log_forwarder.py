@@ -1,5 +1,4 @@
 import snowflake.connector
-import boto3
 import win32evtlog
 from datetime import datetime, timedelta, timezone
 import logging
@@ -13,6 +12,10 @@ import json
 import asyncio
 import requests
 from utils import setup_logging
+from aws_clients import get_client
+from rate_governor import governor
+from poll_scheduler import PollScheduler
+from leases import close_lease_manager, open_lease_manager
 
 load_dotenv()
 
@@ -40,8 +43,8 @@ class LogForwarderAgent:
             self.target_server = os.getenv("WINDOWS_TARGET_SERVER", "localhost")
         self.hostname = socket.gethostname() if self.target_server == "localhost" else self.target_server
         
-        # CloudWatch client for ap-south-1 region
-        self.cloudwatch = boto3.client('logs', region_name='ap-south-1')
+        # Shared CloudWatch client for ap-south-1 region
+        self.cloudwatch = get_client('logs', region_name='ap-south-1', governed=True)
         self.sequence_token = {}
         self.last_event_record = self.get_latest_event_record()
 
@@ -80,6 +83,17 @@ class LogForwarderAgent:
         self.databricks_poll_interval = 10  # seconds
         self.max_wait_time = 60  # Maximum seconds to wait for query to reach terminal state
 
+        # Each source (and each Snowflake view) is polled on its own adaptive cadence
+        self.poll_sources = ["windows"] + [f"snowflake:{view}" for view in self.LOG_CONFIG] + ["databricks"]
+        self.poll_scheduler = PollScheduler(
+            base_interval=self.databricks_poll_interval,
+            min_interval=float(os.getenv("FORWARDER_POLL_MIN_SECONDS", "2")),
+            max_interval=float(os.getenv("FORWARDER_POLL_MAX_SECONDS", "120"))
+        )
+        self.leases = None  # LeaseManager when replicas split the sources through MongoDB leases
+        self.leased_sources = set()
+        self.databricks_recent_ids = []  # Query IDs on the latest history page, handed to the next lease holder
+
     def get_latest_event_record(self):
         try:
             hand = win32evtlog.OpenEventLog(self.target_server, 'System')
@@ -99,16 +113,16 @@ class LogForwarderAgent:
     def ensure_log_group_exists(self, log_group):
         self.logger.debug(f"Checking if log group {log_group} exists", extra={"source": "CloudWatch"})
         try:
-            groups = self.cloudwatch.describe_log_groups(logGroupNamePrefix=log_group)
+            groups = governor.call(self.cloudwatch, 'describe_log_groups', logGroupNamePrefix=log_group)
             if not any(group['logGroupName'] == log_group for group in groups.get('logGroups', [])):
-                self.cloudwatch.create_log_group(logGroupName=log_group)
+                governor.call(self.cloudwatch, 'create_log_group', logGroupName=log_group)
                 self.logger.info(f"Created log group: {log_group}", extra={"source": "CloudWatch"})
         except Exception as e:
             self.logger.error(f"Failed to check or create log group {log_group}: {e}", extra={"source": "CloudWatch"})
 
     def create_log_stream(self, log_group, log_stream):
         try:
-            self.cloudwatch.create_log_stream(logGroupName=log_group, logStreamName=log_stream)
+            governor.call(self.cloudwatch, 'create_log_stream', logGroupName=log_group, logStreamName=log_stream)
             self.logger.debug(f"Created log stream: {log_group}/{log_stream}", extra={"source": "CloudWatch"})
         except self.cloudwatch.exceptions.ResourceAlreadyExistsException:
             self.logger.debug(f"Log stream already exists: {log_group}/{log_stream}", extra={"source": "CloudWatch"})
@@ -128,14 +142,14 @@ class LogForwarderAgent:
         try:
             if log_stream in self.sequence_token:
                 kwargs['sequenceToken'] = self.sequence_token[log_stream]
-            response = self.cloudwatch.put_log_events(**kwargs)
+            response = governor.call(self.cloudwatch, 'put_log_events', **kwargs)
             self.sequence_token[log_stream] = response['nextSequenceToken']
             self.logger.info(f"Sent log to {log_group}/{log_stream}", extra={"source": "CloudWatch"})
         except self.cloudwatch.exceptions.InvalidSequenceTokenException as e:
             expected = str(e).split("expected sequenceToken is: ")[-1]
             self.sequence_token[log_stream] = expected
             kwargs['sequenceToken'] = expected
-            response = self.cloudwatch.put_log_events(**kwargs)
+            response = governor.call(self.cloudwatch, 'put_log_events', **kwargs)
             self.sequence_token[log_stream] = response['nextSequenceToken']
             self.logger.info(f"Retried log to {log_group}/{log_stream} after token fix", extra={"source": "CloudWatch"})
         except Exception as e:
@@ -155,9 +169,10 @@ class LogForwarderAgent:
             events = win32evtlog.ReadEventLog(hand, flags, self.last_event_record)
             if not events:
                 self.logger.info(f"No new Windows System log events from {self.target_server}", extra={"source": "Windows"})
-                return
+                return 0
             self.logger.info(f"Found {len(events)} new Windows System log events from {self.target_server}", extra={"source": "Windows"})
             latest_record = self.last_event_record
+            forwarded = 0
             for event in events:
                 if event.RecordNumber > self.last_event_record:
                     event_data = {
@@ -171,12 +186,15 @@ class LogForwarderAgent:
                     }
                     self.send_log_event(log_group, log_stream, event_data)
                     latest_record = max(latest_record, event.RecordNumber)
+                    forwarded += 1
             self.last_event_record = latest_record
             self.logger.info(f"Updated last event record to {self.last_event_record} for {self.target_server}", extra={"source": "Windows"})
+            return forwarded
         except Exception as e:
             self.logger.error(f"Error fetching Windows System logs from {self.target_server}: {e}", extra={"source": "Windows"})
             with open("C:/Users/Quadrant/Loganalytics/Backend/windows_errors.log", "a", encoding="utf-8") as f:
                 f.write(f"[{datetime.now()}] Error fetching Windows System logs from {self.target_server}: {e}\n{'-' * 60}\n")
+            return 0
         finally:
             if 'hand' in locals():
                 win32evtlog.CloseEventLog(hand)
@@ -184,7 +202,7 @@ class LogForwarderAgent:
     def fetch_and_forward_snowflake_logs(self, view_name, timestamp_col):
         if not self.conn:
             self.logger.warning(f"Skipping {view_name} fetch: No Snowflake connection", extra={"source": "Snowflake"})
-            return
+            return 0
         log_group = f"/snowflake/{view_name}"
         log_stream = datetime.now(timezone.utc).strftime("%Y-%m-%d-%H")
         self.ensure_log_group_exists(log_group)
@@ -212,10 +230,12 @@ class LogForwarderAgent:
                     }
                     self.send_log_event(log_group, log_stream, message)
                 self.last_timestamps[view_name] = rows[-1][columns.index(timestamp_col)]
+            return len(rows)
         except Exception as e:
             self.logger.error(f"Error fetching {view_name}: {e}", extra={"source": "Snowflake"})
             with open("C:/Users/Quadrant/Loganalytics/Backend/windows_errors.log", "a", encoding="utf-8") as f:
                 f.write(f"[{datetime.now()}] Error fetching {view_name}: {e}\n{'-' * 60}\n")
+            return 0
         finally:
             cursor.close()
 
@@ -311,6 +331,7 @@ class LogForwarderAgent:
             response = requests.get(url, headers=headers, params={"max_results": 20})
             if response.status_code == 200:
                 data = response.json()
+                self.databricks_recent_ids = [query.get("query_id") for query in data.get("res", [])]
                 new_queries = []
                 for query in data.get("res", []):
                     query_id = query.get("query_id")
@@ -329,25 +350,83 @@ class LogForwarderAgent:
                             self.logger.warning(f"Skipping query {query_id} due to timeout or error", extra={"source": "Databricks"})
                 else:
                     self.logger.info("No new Databricks queries found", extra={"source": "Databricks"})
+                return len(new_queries)
             else:
                 self.logger.error(f"Failed to fetch Databricks query history: {response.text}", extra={"source": "Databricks"})
         except Exception as e:
             self.logger.error(f"Error fetching Databricks queries: {e}", extra={"source": "Databricks"})
             with open("C:/Users/Quadrant/Loganalytics/Backend/windows_errors.log", "a", encoding="utf-8") as f:
                 f.write(f"[{datetime.now()}] Error fetching Databricks queries: {e}\n{'-' * 60}\n")
+        return 0
+
+    async def poll_source(self, source):
+        """Poll one source and return how many log events it forwarded."""
+        if source == "windows":
+            return self.fetch_and_forward_windows_logs()
+        if source == "databricks":
+            return await self.fetch_and_forward_databricks_logs()
+        view_name = source.split(":", 1)[1]
+        return self.fetch_and_forward_snowflake_logs(view_name, self.LOG_CONFIG[view_name])
+
+    def lease_key(self, source):
+        """Lease partition for a poll source every replica shares, or None for a host-local one.
+
+        Windows event logs are read from this replica's own target server, which no other replica can forward,
+        so they are never leased.
+        """
+        if source == "windows":
+            return None
+        return f"forwarder:{source}"
+
+    def owned_sources(self):
+        """Return the poll sources this replica forwards, resuming newly leased ones where their last holder stopped."""
+        if self.leases is None:
+            return self.poll_sources
+        owned = [source for source in self.poll_sources if self.lease_key(source) is None or self.leases.owns(self.lease_key(source))]
+        for source in {source for source in owned if self.lease_key(source) is not None} - self.leased_sources:
+            state = self.leases.state(self.lease_key(source)) or {}
+            if source.startswith("snowflake:") and state.get("last_timestamp"):
+                self.last_timestamps[source.split(":", 1)[1]] = datetime.fromisoformat(state["last_timestamp"])
+            elif source == "databricks" and state.get("recent_query_ids"):
+                self.seen_query_ids.update(state["recent_query_ids"])
+            self.logger.info(f"Took over forwarding of {source}", extra={"source": "System"})
+        self.leased_sources = {source for source in owned if self.lease_key(source) is not None}
+        return owned
+
+    def save_lease_state(self, source):
+        """Store a source's read position with its lease so another replica can continue from it."""
+        if self.leases is None:
+            return
+        if source.startswith("snowflake:"):
+            last_timestamp = self.last_timestamps[source.split(":", 1)[1]]
+            self.leases.set_state(self.lease_key(source), {"last_timestamp": last_timestamp.isoformat()})
+        elif source == "databricks":
+            self.leases.set_state(self.lease_key(source), {"recent_query_ids": self.databricks_recent_ids})
 
     async def run_async(self):
         self.logger.info(f"Starting real-time log forwarding for Windows ({self.target_server}), Snowflake, and Databricks...", extra={"source": "System"})
+        loop = asyncio.get_running_loop()
+        leases_changed = asyncio.Event()
+        listener = lambda: loop.call_soon_threadsafe(leases_changed.set)
         try:
+            self.leases = await loop.run_in_executor(None, open_lease_manager, self.logger)
+            if self.leases is not None:
+                self.leases.add_listener(listener)
+                self.leases.offer("forwarder", [self.lease_key(source) for source in self.poll_sources if self.lease_key(source) is not None])
+                await loop.run_in_executor(None, self.leases.heartbeat)
             while True:
-                self.fetch_and_forward_windows_logs()
-                for log_type, time_col in self.LOG_CONFIG.items():
-                    self.fetch_and_forward_snowflake_logs(log_type, time_col)
-                await self.fetch_and_forward_databricks_logs()
-                await asyncio.sleep(self.databricks_poll_interval)
+                sources = self.owned_sources()
+                for source in self.poll_scheduler.due(sources):
+                    self.poll_scheduler.record(source, await self.poll_source(source))
+                    self.save_lease_state(source)
+                await self.poll_scheduler.wait(sources, wake=leases_changed)
+                leases_changed.clear()
         except asyncio.CancelledError:
             self.logger.info("Log forwarding stopped by user", extra={"source": "System"})
         finally:
+            if self.leases is not None:
+                close_lease_manager(listener, ["forwarder"])
+                self.leases = None
             if self.conn:
                 self.conn.close()
                 self.logger.info("Snowflake connection closed", extra={"source": "Snowflake"})
@@ -0,0 +1,86 @@
+import logging
+import os
+import threading
+import time
+from rate_governor import governor
+
+
+class LogGroupCatalog:
+    """Process-wide cache of describe_log_groups results with TTL and stale-while-revalidate refresh."""
+    def __init__(self, ttl=300, max_stale=3600, logger=None):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.logger = logger or logging.getLogger("MONITOR")
+        self.entries = {}  # (region, prefix) -> (fetched_at, log_groups)
+        self.refreshing = set()
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0}
+
+    def _fetch(self, cloudwatch, prefix):
+        log_groups = []
+        kwargs = {"logGroupNamePrefix": prefix}
+        while True:
+            page = governor.call(cloudwatch, "describe_log_groups", **kwargs)
+            for group in page['logGroups']:
+                log_groups.append(group['logGroupName'])
+            if not page.get("nextToken"):
+                return log_groups
+            kwargs["nextToken"] = page["nextToken"]
+
+    def _refresh(self, key, cloudwatch, prefix):
+        try:
+            log_groups = self._fetch(cloudwatch, prefix)
+            with self.lock:
+                self.entries[key] = (time.monotonic(), log_groups)
+                self.stats["refreshes"] += 1
+            self.logger.info(f"Refreshed log group catalog for prefix {prefix}: {len(log_groups)} log groups")
+        except Exception as e:
+            with self.lock:
+                self.stats["refresh_errors"] += 1
+            self.logger.error(f"Error refreshing log group catalog for prefix {prefix}: {e}")
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def get(self, cloudwatch, region, prefix):
+        """Return log groups under a prefix, answering from cache and refreshing in the background once stale."""
+        key = (region, prefix)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                age = now - entry[0]
+                if age < self.ttl:
+                    self.stats["hits"] += 1
+                    return list(entry[1])
+                if age < self.max_stale:
+                    self.stats["stale_hits"] += 1
+                    if key not in self.refreshing:
+                        self.refreshing.add(key)
+                        threading.Thread(target=self._refresh, args=(key, cloudwatch, prefix), daemon=True).start()
+                    return list(entry[1])
+            self.stats["misses"] += 1
+        self.logger.info(f"Fetching recent CloudWatch log groups for prefix: {prefix}...")
+        log_groups = self._fetch(cloudwatch, prefix)
+        with self.lock:
+            self.entries[key] = (time.monotonic(), log_groups)
+        self.logger.info(f"Found {len(log_groups)} log groups")
+        return list(log_groups)
+
+    def invalidate(self, region=None, prefix=None):
+        """Drop cached entries, optionally only those for a region and/or prefix."""
+        with self.lock:
+            for key in list(self.entries):
+                if (region is None or key[0] == region) and (prefix is None or key[1] == prefix):
+                    del self.entries[key]
+
+    def get_stats(self):
+        """Return a copy of the cache hit/miss counters."""
+        with self.lock:
+            return dict(self.stats, entries=len(self.entries))
+
+
+catalog = LogGroupCatalog(
+    ttl=int(os.getenv("LOG_GROUP_CATALOG_TTL_SECONDS", "300")),
+    max_stale=int(os.getenv("LOG_GROUP_CATALOG_MAX_STALE_SECONDS", "3600"))
+)
@@ -117,12 +117,23 @@ agents = {
     "group_chat": None,
     "chat_manager": None
 }
+stopping_monitors = []  # Monitor agents told to stop that may still be saving their final checkpoints
+MONITOR_STOP_TIMEOUT = float(os.getenv("MONITOR_STOP_TIMEOUT_SECONDS", "90"))
 
 @app.get("/start-agents")
 def start_agents(mode: str = Query("semi-autonomous", enum=["semi-autonomous", "autonomous"])):
     try:
         global agents
 
+        # Let a previous monitor finish its final pass and checkpoints, so two never scan the same log groups
+        if agents["monitor_agent"]:
+            agents["monitor_agent"].stop()
+            stopping_monitors.append(agents["monitor_agent"])
+        while stopping_monitors:
+            if not stopping_monitors[-1].wait_stopped(MONITOR_STOP_TIMEOUT):
+                return {"status": "Failed to start agents: the previous monitor agent is still stopping"}
+            stopping_monitors.pop()
+
         # Initialize agents based on mode
         agents["error_analyzer"] = ErrorAnalyzerAgent(name="ErrorAnalyzerAgent", llm_config=llm_config, ws_manager=manager)
         agents["fixer_agent"] = FixerAgent(name="FixerAgent", llm_config=llm_config, analyzer_agent=agents["error_analyzer"], ws_manager=manager)
@@ -184,6 +195,8 @@ def stop_agents():
                 try:
                     agent.stop()
                     stopped_agents.append(agent_name)
+                    if agent_name == "monitor_agent":
+                        stopping_monitors.append(agent)
                 except Exception as e:
                     print(f"Error stopping {agent_name}: {str(e)}", file=sys.stderr)
 
@@ -205,6 +218,24 @@ def start_logging():
         return {"status": "Chat initiated"}
     return {"status": "Failed to initiate chat due to missing agents"}
 
+@app.get("/polling-cadence")
+def polling_cadence():
+    """Current polling interval and next poll time per source for each running agent."""
+    return {
+        agent_name: agent.poll_scheduler.get_cadence()
+        for agent_name, agent in agents.items()
+        if agent is not None and hasattr(agent, "poll_scheduler")
+    }
+
+@app.get("/scan-stats")
+def scan_stats():
+    """Last scan pass timings, cache, queue, correlation and lateness statistics for each running monitor agent."""
+    return {
+        agent_name: agent.get_scan_stats()
+        for agent_name, agent in agents.items()
+        if agent is not None and hasattr(agent, "get_scan_stats")
+    }
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     try:
@@ -0,0 +1,211 @@
+import threading
+import time
+from bisect import bisect_right, insort
+from collections import OrderedDict
+
+
+class EWMA:
+    """Exponentially weighted moving average and variance of a numeric series."""
+    __slots__ = ("alpha", "mean", "variance", "count")
+
+    def __init__(self, alpha=0.3):
+        self.alpha = alpha
+        self.mean = None
+        self.variance = 0.0
+        self.count = 0
+
+    def update(self, value):
+        """Add a sample and return the smoothed mean."""
+        self.count += 1
+        if self.mean is None:
+            self.mean = value
+            return value
+        diff = value - self.mean
+        increment = self.alpha * diff
+        self.mean += increment
+        self.variance = (1 - self.alpha) * (self.variance + diff * increment)
+        return self.mean
+
+
+class P2Quantile:
+    """Streaming quantile estimate in constant memory (Jain & Chlamtac's P-square algorithm, five markers)."""
+    __slots__ = ("p", "heights", "positions", "desired", "increments")
+
+    def __init__(self, p=0.95):
+        self.p = p
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, value):
+        heights = self.heights
+        if len(heights) < 5:
+            insort(heights, value)
+            return
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = bisect_right(heights, value) - 1
+        positions = self.positions
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+        # Move the three middle markers towards their desired positions, one step at a time
+        for i in (1, 2, 3):
+            offset = self.desired[i] - positions[i]
+            if (offset >= 1 and positions[i + 1] - positions[i] > 1) or (offset <= -1 and positions[i - 1] - positions[i] < -1):
+                step = 1 if offset > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + step * (heights[i + step] - heights[i]) / (positions[i + step] - positions[i])
+                heights[i] = height
+                positions[i] += step
+
+    def _parabolic(self, i, step):
+        q, n = self.heights, self.positions
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self):
+        """Return the current estimate, or None before the first sample."""
+        heights = self.heights
+        if not heights:
+            return None
+        if len(heights) < 5:
+            return heights[min(len(heights) - 1, int(round(self.p * (len(heights) - 1))))]
+        return heights[2]
+
+
+class SustainedTimer:
+    """Tracks how long a series has stayed in breach and fires once per breach."""
+    __slots__ = ("since", "fired")
+
+    def __init__(self):
+        self.since = None  # Time of the first sample of the current breach
+        self.fired = False
+
+    def update(self, breached, timestamp, duration_seconds):
+        """Record a sample; returns the breach length in seconds the first time it reaches the duration, else None."""
+        if not breached:
+            self.since = None
+            self.fired = False
+            return None
+        if self.since is None:
+            self.since = timestamp
+        elapsed = timestamp - self.since
+        if not self.fired and elapsed >= duration_seconds:
+            self.fired = True
+            return elapsed
+        return None
+
+
+class MetricSeries:
+    """Per-entity detector state for one metric rule: smoothed level, p95 and breach timer."""
+    __slots__ = ("ewma", "quantile", "timer", "peak", "last_seen")
+
+    def __init__(self, alpha, quantile):
+        self.ewma = EWMA(alpha)
+        self.quantile = P2Quantile(quantile)
+        self.timer = SustainedTimer()
+        self.peak = None
+        self.last_seen = 0.0
+
+
+class StreamingDetectorEngine:
+    """Keyed streaming detectors for sustained metric rules, with bounded memory and idle-series eviction.
+
+    A sample breaches when it is past the rule's threshold. While a breach is running, a sample back inside
+    the threshold only ends it once the smoothed level has also recovered, so a single dip does not restart
+    the timer; a gap longer than max_gap_seconds between samples always does.
+    """
+    def __init__(self, alpha=0.3, quantile=0.95, max_gap_seconds=180, max_series=50000, sweep_every=1000):
+        self.alpha = alpha
+        self.quantile = quantile
+        self.max_gap_seconds = max_gap_seconds
+        self.max_series = max_series
+        self.sweep_every = sweep_every
+        self.series = OrderedDict()  # (rule_id, key) -> MetricSeries
+        self.lock = threading.Lock()
+        self.updates = 0
+        self.evicted = 0
+        self.breaches = 0
+
+    def record(self, rule_id, key, value, threshold, timestamp=None):
+        """Add a sample for (rule, key); returns breach details once it has lasted the threshold's duration."""
+        timestamp = timestamp if timestamp is not None else time.time()
+        series_key = (rule_id, key)
+        with self.lock:
+            series = self.series.get(series_key)
+            if series is None:
+                series = MetricSeries(self.alpha, self.quantile)
+                self.series[series_key] = series
+                if len(self.series) > self.max_series:
+                    self.series.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self.series.move_to_end(series_key)
+            if series.timer.since is not None and timestamp - series.last_seen > self.max_gap_seconds:
+                series.timer.update(False, timestamp, threshold.duration_seconds)
+                series.peak = None
+            smoothed = series.ewma.update(value)
+            series.quantile.add(value)
+            series.last_seen = max(series.last_seen, timestamp)
+            breached = threshold.breached(value)
+            if not breached and series.timer.since is not None and threshold.duration_seconds:
+                breached = threshold.breached(smoothed)
+            if not breached:
+                series.peak = None
+            elif series.peak is None:
+                series.peak = value
+            else:
+                series.peak = min(series.peak, value) if threshold.op in ("<", "<=") else max(series.peak, value)
+            elapsed = series.timer.update(breached, timestamp, threshold.duration_seconds)
+            self.updates += 1
+            if self.updates % self.sweep_every == 0:
+                self._sweep(timestamp)
+            if elapsed is None:
+                return None
+            self.breaches += 1
+            return {
+                "value": value,
+                "sustained_seconds": round(elapsed, 1),
+                "smoothed": round(smoothed, 3),
+                "peak": series.peak,
+                "p95": round(series.quantile.value(), 3),
+                "samples": series.ewma.count
+            }
+
+    def _sweep(self, now):
+        # A series idle for longer than the gap limit cannot continue its breach, so it is dropped
+        idle = [series_key for series_key, series in self.series.items() if now - series.last_seen > self.max_gap_seconds]
+        for series_key in idle:
+            del self.series[series_key]
+        self.evicted += len(idle)
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "series": len(self.series),
+                "updates": self.updates,
+                "evicted": self.evicted,
+                "breaches": self.breaches,
+                "in_breach": sum(1 for series in self.series.values() if series.timer.since is not None)
+            }
+
+
+class SustainedRuleEvaluator:
+    """Feeds numeric samples of sustained rules into a StreamingDetectorEngine and reports which ones trip."""
+    def __init__(self, engine=None):
+        self.engine = engine or StreamingDetectorEngine()
+
+    def observe(self, rule, key, value, timestamp):
+        """Record a sample of a sustained rule's metric; returns breach details if it tripped, else None."""
+        return self.engine.record(rule.rule_id, key, value, rule.aggregation, timestamp)
@@ -1,4 +1,3 @@
-import boto3
 import time
 import logging
 import json
@@ -11,13 +10,44 @@ import configparser
 import uuid
 import re
 import asyncio
+import threading
 from pymongo import MongoClient
+from bson import ObjectId
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from aws_clients import get_client
+from cloudwatch_reader import IncrementalLogReader
+from log_group_catalog import catalog as log_group_catalog
+from filter_patterns import FilterPatternCompiler, PatternTerm, build_filter_pattern
+from rule_compiler import RuleCompiler
+from sliding_window import WindowedRuleEvaluator
+from metric_detectors import StreamingDetectorEngine, SustainedRuleEvaluator
+from template_miner import IncidentFolder
+from incident_queue import AnalysisJob, IncidentQueue
+from incident import Incident
+from correlation import IncidentCorrelator
+from event_decoder import LazyEvent
+from rule_index import ActiveRuleIndex
+from poll_scheduler import PollScheduler, real_time_sources
+from live_tail import CloudWatchLiveTailTransport, LiveTailIngestor
+from k8s_watch import KubernetesApiTransport, KubernetesWatchDetector, container_states
+from insights_scanner import MAX_GROUPS_PER_QUERY, InsightsBatchScanner, ScanStrategySelector
+from filter_patterns import build_insights_filter
+from rate_governor import governor
+from checkpoints import CheckpointStore, MongoCheckpointStore
+from scan_engine import ScanEngine
+from sharding import ShardSupervisor, incident_from_payload
+from leases import K8S_WATCH_LEASE, close_lease_manager, leases_enabled, open_lease_manager
 
 load_dotenv()
 
 class ServiceMonitor(ABC):
     """Base class for service-specific monitors."""
+    service_name = "Service"
+    analysis_source = None  # source name passed to ErrorAnalyzerAgent.analyze_error
+    base_filter_term = None  # Filter-pattern clause for the monitor's built-in detection
+    window_fields = ()  # Dotted event fields naming the entity windowed rules count per, e.g. a pod
+
     def __init__(self, config, logger, analyzer_agent, email_agent, ws_manager, mode):
         self.config = config
         self.logger = logger
@@ -25,24 +55,28 @@ class ServiceMonitor(ABC):
         self.email_agent = email_agent  # May be None in autonomous mode
         self.ws_manager = ws_manager
         self.mode = mode  # 'semi-autonomous' or 'autonomous'
-        self.seen_event_ids = set()
-        self.cloudwatch = boto3.client("logs", region_name=config.get("region"))
+        self.cloudwatch = get_client("logs", region_name=config.get("region"), governed=True)
         self.startup_time = int(time.time() * 1000)
+        self.reader = IncrementalLogReader(self.cloudwatch, start_time=self.startup_time)
+        self.executor = None  # Thread pool for blocking CloudWatch calls; None uses the loop default
+        self.source = None  # data_source key of the rules this monitor serves, set by MonitorAgent
+        self.pattern_compiler = None
+        self.rule_compiler = None
+        self.rule_trigger_handler = None  # async callable(rule, log_group, event, occurrences[, breach]) set by MonitorAgent
+        self.window_evaluator = None
+        self.metric_evaluator = None
+        self.incident_folder = None  # Folds repeated errors into one incident, set by MonitorAgent
+        self.incident_queue = None  # Analysis workers fed by autonomous mode, set by MonitorAgent
+        self.correlator = None  # Joins related incidents across monitors before analysis, set by MonitorAgent
+        self.live_tail = None  # LiveTailIngestor when streaming ingestion is enabled
+        self.insights = None  # InsightsBatchScanner for wide log group prefixes, set by MonitorAgent
 
     def get_recent_log_groups(self, log_group_prefix=None):
-        """Fetch recent CloudWatch log groups for a given client and prefix."""
-        self.logger.info(f"Fetching recent CloudWatch log groups for prefix: {log_group_prefix or 'single group'}...")
-        log_groups = []
+        """Return CloudWatch log groups for a prefix from the shared log group catalog."""
         try:
             if log_group_prefix:
-                paginator = self.cloudwatch.get_paginator('describe_log_groups')
-                for page in paginator.paginate(logGroupNamePrefix=log_group_prefix):
-                    for group in page['logGroups']:
-                        log_groups.append(group['logGroupName'])
-            else:
-                log_groups = [self.config.get("log_group")]
-            self.logger.info(f"Found {len(log_groups)} log groups")
-            return log_groups
+                return log_group_catalog.get(self.cloudwatch, self.config.get("region"), log_group_prefix)
+            return [self.config.get("log_group")]
         except Exception as e:
             self.logger.error(f"Error fetching log groups: {e}")
             return []
@@ -60,387 +94,706 @@ class ServiceMonitor(ABC):
         if self.ws_manager:
             await self.ws_manager.broadcast(message)
 
-    @abstractmethod
+    def base_filter_term_for(self, log_group):
+        """Return the filter-pattern clause for the monitor's built-in detection in a log group."""
+        return self.base_filter_term
+
+    def filter_pattern_for(self, log_group):
+        """Return the narrowest filter pattern covering the active rules for a log group."""
+        base_term = self.base_filter_term_for(log_group)
+        if self.pattern_compiler is None:
+            return build_filter_pattern([base_term] if base_term else [])
+        return self.pattern_compiler.pattern_for(self.source, log_group, base_term)
+
+    def insights_filter_for(self, log_group):
+        """Return the Logs Insights filter expression covering the active rules for a log group."""
+        base_term = self.base_filter_term_for(log_group)
+        if self.pattern_compiler is None:
+            return build_insights_filter([base_term] if base_term else [])
+        return self.pattern_compiler.insights_filter_for(self.source, log_group, base_term)
+
+    def fetch_new_events(self, log_group, end_time=None):
+        """Read all events past the log group's cursor, following every nextToken page."""
+        return self.reader.read(log_group, filter_pattern=self.filter_pattern_for(log_group), end_time=end_time)
+
+    async def process_new_events(self, log_group, events, advance=True):
+        """Advance the cursor past each event and run detection on it, on the event loop thread.
+
+        Polled and live tail events advance their log group's cursor, so the other path skips them; Kubernetes
+        watch events belong to no log group cursor and pass advance=False.
+        """
+        self.logger.debug(f"Found {len(events)} new events in {log_group}")
+        rule_set = self.rule_compiler.rule_set(self.source) if self.rule_compiler else None
+        metric_rules = self.rule_compiler.metric_rules(self.source) if self.rule_compiler and self.metric_evaluator else None
+        for event in events:
+            if advance:
+                self.reader.advance(log_group, event)
+            # One lazily decoded view of the message is shared by the rule, metric and built-in detectors
+            raw_event = LazyEvent(event.get("message", ""))
+            if rule_set is not None:
+                await self.evaluate_rules(rule_set, log_group, event, raw_event)
+            if metric_rules:
+                await self.evaluate_metrics(metric_rules, log_group, event, raw_event)
+            await self.process_event(log_group, event, raw_event)
+
+    async def evaluate_rules(self, rule_set, log_group, event, raw_event=None):
+        """Evaluate the compiled active rules against an event and report the ones that trigger."""
+        try:
+            message = event.get("message", "")
+            if raw_event is None:
+                raw_event = LazyEvent(message)
+            for rule in rule_set.match(message, raw_event):
+                if self.already_reported(rule, raw_event):
+                    continue
+                if rule.kind == "match":
+                    occurrences = 1
+                elif rule.kind == "count" and self.window_evaluator:
+                    timestamp = event.get("timestamp", time.time() * 1000) / 1000
+                    occurrences = self.window_evaluator.observe(rule, self.window_key(log_group, event, raw_event), timestamp)
+                    if occurrences is None:
+                        continue
+                elif rule.kind == "sustained" and event.get("held_seconds", 0) >= rule.aggregation.duration_seconds > event.get("reported_seconds", -1):
+                    # A watched state, e.g. a node NotReady, reported with how long it has lasted; each rule fires once
+                    occurrences = 1
+                else:
+                    continue
+                if self.rule_trigger_handler:
+                    await self.rule_trigger_handler(rule, log_group, event, occurrences)
+        except Exception as e:
+            self.logger.error(f"Failed to evaluate rules for {self.service_name} event: {e}")
+
+    def already_reported(self, rule, raw_event):
+        """Return True when the event repeats a state the rule already fired on, e.g. from another ingestion path."""
+        return False
+
+    async def evaluate_metrics(self, metric_rules, log_group, event, raw_event=None):
+        """Feed numeric samples to the streaming detectors of sustained rules and report breaches that lasted."""
+        try:
+            message = event.get("message", "")
+            if raw_event is None:
+                raw_event = LazyEvent(message)
+            timestamp = event.get("timestamp", time.time() * 1000) / 1000
+            for rule in metric_rules:
+                sampler = rule.aggregation.sampler
+                value = sampler.sample(message, raw_event)
+                if value is None:
+                    continue
+                key = self.window_key(log_group, event, raw_event)
+                entity = sampler.entity(raw_event)
+                if entity:
+                    key = f"{key}/{entity}"
+                breach = self.metric_evaluator.observe(rule, key, value, timestamp)
+                if breach is not None and self.rule_trigger_handler:
+                    await self.rule_trigger_handler(rule, log_group, event, breach["samples"], dict(breach, entity=key))
+        except Exception as e:
+            self.logger.error(f"Failed to evaluate metric rules for {self.service_name} event: {e}")
+
+    async def open_incident(self, log_group, event, summary, fields=None, entity=None):
+        """Return a new Incident for a detected error, or None if it repeats an incident still open."""
+        timestamp = event.get("timestamp", time.time() * 1000) / 1000
+        if self.incident_folder is None:
+            return Incident(str(uuid.uuid4()), self.analysis_source, summary, log_group, fields or {}, detected_at=timestamp)
+        incident, is_new = self.incident_folder.fold(self.source, event.get("message", ""), timestamp, entity or log_group)
+        if is_new:
+            return Incident(incident.reference, self.analysis_source, summary, log_group, fields or {}, incident.fingerprint, detected_at=timestamp)
+        self.logger.debug(f"Folded {self.service_name} error into incident {incident.reference} ({incident.occurrences} occurrences)")
+        if incident.occurrences & (incident.occurrences - 1) == 0:  # Report at 2, 4, 8, ... occurrences
+            await self.broadcast_message(
+                f"{self.service_name}Monitor", "error repeated", datetime.now().strftime("%H:%M:%S"),
+                f"{self.service_name} error repeated {incident.occurrences} times in {log_group}\n\nTemplate: {incident.template[:200]}",
+                incident.reference
+            )
+        return None
+
+    async def queue_analysis(self, incident, key=None):
+        """Hand a detected error to the analysis workers, joined with related incidents from any monitor."""
+        if self.correlator is not None:
+            group, is_primary = self.correlator.correlate(incident)
+            if not is_primary:
+                # Only groups still held take new incidents, so this one is analysed when the group is released
+                analysed = self.correlator.attach(group, incident, lambda correlated: self.queue_job(correlated, key))
+                self.logger.info(f"{self.service_name} incident {incident.reference} correlated with incident {group.reference}")
+                await self.broadcast_message(
+                    "Correlator", "incident correlated", datetime.now().strftime("%H:%M:%S"),
+                    f"{self.service_name} error joined correlated incident {group.reference} "
+                    f"({'awaiting analysis with the group' if analysed else 'covered by the group analysis of the same resource'})",
+                    incident.reference
+                )
+                return
+            if self.correlator.hold_seconds > 0:
+                self.correlator.hold(group, lambda correlated: self.queue_job(correlated, key))
+                return
+        await self.queue_job(incident, key)
+
+    async def queue_job(self, incident, key=None):
+        """Queue an incident for analysis so detection never waits on the LLM."""
+        job = AnalysisJob(self, incident, key)
+        if self.incident_queue is None:
+            self.logger.info(f"Autonomous mode: Triggering AnalyzerAgent for {self.service_name} error (Ref: {incident.reference})")
+            await self.analyze_incident(job)
+            return
+        self.logger.info(f"Autonomous mode: Queueing {self.service_name} error for AnalyzerAgent (Ref: {incident.reference})")
+        await self.incident_queue.put(job)
+
+    def folded_incident(self, incident):
+        """Return the incident counting the repeats folded into it since it was detected."""
+        if self.incident_folder is None:
+            return incident
+        occurrences = self.incident_folder.occurrences(incident.reference)
+        if occurrences is None or occurrences == incident.occurrences:
+            return incident
+        return incident.with_occurrences(occurrences)
+
+    async def analyze_incident(self, job):
+        """Analyse a detected error and write the result to the fix queue."""
+        job.incident = self.folded_incident(job.incident)
+        analysis_result = await self.analyzer_agent.analyze_error(job.error_message, source=self.analysis_source, incident=job.incident)
+        analysis_timestamp = datetime.now().strftime("%H:%M:%S")
+        analysis_details = f"Root cause identified: {analysis_result.get('root_cause', 'Unknown')}"
+        await self.broadcast_message("ErrorAnalyzer", "analysis complete", analysis_timestamp, analysis_details, job.reference)
+        output = self.fix_queue_entry(job, analysis_result)
+        with open(self.config.get("fix_queue_file"), 'w', encoding='utf-8') as out:
+            json.dump(output, out, indent=4)
+        self.analyzer_agent.logger.info(f"Analysis result written to fix_queue.json for reference {job.reference}")
+
+    def fix_queue_entry(self, job, analysis_result):
+        """Build the fix_queue.json entry for an analysed error."""
+        return {
+            "reference": job.reference,
+            "error": job.error_message,
+            "root_cause": analysis_result.get("root_cause", "Unknown"),
+            "remediation_steps": analysis_result.get("remediation_steps", []),
+            "source": self.analysis_source,
+            "incident": job.incident.to_dict()
+        }
+
+    def window_key(self, log_group, event, raw_event=None):
+        """Return the entity a windowed rule counts per: the event's window_fields, else its log group."""
+        if self.window_fields:
+            try:
+                if raw_event is None:
+                    raw_event = LazyEvent(event.get("message", ""))
+                values = [raw_event.path(field) for field in self.window_fields]
+            except (ValueError, TypeError):
+                values = None  # Not a JSON message
+            if values and all(value not in (None, "") for value in values):
+                return "/".join(str(value) for value in values)
+        return log_group
+
     async def search_errors(self, log_group):
-        """Search for errors in a log group."""
+        """Search for errors in a log group, scanning only the time slice since the last pass; returns the events read."""
+        self.logger.debug(f"Searching for {self.service_name} errors in log group: {log_group}")
+        if self.live_tail is not None and self.live_tail.subscribe(log_group):
+            return 0  # Events for this group arrive through the live tail stream
+        loop = asyncio.get_running_loop()
+        try:
+            events = await loop.run_in_executor(self.executor, self.fetch_new_events, log_group)
+            await self.process_new_events(log_group, events)
+            return len(events)
+        except Exception as e:
+            self.handle_search_error(log_group, e)
+            return 0
+
+    async def search_errors_batch(self, log_groups):
+        """Search many log groups with batched Logs Insights queries; returns the events read.
+
+        Groups sharing a filter expression are queried together, up to MAX_GROUPS_PER_QUERY per query, and any
+        group a query could not cover is read individually.
+        """
+        if self.live_tail is not None:
+            log_groups = [group for group in log_groups if not self.live_tail.subscribe(group)]
+        by_filter = {}
+        for group in log_groups:
+            by_filter.setdefault(self.insights_filter_for(group), []).append(group)
+        batches = [
+            (groups[index:index + MAX_GROUPS_PER_QUERY], expression)
+            for expression, groups in by_filter.items()
+            for index in range(0, len(groups), MAX_GROUPS_PER_QUERY)
+        ]
+        loop = asyncio.get_running_loop()
+        try:
+            events_by_group, scanned_until, fallback_groups = await loop.run_in_executor(self.executor, self.insights.scan, self.reader, batches)
+        except Exception as e:
+            self.logger.warning(f"Insights scan of {len(log_groups)} {self.service_name} log groups failed: {e}, reading them individually")
+            events_by_group, scanned_until, fallback_groups = {}, None, log_groups
+        total = 0
+        for group, events in events_by_group.items():
+            try:
+                await self.process_new_events(group, events)
+                self.reader.skip_to(group, scanned_until)
+                total += len(events)
+            except Exception as e:
+                self.handle_search_error(group, e)
+        counts = await asyncio.gather(*(self.search_errors(group) for group in fallback_groups))
+        return total + sum(counts)
+
+    async def catch_up(self, log_group, until, slice_ms):
+        """Drain the backlog between the log group's cursor and until, one time slice at a time."""
+        loop = asyncio.get_running_loop()
+        drained = 0
+        try:
+            while self.reader.cursor(log_group).timestamp <= until:
+                slice_end = min(self.reader.cursor(log_group).timestamp + slice_ms, until)
+                events = await loop.run_in_executor(self.executor, self.fetch_new_events, log_group, slice_end)
+                await self.process_new_events(log_group, events)
+                self.reader.skip_to(log_group, slice_end)
+                drained += len(events)
+            self.logger.info(f"Catch-up drained {drained} {self.service_name} events from {log_group}")
+        except Exception as e:
+            self.handle_search_error(log_group, e)
+
+    def handle_search_error(self, log_group, error):
+        """Log a failed search of a log group."""
+        self.logger.error(f"Error searching {self.service_name} logs in {log_group}: {error}")
+
+    @abstractmethod
+    async def process_event(self, log_group, event, raw_event=None):
+        """Run detection for a single CloudWatch event; raw_event is the LazyEvent of its message, if already built."""
         pass
 
 class WindowsMonitor(ServiceMonitor):
     """Monitor for Windows logs."""
+    service_name = "Windows"
+    analysis_source = "windows"
+    base_filter_term = PatternTerm("json", "$.EventID = 7003", fallback=("7003",))
+    window_fields = ("ComputerName",)
+
     def __init__(self, config, logger, analyzer_agent, email_agent, ws_manager, mode):
         super().__init__(config, logger, analyzer_agent, email_agent, ws_manager, mode)
 
-    async def search_errors(self, log_group):
-        """Search for Windows Event ID 7003 in a log group in real-time."""
-        now = int(time.time() * 1000)
-        self.logger.debug(f"Searching for Windows Event ID 7003 errors in log group: {log_group}")
-
+    async def process_event(self, log_group, event, raw_event=None):
+        """Detect Windows Event ID 7003 in a single event."""
         try:
-            response = self.cloudwatch.filter_log_events(
-                logGroupName=log_group,
-                startTime=self.startup_time,
-                endTime=now,
-                filterPattern='{ $.EventID = 7003 }'
+            if raw_event is None:
+                raw_event = LazyEvent(event["message"])
+            if not raw_event.contains("7003"):
+                return
+            if raw_event.get("EventID") != 7003 or raw_event.get("Source") != "Service Control Manager":
+                self.logger.debug(f"Skipping non-7003 or non-SCM event: EventID={raw_event.get('EventID')}, Source={raw_event.get('Source')}")
+                return
+            event_data = raw_event.document()
+            service_name = event_data.get("Message", [""])[0].split(" service")[0] if event_data.get("Message") else "Unknown"
+            error_message = (
+                f"Windows Error Detected\n"
+                f"Source: Windows\n"
+                f"LogGroup: {log_group}\n"
+                f"EventID: {event_data['EventID']}\n"
+                f"Service: {service_name}\n"
+                f"TimeGenerated: {event_data.get('TimeGenerated', 'Unknown')}\n"
+                f"Message: Service failed to start due to dependency error\n"
+                f"ComputerName: {event_data.get('ComputerName', 'Unknown')}\n"
+                f"RecordNumber: {event_data.get('RecordNumber', 'Unknown')}"
             )
-            for event in response.get("events", []):
-                event_id = event.get("eventId")
-                if event_id in self.seen_event_ids:
-                    self.logger.debug(f"Skipping duplicate event ID: {event_id}")
-                    continue
-                self.seen_event_ids.add(event_id)
-                try:
-                    event_data = json.loads(event["message"])
-                    if event_data.get("EventID") != 7003 or event_data.get("Source") != "Service Control Manager":
-                        self.logger.debug(f"Skipping non-7003 or non-SCM event: EventID={event_data.get('EventID')}, Source={event_data.get('Source')}")
-                        continue
-                    service_name = event_data.get("Message", [""])[0].split(" service")[0] if event_data.get("Message") else "Unknown"
-                    error_message = (
-                        f"Windows Error Detected\n"
-                        f"Source: Windows\n"
-                        f"LogGroup: {log_group}\n"
-                        f"EventID: {event_data['EventID']}\n"
-                        f"Service: {service_name}\n"
-                        f"TimeGenerated: {event_data.get('TimeGenerated', 'Unknown')}\n"
-                        f"Message: Service failed to start due to dependency error\n"
-                        f"ComputerName: {event_data.get('ComputerName', 'Unknown')}\n"
-                        f"RecordNumber: {event_data.get('RecordNumber', 'Unknown')}"
-                    )
-                    ref = str(uuid.uuid4())
-                    error_message += f"\nReference: {ref}"
-                    timestamp = datetime.now().strftime("%H:%M:%S")
-                    details = (
-                        f"Windows Event ID 7003 detected\n\n"
-                        f"Event: Service Control Manager - {service_name} service failed to start"
-                    )
-                    await self.broadcast_message("WindowsMonitor", "error detected", timestamp, details, ref)
-                    self.logger.error(f"Windows Event ID 7003 detected: {service_name} failed to start in {log_group}")
+            inserts = event_data.get("Message") or []
+            incident = await self.open_incident(log_group, event, error_message, {
+                "event_id": event_data["EventID"],
+                "service_name": service_name,
+                "dependency": inserts[1] if len(inserts) > 1 else None,
+                "computer_name": event_data.get("ComputerName"),
+                "time_generated": event_data.get("TimeGenerated"),
+                "record_number": event_data.get("RecordNumber")
+            }, entity=f"{event_data.get('ComputerName')}/{service_name}")
+            if incident is None:
+                return
+            ref = incident.reference
+            error_message = incident.error_message
+            timestamp = datetime.now().strftime("%H:%M:%S")
+            details = (
+                f"Windows Event ID 7003 detected\n\n"
+                f"Event: Service Control Manager - {service_name} service failed to start"
+            )
+            await self.broadcast_message("WindowsMonitor", "error detected", timestamp, details, ref)
+            self.logger.error(f"Windows Event ID 7003 detected: {service_name} failed to start in {log_group}")
                     
-                    if self.mode == "semi-autonomous" and self.email_agent:
-                        self.logger.info(f"Semi-autonomous mode: Sending error to EmailAgent for approval (Ref: {ref})")
-                        await self.email_agent.handle_error(error_message, source="windows", reference=ref)
-                    elif self.mode == "autonomous" and self.analyzer_agent:
-                        with open(self.config.get("error_log_file"), "a", encoding="utf-8") as f:
-                            f.write(f"[{datetime.now()}] {error_message}\n{'-' * 60}\n")
-                        self.logger.info("Logged Windows Event ID 7003 error to windows_errors.log")
-                        self.logger.info(f"Autonomous mode: Triggering AnalyzerAgent for Windows Event ID 7003 error (Ref: {ref})")
-                        analysis_result = await self.analyzer_agent.analyze_error(error_message, source="windows")
-                        analysis_timestamp = datetime.now().strftime("%H:%M:%S")
-                        analysis_details = f"Root cause identified: {analysis_result.get('root_cause', 'Unknown')}"
-                        await self.broadcast_message("ErrorAnalyzer", "analysis complete", analysis_timestamp, analysis_details, ref)
-                        output = {
-                            "reference": ref,
-                            "error": error_message,
-                            "root_cause": analysis_result.get("root_cause", "Unknown"),
-                            "remediation_steps": analysis_result.get("remediation_steps", []),
-                            "source": "windows"
-                        }
-                        with open(self.config.get("fix_queue_file"), 'w', encoding='utf-8') as out:
-                            json.dump(output, out, indent=4)
-                        self.analyzer_agent.logger.info(f"Analysis result written to fix_queue.json for reference {ref}")
-                except json.JSONDecodeError as e:
-                    self.logger.error(f"Failed to parse Windows log JSON: {e}")
-                    self.logger.debug(f"Skipped malformed Windows log event: {event['message'][:100]}...")
-                except Exception as e:
-                    self.logger.error(f"Failed to process Windows event: {e}")
+            if self.mode == "semi-autonomous" and self.email_agent:
+                self.logger.info(f"Semi-autonomous mode: Sending error to EmailAgent for approval (Ref: {ref})")
+                await self.email_agent.handle_error(error_message, source="windows", reference=ref, incident=incident)
+            elif self.mode == "autonomous" and self.analyzer_agent:
+                with open(self.config.get("error_log_file"), "a", encoding="utf-8") as f:
+                    f.write(f"[{datetime.now()}] {error_message}\n{'-' * 60}\n")
+                self.logger.info("Logged Windows Event ID 7003 error to windows_errors.log")
+                await self.queue_analysis(incident, key=f"{event_data.get('ComputerName')}/{service_name}")
+        except json.JSONDecodeError as e:
+            self.logger.error(f"Failed to parse Windows log JSON: {e}")
+            self.logger.debug(f"Skipped malformed Windows log event: {event['message'][:100]}...")
         except Exception as e:
-            self.logger.error(f"Error searching Windows logs in {log_group}: {e}")
-            with open(self.config.get("error_log_file"), "a", encoding="utf-8") as f:
-                f.write(f"[{datetime.now()}] Error searching Windows logs in {log_group}: {e}\n{'-' * 60}\n")
+            self.logger.error(f"Failed to process Windows event: {e}")
+
+    def handle_search_error(self, log_group, error):
+        """Log a failed Windows search and record it in the Windows error log."""
+        super().handle_search_error(log_group, error)
+        with open(self.config.get("error_log_file"), "a", encoding="utf-8") as f:
+            f.write(f"[{datetime.now()}] Error searching Windows logs in {log_group}: {error}\n{'-' * 60}\n")
 
 class SnowflakeMonitor(ServiceMonitor):
     """Monitor for Snowflake logs."""
+    service_name = "Snowflake"
+    analysis_source = "snowflake"
+
     def __init__(self, config, logger, analyzer_agent, email_agent, ws_manager, mode):
         super().__init__(config, logger, analyzer_agent, email_agent, ws_manager, mode)
-        self.snowflake_enabled = analyzer_agent.snowflake_conn is not None if analyzer_agent else False
+        # A shard worker's analyzer is its ShardLink, which has no connection; join_shard sets the flag from the link
+        self.snowflake_enabled = getattr(analyzer_agent, "snowflake_conn", None) is not None
 
     async def search_errors(self, log_group):
         """Search for Snowflake errors in a log group."""
         if not self.snowflake_enabled:
-            self.logger.warning(f"Skipping Snowflake log monitoring: No Snowflake connection")
+            self.logger.warning("Skipping Snowflake log monitoring: No Snowflake connection")
+            return 0
+        return await super().search_errors(log_group)
+
+    async def search_errors_batch(self, log_groups):
+        """Search Snowflake log groups with batched Insights queries."""
+        if not self.snowflake_enabled:
+            self.logger.warning("Skipping Snowflake log monitoring: No Snowflake connection")
+            return 0
+        return await super().search_errors_batch(log_groups)
+
+    async def catch_up(self, log_group, until, slice_ms):
+        """Drain the Snowflake backlog for a log group."""
+        if not self.snowflake_enabled:
+            self.logger.warning("Skipping Snowflake catch-up: No Snowflake connection")
             return
-        now = int(time.time() * 1000)
-        self.logger.debug(f"Searching for Snowflake errors in log group: {log_group}")
+        await super().catch_up(log_group, until, slice_ms)
 
-        try:
-            response = self.cloudwatch.filter_log_events(
-                logGroupName=log_group,
-                startTime=self.startup_time,
-                endTime=now,
+    def base_filter_term_for(self, log_group):
+        """Select the records of a forwarded /snowflake/<VIEW> log group that carry an error code."""
+        view = log_group.rstrip("/").rsplit("/", 1)[-1]
+        if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", view):
+            return None
+        return PatternTerm("json", f'$.{view}.ERROR_CODE != "None"', fallback=("ERROR_CODE",))
+
+    @staticmethod
+    def is_error(msg):
+        """Return True when a Snowflake record describes a failed operation.
+
+        Forwarded {view: {column: value}} records fail when they carry an error code and did not succeed, which
+        is what base_filter_term_for pushes down; other messages are checked for the same columns as text.
+        """
+        record = SnowflakeMonitor.parse_record(msg)
+        if record is None:
+            return "EXECUTION_STATUS: SUCCESS" not in msg and (
+                "ERROR_CODE: None" not in msg or "ERROR_MESSAGE: None" not in msg
             )
-            for event in response.get("events", []):
-                event_id = event.get("eventId")
-                if event_id in self.seen_event_ids:
-                    continue
-                self.seen_event_ids.add(event_id)
-                msg = event["message"]
-                if "EXECUTION_STATUS: SUCCESS" not in msg and (
-                    "ERROR_CODE: None" not in msg or "ERROR_MESSAGE: None" not in msg
-                ):
-                    ref = str(uuid.uuid4())
-                    error_message = f"Snowflake Error in {log_group}:\n{msg}\nReference: {ref}"
-                    timestamp = datetime.now().strftime("%H:%M:%S")
-                    details = f"Snowflake error detected\n\n{msg.splitlines()[0] if msg.splitlines() else 'Unknown error'}"
-                    await self.broadcast_message("SnowflakeMonitor", "error detected", timestamp, details, ref)
-                    self.logger.error(f"Snowflake error detected in {log_group}")
+        columns = record[1]
+        return columns.get("ERROR_CODE") not in (None, "None") and columns.get("EXECUTION_STATUS") != "SUCCESS"
+
+    async def process_event(self, log_group, event, raw_event=None):
+        """Detect a failed Snowflake operation in a single event."""
+        msg = event["message"]
+        if self.is_error(msg):
+            fields = self.parse_fields(msg)
+            incident = await self.open_incident(log_group, event, f"Snowflake Error in {log_group}:\n{msg}", fields, entity=self.entity_of(fields))
+            if incident is None:
+                return
+            ref = incident.reference
+            error_message = incident.error_message
+            timestamp = datetime.now().strftime("%H:%M:%S")
+            details = f"Snowflake error detected\n\n{msg.splitlines()[0] if msg.splitlines() else 'Unknown error'}"
+            await self.broadcast_message("SnowflakeMonitor", "error detected", timestamp, details, ref)
+            self.logger.error(f"Snowflake error detected in {log_group}")
                     
-                    if self.mode == "semi-autonomous" and self.email_agent:
-                        self.logger.info(f"Semi-autonomous mode: Sending error to EmailAgent for approval (Ref: {ref})")
-                        await self.email_agent.handle_error(error_message, source="snowflake", reference=ref)
-                    elif self.mode == "autonomous" and self.analyzer_agent:
-                        try:
-                            with open(self.config.get("error_log_file"), "a", encoding="utf-8") as f:
-                                f.write(error_message + '-' * 60 + "\n")
-                            self.logger.info("Logged Snowflake error to snowflake_errors.log")
-                        except Exception as e:
-                            self.logger.error(f"Failed to write Snowflake error to file: {e}")
-                        self.logger.info(f"Autonomous mode: Triggering AnalyzerAgent for Snowflake error (Ref: {ref})")
-                        analysis_result = self.analyzer_agent.analyze_error(error_message, source="snowflake")
-                        analysis_timestamp = datetime.now().strftime("%H:%M:%S")
-                        analysis_details = f"Root cause identified: {analysis_result.get('root_cause', 'Unknown')}"
-                        await self.broadcast_message("ErrorAnalyzer", "analysis complete", analysis_timestamp, analysis_details, ref)
-                        output = {
-                            "reference": ref,
-                            "error": error_message,
-                            "root_cause": analysis_result.get("root_cause", "Unknown"),
-                            "remediation_steps": analysis_result.get("remediation_steps", []),
-                            "source": "snowflake"
-                        }
-                        with open(self.config.get("fix_queue_file"), 'w', encoding='utf-8') as out:
-                            json.dump(output, out, indent=4)
-                        self.analyzer_agent.logger.info(f"Analysis result written to fix_queue.json for reference {ref}")
-        except Exception as e:
-            self.logger.error(f"Error searching Snowflake logs: {e}")
+            if self.mode == "semi-autonomous" and self.email_agent:
+                self.logger.info(f"Semi-autonomous mode: Sending error to EmailAgent for approval (Ref: {ref})")
+                await self.email_agent.handle_error(error_message, source="snowflake", reference=ref, incident=incident)
+            elif self.mode == "autonomous" and self.analyzer_agent:
+                try:
+                    with open(self.config.get("error_log_file"), "a", encoding="utf-8") as f:
+                        f.write(error_message + '-' * 60 + "\n")
+                    self.logger.info("Logged Snowflake error to snowflake_errors.log")
+                except Exception as e:
+                    self.logger.error(f"Failed to write Snowflake error to file: {e}")
+                await self.queue_analysis(incident)
+
+    @staticmethod
+    def parse_record(msg):
+        """Return (view, columns) of a forwarded {view: {column: value}} record, or None for other messages."""
+        try:
+            record = json.loads(msg)
+        except (json.JSONDecodeError, TypeError):
+            return None
+        if not isinstance(record, dict) or len(record) != 1:
+            return None
+        view, columns = next(iter(record.items()))
+        if not isinstance(columns, dict):
+            return None
+        return view, columns
+
+    @staticmethod
+    def parse_fields(msg):
+        """Pull the identifying columns out of a forwarded {view: {column: value}} record."""
+        record = SnowflakeMonitor.parse_record(msg)
+        if record is None:
+            return {}
+        view, columns = record
+        fields = {"view": view}
+        for column in ("QUERY_ID", "USER_NAME", "ROLE_NAME", "WAREHOUSE_NAME", "DATABASE_NAME", "SCHEMA_NAME", "ERROR_CODE", "ERROR_MESSAGE", "QUERY_TEXT"):
+            if columns.get(column) not in (None, "None"):
+                fields[column.lower()] = columns[column]
+        return fields
+
+    @staticmethod
+    def entity_of(fields):
+        """Return the warehouse, database and user an error belongs to, so failures elsewhere are not folded into it."""
+        parts = [fields.get(column) for column in ("warehouse_name", "database_name", "schema_name", "user_name")]
+        if not any(parts):
+            return None
+        return f"{fields.get('view', '')}:" + "/".join(str(part or "-") for part in parts)
 
 class KubernetesMonitor(ServiceMonitor):
     """Monitor for Kubernetes logs."""
+    service_name = "Kubernetes"
+    analysis_source = "kubernetes"
+    base_filter_term = PatternTerm("text", "OOMKilled")
+    window_fields = ("objectRef.namespace", "objectRef.name")
+    # Audit events for rejected kubectl applies mention OOMKilled but are not container kills
+    skip_markers = ('Pod "oom-test" is invalid', 'Pod \\"oom-test\\" is invalid', "Forbidden")
+
     def __init__(self, config, logger, analyzer_agent, email_agent, ws_manager, mode):
         super().__init__(config, logger, analyzer_agent, email_agent, ws_manager, mode)
         self.cooldown_tracker = {}  # Track pod errors with timestamps
         self.cooldown_period = 60  # Cooldown period in seconds
+        # (rule ID or "OOMKilled", namespace, pod, container, restart count, reason) -> None, oldest first. The
+        # watch and the audit log report the same container state, so each occurrence is reported once.
+        self.reported_states = OrderedDict()
+        self.max_reported_states = 10000
 
-    async def search_errors(self, log_group):
-        """Search for Kubernetes OOMKilled errors in a log group with cooldown and deduplication."""
-        now = int(time.time() * 1000)
-        current_time = time.time()
-        self.logger.debug(f"Searching for Kubernetes errors in log group: {log_group}")
+    @staticmethod
+    def container_occurrences(raw_event):
+        """Return (namespace, pod, container, restart count, reason) for the container states in a pod status event."""
+        try:
+            object_ref = raw_event.get("objectRef") or {}
+            statuses = raw_event.path("requestObject.status.containerStatuses")
+        except (ValueError, TypeError):
+            return []
+        if not isinstance(object_ref, dict) or not isinstance(statuses, list):
+            return []
+        return [
+            (object_ref.get("namespace"), object_ref.get("name"), status.get("name"), status.get("restartCount"), reason)
+            for status, reason in container_states(statuses)
+        ]
+
+    def first_report(self, detector, occurrences):
+        """Record container state occurrences as reported by detector; False when all of them were already."""
+        keys = [(detector,) + occurrence for occurrence in occurrences]
+        if keys and all(key in self.reported_states for key in keys):
+            return False
+        for key in keys:
+            self.reported_states[key] = None
+            self.reported_states.move_to_end(key)
+        while len(self.reported_states) > self.max_reported_states:
+            self.reported_states.popitem(last=False)
+        return True
+
+    def already_reported(self, rule, raw_event):
+        """Return True when every container state the rule matches in the event was already reported to it."""
+        literals = set(rule.predicate.literals)
+        occurrences = [
+            occurrence for occurrence in self.container_occurrences(raw_event)
+            if occurrence[-1].lower() in literals
+        ]
+        return bool(occurrences) and not self.first_report(rule.rule_id, occurrences)
 
+    async def analyze_incident(self, job):
+        """Analyse an OOMKilled error and restart the pod's cooldown once analysis finishes."""
+        await super().analyze_incident(job)
+        if job.key in self.cooldown_tracker:
+            self.cooldown_tracker[job.key]["timestamp"] = time.time()
+
+    def fix_queue_entry(self, job, analysis_result):
+        """Include the manifest the analyzer patched for the fixer."""
+        entry = super().fix_queue_entry(job, analysis_result)
+        entry["manifest_file"] = analysis_result.get("manifest_file", None)
+        return entry
+
+    async def process_event(self, log_group, event, raw_event=None):
+        """Detect a Kubernetes OOMKilled error in a single event, honouring the per-pod cooldown."""
+        current_time = time.time()
+        msg = event["message"]
+        # Decode only objectRef and the container statuses, never the whole multi-kilobyte audit event
+        event_data = raw_event if raw_event is not None else LazyEvent(msg)
+        self.logger.debug(f"Raw event message: {msg[:200]}...")
+        if not event_data.contains("OOMKilled"):
+            return
+        # Rejected applies are dropped on the raw message, before anything is decoded
+        if event_data.contains(*self.skip_markers):
+            self.logger.info(f"Skipping audit log for kubectl apply failure: {msg[:100]}...")
+            return
         try:
-            response = self.cloudwatch.filter_log_events(
-                logGroupName=log_group,
-                startTime=self.startup_time,
-                endTime=now,
-                filterPattern="OOMKilled"
-            )
-            self.logger.info(f"Found {len(response.get('events', []))} events in {log_group}")
-            for event in response.get("events", []):
-                event_id = event.get("eventId")
-                if event_id in self.seen_event_ids:
-                    self.logger.info(f"Skipping duplicate event ID: {event_id}")
-                    continue
-                self.seen_event_ids.add(event_id)
-                msg = event["message"]
-                self.logger.debug(f"Raw event message: {msg[:200]}...")
-                if "OOMKilled" not in msg:
-                    continue
-                try:
-                    event_data = json.loads(msg)
-                    if "Pod \"oom-test\" is invalid" in msg or "Forbidden" in msg:
-                        self.logger.info(f"Skipping audit log for kubectl apply failure: {msg[:100]}...")
-                        continue
-                    namespace = event_data.get("objectRef", {}).get("namespace", "demo-app")
-                    pod_name = event_data.get("objectRef", {}).get("name", "stress-demo")
-                    pod_key = f"{namespace}/{pod_name}"
+            object_ref = event_data.get("objectRef", {})
+            namespace = object_ref.get("namespace", "demo-app")
+            pod_name = object_ref.get("name", "stress-demo")
+            pod_key = f"{namespace}/{pod_name}"
                     
-                    # Check if pod is in cooldown
-                    if pod_key in self.cooldown_tracker:
-                        last_detected = self.cooldown_tracker[pod_key]["timestamp"]
-                        if current_time - last_detected < self.cooldown_period:
-                            self.logger.info(f"Skipping OOMKilled for {pod_key} due to cooldown (last detected: {datetime.fromtimestamp(last_detected)})")
-                            continue
-
-                    container_statuses = event_data.get("requestObject", {}).get("status", {}).get("containerStatuses", [])
-                    for status in container_statuses:
-                        container_name = status.get("name", "unknown")
-                        if (status.get("state", {}).get("terminated", {}).get("reason") == "OOMKilled" or
-                            status.get("lastState", {}).get("terminated", {}).get("reason") == "OOMKilled"):
-                            error_message = f"Container {container_name} in pod {namespace}/{pod_name} killed due to OutOfMemory"
-                            break
-                    else:
-                        self.logger.warning(f"No OOMKilled container found in JSON: {msg[:100]}...")
-                        pattern = r"Container\s+([^\s]+)\s+in\s+pod\s+([^\s]+)/([^\s]+)\s+killed\s+due\s+to\s+OutOfMemory"
-                        match = re.search(pattern, msg)
-                        if match:
-                            container_name, namespace, pod_name = match.groups()
-                            error_message = f"Container {container_name} in pod {namespace}/{pod_name} killed due to OutOfMemory"
-                            pod_key = f"{namespace}/{pod_name}"
-                        else:
-                            self.logger.warning(f"Skipping event, no OOMKilled details extracted: {msg[:100]}...")
-                            continue
+            # Check if pod is in cooldown
+            if pod_key in self.cooldown_tracker:
+                last_detected = self.cooldown_tracker[pod_key]["timestamp"]
+                if current_time - last_detected < self.cooldown_period:
+                    self.logger.info(f"Skipping OOMKilled for {pod_key} due to cooldown (last detected: {datetime.fromtimestamp(last_detected)})")
+                    return
+
+            container_statuses = event_data.path("requestObject.status.containerStatuses", [])
+            for status in container_statuses:
+                container_name = status.get("name", "unknown")
+                if (status.get("state", {}).get("terminated", {}).get("reason") == "OOMKilled" or
+                    status.get("lastState", {}).get("terminated", {}).get("reason") == "OOMKilled"):
+                    error_message = f"Container {container_name} in pod {namespace}/{pod_name} killed due to OutOfMemory"
+                    occurrence = (namespace, pod_name, container_name, status.get("restartCount"), "OOMKilled")
+                    if not self.first_report("OOMKilled", [occurrence]):
+                        self.logger.info(f"Skipping OOMKilled for {pod_key}, restart {occurrence[3]} of {container_name} already reported")
+                        return
+                    break
+            else:
+                self.logger.warning(f"No OOMKilled container found in JSON: {msg[:100]}...")
+                pattern = r"Container\s+([^\s]+)\s+in\s+pod\s+([^\s]+)/([^\s]+)\s+killed\s+due\s+to\s+OutOfMemory"
+                match = re.search(pattern, msg)
+                if match:
+                    container_name, namespace, pod_name = match.groups()
+                    error_message = f"Container {container_name} in pod {namespace}/{pod_name} killed due to OutOfMemory"
+                    pod_key = f"{namespace}/{pod_name}"
+                else:
+                    self.logger.warning(f"Skipping event, no OOMKilled details extracted: {msg[:100]}...")
+                    return
                     
-                    # Update cooldown tracker
-                    ref = str(uuid.uuid4())
-                    self.cooldown_tracker[pod_key] = {"timestamp": current_time, "reference": ref}
-                    error_message += f"\nReference: {ref}"
-                    timestamp = datetime.now().strftime("%H:%M:%S")
-                    details = f"Kubernetes OOMKilled error detected\n\nContainer {container_name} in pod {namespace}/{pod_name}"
-                    await self.broadcast_message("KubernetesMonitor", "error detected", timestamp, details, ref)
-                    self.logger.error(f"Kubernetes OOMKilled error detected in {log_group}")
-                    with open(self.config.get("error_log_file"), "a", encoding="utf-8") as f:
-                        f.write(error_message + '-' * 60 + "\n")
-                    self.logger.info("Logged Kubernetes error to kubernetes_errors.log")
+            username = (event_data.get("user") or {}).get("username", "")
+            incident = await self.open_incident(log_group, event, error_message, {
+                "namespace": namespace, "pod": pod_name, "container": container_name,
+                "node": username[len("system:node:"):] if username.startswith("system:node:") else None
+            }, entity=pod_key)
+            if incident is None:
+                return
+            ref = incident.reference
+            error_message = incident.error_message
+            # Update cooldown tracker
+            self.cooldown_tracker[pod_key] = {"timestamp": current_time, "reference": ref}
+            timestamp = datetime.now().strftime("%H:%M:%S")
+            details = f"Kubernetes OOMKilled error detected\n\nContainer {container_name} in pod {namespace}/{pod_name}"
+            await self.broadcast_message("KubernetesMonitor", "error detected", timestamp, details, ref)
+            self.logger.error(f"Kubernetes OOMKilled error detected in {log_group}")
+            with open(self.config.get("error_log_file"), "a", encoding="utf-8") as f:
+                f.write(error_message + '-' * 60 + "\n")
+            self.logger.info("Logged Kubernetes error to kubernetes_errors.log")
                     
-                    if self.mode == "semi-autonomous" and self.email_agent:
-                        self.logger.info(f"Semi-autonomous mode: Sending error to EmailAgent for approval (Ref: {ref})")
-                        await self.email_agent.handle_error(error_message, source="kubernetes", reference=ref)
-                    elif self.mode == "autonomous" and self.analyzer_agent:
-                        self.logger.info(f"Autonomous mode: Triggering AnalyzerAgent for Kubernetes error (Ref: {ref})")
-                        analysis_result = await self.analyzer_agent.analyze_error(error_message, source="kubernetes")
-                        analysis_timestamp = datetime.now().strftime("%H:%M:%S")
-                        analysis_details = f"Root cause identified: {analysis_result.get('root_cause', 'Unknown')}"
-                        await self.broadcast_message("ErrorAnalyzer", "analysis complete", analysis_timestamp, analysis_details, ref)
-                        output = {
-                            "reference": ref,
-                            "error": error_message,
-                            "root_cause": analysis_result.get("root_cause", "Unknown"),
-                            "remediation_steps": analysis_result.get("remediation_steps", []),
-                            "manifest_file": analysis_result.get("manifest_file", None),
-                            "source": "kubernetes"
-                        }
-                        with open(self.config.get("fix_queue_file"), 'w', encoding='utf-8') as out:
-                            json.dump(output, out, indent=4)
-                        self.analyzer_agent.logger.info(f"Analysis result written to fix_queue.json for reference {ref}")
-                        self.cooldown_tracker[pod_key]["timestamp"] = time.time()
-                except json.JSONDecodeError as e:
-                    self.logger.error(f"Failed to parse Kubernetes log JSON: {e}")
-                    pattern = r"Container\s+([^\s]+)\s+in\s+pod\s+([^\s]+)/([^\s]+)\s+killed\s+due\s+to\s+OutOfMemory"
-                    match = re.search(pattern, msg)
-                    if match:
-                        container_name, namespace, pod_name = match.groups()
-                        pod_key = f"{namespace}/{pod_name}"
-                        if pod_key in self.cooldown_tracker:
-                            last_detected = self.cooldown_tracker[pod_key]["timestamp"]
-                            if current_time - last_detected < self.cooldown_period:
-                                self.logger.info(f"Skipping OOMKilled for {pod_key} due to cooldown (last detected: {datetime.fromtimestamp(last_detected)})")
-                                continue
-                        ref = str(uuid.uuid4())
-                        self.cooldown_tracker[pod_key] = {"timestamp": current_time, "reference": ref}
-                        error_message = f"Container {container_name} in pod {namespace}/{pod_name} killed due to OutOfMemory\nReference: {ref}"
-                        timestamp = datetime.now().strftime("%H:%M:%S")
-                        details = f"Kubernetes OOMKilled error detected\n\nContainer {container_name} in pod {namespace}/{pod_name}"
-                        await self.broadcast_message("KubernetesMonitor", "error detected", timestamp, details, ref)
-                        with open(self.config.get("error_log_file"), "a", encoding="utf-8") as f:
-                            f.write(error_message + '-' * 60 + "\n")
-                        self.logger.info("Logged Kubernetes error to kubernetes_errors.log")
+            if self.mode == "semi-autonomous" and self.email_agent:
+                self.logger.info(f"Semi-autonomous mode: Sending error to EmailAgent for approval (Ref: {ref})")
+                await self.email_agent.handle_error(error_message, source="kubernetes", reference=ref, incident=incident)
+            elif self.mode == "autonomous" and self.analyzer_agent:
+                await self.queue_analysis(incident, key=pod_key)
+        except json.JSONDecodeError as e:
+            self.logger.error(f"Failed to parse Kubernetes log JSON: {e}")
+            pattern = r"Container\s+([^\s]+)\s+in\s+pod\s+([^\s]+)/([^\s]+)\s+killed\s+due\s+to\s+OutOfMemory"
+            match = re.search(pattern, msg)
+            if match:
+                container_name, namespace, pod_name = match.groups()
+                pod_key = f"{namespace}/{pod_name}"
+                if pod_key in self.cooldown_tracker:
+                    last_detected = self.cooldown_tracker[pod_key]["timestamp"]
+                    if current_time - last_detected < self.cooldown_period:
+                        self.logger.info(f"Skipping OOMKilled for {pod_key} due to cooldown (last detected: {datetime.fromtimestamp(last_detected)})")
+                        return
+                incident = await self.open_incident(
+                    log_group, event, f"Container {container_name} in pod {namespace}/{pod_name} killed due to OutOfMemory",
+                    {"namespace": namespace, "pod": pod_name, "container": container_name}, entity=pod_key
+                )
+                if incident is None:
+                    return
+                ref = incident.reference
+                error_message = incident.error_message
+                self.cooldown_tracker[pod_key] = {"timestamp": current_time, "reference": ref}
+                timestamp = datetime.now().strftime("%H:%M:%S")
+                details = f"Kubernetes OOMKilled error detected\n\nContainer {container_name} in pod {namespace}/{pod_name}"
+                await self.broadcast_message("KubernetesMonitor", "error detected", timestamp, details, ref)
+                with open(self.config.get("error_log_file"), "a", encoding="utf-8") as f:
+                    f.write(error_message + '-' * 60 + "\n")
+                self.logger.info("Logged Kubernetes error to kubernetes_errors.log")
                         
-                        if self.mode == "semi-autonomous" and self.email_agent:
-                            self.logger.info(f"Semi-autonomous mode: Sending error to EmailAgent for approval (Ref: {ref})")
-                            await self.email_agent.handle_error(error_message, source="kubernetes", reference=ref)
-                        elif self.mode == "autonomous" and self.analyzer_agent:
-                            self.logger.info(f"Autonomous mode: Triggering AnalyzerAgent for Kubernetes error (Ref: {ref})")
-                            analysis_result = await self.analyzer_agent.analyze_error(error_message, source="kubernetes")
-                            analysis_timestamp = datetime.now().strftime("%H:%M:%S")
-                            analysis_details = f"Root cause identified: {analysis_result.get('root_cause', 'Unknown')}"
-                            await self.broadcast_message("ErrorAnalyzer", "analysis complete", analysis_timestamp, analysis_details, ref)
-                            output = {
-                                "reference": ref,
-                                "error": error_message,
-                                "root_cause": analysis_result.get("root_cause", "Unknown"),
-                                "remediation_steps": analysis_result.get("remediation_steps", []),
-                                "manifest_file": analysis_result.get("manifest_file", None),
-                                "source": "kubernetes"
-                            }
-                            with open(self.config.get("fix_queue_file"), 'w', encoding='utf-8') as out:
-                                json.dump(output, out, indent=4)
-                            self.analyzer_agent.logger.info(f"Analysis result written to fix_queue.json for reference {ref}")
-                            self.cooldown_tracker[pod_key]["timestamp"] = time.time()
-                    else:
-                        self.logger.warning(f"Skipping non-JSON event, no OOMKilled details extracted: {msg[:100]}...")
-                except Exception as e:
-                    self.logger.error(f"Failed to process Kubernetes event: {e}")
+                if self.mode == "semi-autonomous" and self.email_agent:
+                    self.logger.info(f"Semi-autonomous mode: Sending error to EmailAgent for approval (Ref: {ref})")
+                    await self.email_agent.handle_error(error_message, source="kubernetes", reference=ref, incident=incident)
+                elif self.mode == "autonomous" and self.analyzer_agent:
+                    await self.queue_analysis(incident, key=pod_key)
+            else:
+                self.logger.warning(f"Skipping non-JSON event, no OOMKilled details extracted: {msg[:100]}...")
         except Exception as e:
-            self.logger.error(f"Error searching Kubernetes logs: {e}")
+            self.logger.error(f"Failed to process Kubernetes event: {e}")
 
 class DatabricksMonitor(ServiceMonitor):
     """Monitor for Databricks logs."""
+    service_name = "Databricks"
+    analysis_source = "databricks"
+    base_filter_term = PatternTerm("json", '$.status = "FAILED"', fallback=("FAILED",))
+    window_fields = ("user_name",)
+
     def __init__(self, config, logger, analyzer_agent, email_agent, ws_manager, mode):
         super().__init__(config, logger, analyzer_agent, email_agent, ws_manager, mode)
 
-    async def search_errors(self, log_group):
-        """Search for Databricks query failures in a log group."""
-        now = int(time.time() * 1000)
-        self.logger.debug(f"Searching for Databricks query failures in log group: {log_group}")
-
+    async def process_event(self, log_group, event, raw_event=None):
+        """Detect a failed Databricks query in a single event."""
         try:
-            response = self.cloudwatch.filter_log_events(
-                logGroupName=log_group,
-                startTime=self.startup_time,
-                endTime=now,
-                filterPattern='{ $.status = "FAILED" }'
+            if raw_event is None:
+                raw_event = LazyEvent(event["message"])
+            if not raw_event.contains("FAILED"):
+                return
+            if raw_event.get("status") != "FAILED":
+                self.logger.debug(f"Skipping non-failed query: status={raw_event.get('status')}")
+                return
+            event_data = raw_event.document()
+            error_message = (
+                f"Databricks Query Failure Detected\n"
+                f"Source: Databricks\n"
+                f"LogGroup: {log_group}\n"
+                f"QueryID: {event_data.get('query_id', 'Unknown')}\n"
+                f"User: {event_data.get('user_name', 'Unknown')}\n"
+                f"QueryText: {event_data.get('query_text', 'Unknown')}\n"
+                f"StartTime: {event_data.get('start_time_ms', 'None')}\n"
+                f"EndTime: {event_data.get('end_time_ms', 'None')}\n"
+                f"ErrorMessage: {event_data.get('error_message', 'No error message available')}"
             )
-            for event in response.get("events", []):
-                event_id = event.get("eventId")
-                if event_id in self.seen_event_ids:
-                    self.logger.debug(f"Skipping duplicate event ID: {event_id}")
-                    continue
-                self.seen_event_ids.add(event_id)
-                try:
-                    event_data = json.loads(event["message"])
-                    if event_data.get("status") != "FAILED":
-                        self.logger.debug(f"Skipping non-failed query: status={event_data.get('status')}")
-                        continue
-                    error_message = (
-                        f"Databricks Query Failure Detected\n"
-                        f"Source: Databricks\n"
-                        f"LogGroup: {log_group}\n"
-                        f"QueryID: {event_data.get('query_id', 'Unknown')}\n"
-                        f"User: {event_data.get('user_name', 'Unknown')}\n"
-                        f"QueryText: {event_data.get('query_text', 'Unknown')}\n"
-                        f"StartTime: {event_data.get('start_time_ms', 'None')}\n"
-                        f"EndTime: {event_data.get('end_time_ms', 'None')}\n"
-                        f"ErrorMessage: {event_data.get('error_message', 'No error message available')}"
-                    )
-                    ref = str(uuid.uuid4())
-                    error_message += f"\nReference: {ref}"
-                    timestamp = datetime.now().strftime("%H:%M:%S")
-                    details = (
-                        f"Databricks query failure detected\n\n"
-                        f"Query: {event_data.get('query_text', 'Unknown')[:50]}...\n"
-                        f"Error: {event_data.get('error_message', 'Unknown')}"
-                    )
-                    await self.broadcast_message("DatabricksMonitor", "error detected", timestamp, details, ref)
-                    self.logger.error(f"Databricks query failure detected in {log_group}: {event_data.get('query_id')}")
+            query_text = event_data.get("query_text") or ""
+            table_match = re.search(r"INSERT INTO\s+([a-zA-Z0-9_\.]+)", query_text, re.IGNORECASE)
+            table_name = table_match.group(1) if table_match else None
+            # Permissions are granted per table, so each table and user is its own incident
+            incident = await self.open_incident(log_group, event, error_message, {
+                "query_id": event_data.get("query_id"),
+                "user_name": event_data.get("user_name"),
+                "query_text": query_text,
+                "table_name": table_name,
+                "error_message": event_data.get("error_message"),
+                "start_time_ms": event_data.get("start_time_ms"),
+                "end_time_ms": event_data.get("end_time_ms")
+            }, entity=f"{table_name}/{event_data.get('user_name')}")
+            if incident is None:
+                return
+            ref = incident.reference
+            error_message = incident.error_message
+            timestamp = datetime.now().strftime("%H:%M:%S")
+            details = (
+                f"Databricks query failure detected\n\n"
+                f"Query: {event_data.get('query_text', 'Unknown')[:50]}...\n"
+                f"Error: {event_data.get('error_message', 'Unknown')}"
+            )
+            await self.broadcast_message("DatabricksMonitor", "error detected", timestamp, details, ref)
+            self.logger.error(f"Databricks query failure detected in {log_group}: {event_data.get('query_id')}")
                     
-                    if self.mode == "semi-autonomous" and self.email_agent:
-                        self.logger.info(f"Semi-autonomous mode: Sending error to EmailAgent for approval (Ref: {ref})")
-                        await self.email_agent.handle_error(error_message, source="databricks", reference=ref)
-                    elif self.mode == "autonomous" and self.analyzer_agent:
-                        with open(self.config.get("error_log_file"), "a", encoding="utf-8") as f:
-                            f.write(f"[{datetime.now()}] {error_message}\n{'-' * 60}\n")
-                        self.logger.info("Logged Databricks query failure to databricks_errors.log")
-                        self.logger.info(f"Autonomous mode: Triggering AnalyzerAgent for Databricks error (Ref: {ref})")
-                        analysis_result = await self.analyzer_agent.analyze_error(error_message, source="databricks")
-                        analysis_timestamp = datetime.now().strftime("%H:%M:%S")
-                        analysis_details = f"Root cause identified: {analysis_result.get('root_cause', 'Unknown')}"
-                        await self.broadcast_message("ErrorAnalyzer", "analysis complete", analysis_timestamp, analysis_details, ref)
-                        output = {
-                            "reference": ref,
-                            "error": error_message,
-                            "root_cause": analysis_result.get("root_cause", "Unknown"),
-                            "remediation_steps": analysis_result.get("remediation_steps", []),
-                            "source": "databricks"
-                        }
-                        with open(self.config.get("fix_queue_file"), 'w', encoding='utf-8') as out:
-                            json.dump(output, out, indent=4)
-                        self.analyzer_agent.logger.info(f"Analysis result written to fix_queue.json for reference {ref}")
-                except json.JSONDecodeError as e:
-                    self.logger.error(f"Failed to parse Databricks log JSON: {e}")
-                    self.logger.debug(f"Skipped malformed Databricks log event: {event['message'][:100]}...")
-                except Exception as e:
-                    self.logger.error(f"Failed to process Databricks event: {e}")
+            if self.mode == "semi-autonomous" and self.email_agent:
+                self.logger.info(f"Semi-autonomous mode: Sending error to EmailAgent for approval (Ref: {ref})")
+                await self.email_agent.handle_error(error_message, source="databricks", reference=ref, incident=incident)
+            elif self.mode == "autonomous" and self.analyzer_agent:
+                with open(self.config.get("error_log_file"), "a", encoding="utf-8") as f:
+                    f.write(f"[{datetime.now()}] {error_message}\n{'-' * 60}\n")
+                self.logger.info("Logged Databricks query failure to databricks_errors.log")
+                await self.queue_analysis(incident)
+        except json.JSONDecodeError as e:
+            self.logger.error(f"Failed to parse Databricks log JSON: {e}")
+            self.logger.debug(f"Skipped malformed Databricks log event: {event['message'][:100]}...")
         except Exception as e:
-            self.logger.error(f"Error searching Databricks logs in {log_group}: {e}")
-            with open(self.config.get("error_log_file"), "a", encoding="utf-8") as f:
-                f.write(f"[{datetime.now()}] Error searching Databricks logs in {log_group}: {e}\n{'-' * 60}\n")
+            self.logger.error(f"Failed to process Databricks event: {e}")
+
+    def handle_search_error(self, log_group, error):
+        """Log a failed Databricks search and record it in the Databricks error log."""
+        super().handle_search_error(log_group, error)
+        with open(self.config.get("error_log_file"), "a", encoding="utf-8") as f:
+            f.write(f"[{datetime.now()}] Error searching Databricks logs in {log_group}: {error}\n{'-' * 60}\n")
 
 class MonitorAgent(AssistantAgent):
     def __init__(self, name, llm_config, analyzer_agent=None, email_agent=None, ws_manager=None, mode="semi-autonomous"):
@@ -462,8 +815,94 @@ class MonitorAgent(AssistantAgent):
         self.mongo_client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"))
         self.rules_db = self.mongo_client["rules_engine"]
         self.rules_collection = self.rules_db["rules"]
+        self.rule_index = ActiveRuleIndex(self.rules_collection, self.logger, poll_interval=float(os.getenv("RULE_INDEX_POLL_SECONDS", "1")))
+        self.rules_changed = None  # asyncio.Event set from the rule index thread, created in run_async
+        self.real_time_sources = set()
+        self.real_time_rules = os.getenv("MONITOR_REAL_TIME_RULES", "false").lower() == "true"  # Honour rules' real_time flag
+        self.ingestion_mode = os.getenv("MONITOR_INGESTION_MODE", "poll")  # 'poll' or 'live_tail'
+        self.k8s_watch_enabled = os.getenv("MONITOR_K8S_WATCH", "false").lower() == "true"
+        self.k8s_watch = None
+        self.shard_count = int(os.getenv("MONITOR_SHARDS", "1"))  # Worker processes to scan in; 1 scans in this process
+        self.shard = None  # ShardAssignment when this agent is a shard worker
+        self.shard_supervisor = None
+        self.assigned_groups = {}  # source -> log groups this process scans, when the work is split
+        self.replica_leases = leases_enabled()  # Split log groups with other replicas through MongoDB leases
+        self.leases = None
+        self.lease_listener = None
+        self.poll_scheduler = PollScheduler(
+            base_interval=float(os.getenv("MONITOR_POLL_BASE_SECONDS", "10")),
+            min_interval=float(os.getenv("MONITOR_POLL_MIN_SECONDS", "2")),
+            max_interval=float(os.getenv("MONITOR_POLL_MAX_SECONDS", "120")),
+            real_time_interval=float(os.getenv("MONITOR_REAL_TIME_POLL_SECONDS", "2"))
+        )
         self.service_monitors = self._initialize_monitors()
+        self.pattern_compiler = FilterPatternCompiler(self.logger)
+        self.rule_compiler = RuleCompiler(self.logger)
+        self.window_evaluator = WindowedRuleEvaluator()
+        self.metric_evaluator = SustainedRuleEvaluator(StreamingDetectorEngine(
+            alpha=float(os.getenv("METRIC_EWMA_ALPHA", "0.3")),
+            max_gap_seconds=float(os.getenv("METRIC_MAX_GAP_SECONDS", "180")),
+            max_series=int(os.getenv("METRIC_MAX_SERIES", "50000"))
+        ))
+        self.incident_folder = IncidentFolder(window_seconds=int(os.getenv("INCIDENT_FOLD_WINDOW_SECONDS", "600")))
+        self.shutdown_drain_seconds = float(os.getenv("INCIDENT_QUEUE_DRAIN_SECONDS", "60"))
+        self.incident_queue = IncidentQueue(
+            self.analyze_incident,
+            maxsize=int(os.getenv("INCIDENT_QUEUE_SIZE", "100")),
+            workers=int(os.getenv("INCIDENT_QUEUE_WORKERS", "2")),
+            policy=os.getenv("INCIDENT_QUEUE_POLICY", "block"),
+            logger=self.logger
+        )
+        correlation_window = int(os.getenv("INCIDENT_CORRELATION_WINDOW_SECONDS", "300"))
+        self.correlator = IncidentCorrelator(
+            window_seconds=correlation_window,
+            hold_seconds=float(os.getenv("INCIDENT_CORRELATION_HOLD_SECONDS", "5")),
+            logger=self.logger
+        ) if correlation_window > 0 else None
+        for source, monitor in self.service_monitors.items():
+            monitor.source = source
+            monitor.pattern_compiler = self.pattern_compiler
+            monitor.rule_compiler = self.rule_compiler
+            monitor.rule_trigger_handler = self.record_rule_trigger
+            monitor.window_evaluator = self.window_evaluator
+            monitor.metric_evaluator = self.metric_evaluator
+            monitor.incident_folder = self.incident_folder
+            monitor.incident_queue = self.incident_queue
+            monitor.correlator = self.correlator
+        self.strategy_selector = ScanStrategySelector(
+            mode=os.getenv("MONITOR_SCAN_STRATEGY", "auto"),
+            min_groups=int(os.getenv("MONITOR_INSIGHTS_MIN_GROUPS", "20"))
+        )
+        self.scan_engine = ScanEngine(
+            self.logger,
+            max_concurrency=int(os.getenv("MONITOR_SCAN_CONCURRENCY", "16")),
+            strategy_selector=self.strategy_selector
+        )
+        for monitor in self.service_monitors.values():
+            monitor.executor = self.scan_engine.executor
+            monitor.reader.configure(
+                allowed_lateness_ms=int(float(os.getenv("MONITOR_ALLOWED_LATENESS_SECONDS", "30")) * 1000),
+                reorder_delay_ms=int(float(os.getenv("MONITOR_REORDER_DELAY_SECONDS", "2")) * 1000),
+                reorder_max_events=int(os.getenv("MONITOR_REORDER_MAX_EVENTS", "1000")),
+                stream_idle_ms=int(float(os.getenv("MONITOR_STREAM_IDLE_SECONDS", "120")) * 1000)
+            )
+            monitor.insights = InsightsBatchScanner(monitor.cloudwatch, logger=self.logger)
+        if self.replica_leases:
+            # Replicas on other hosts resume each other's log groups, so the checkpoints are shared through MongoDB
+            self.checkpoints = MongoCheckpointStore(self.rules_db["monitor_checkpoints"], self.logger)
+        else:
+            self.checkpoints = CheckpointStore(
+                os.getenv("MONITOR_CHECKPOINT_FILE", "C:/Users/Quadrant/Loganalytics/Backend/monitor_checkpoints.json"),
+                self.logger
+            )
+        self.catchup_concurrency = int(os.getenv("MONITOR_CATCHUP_CONCURRENCY", "8"))
+        self.catchup_slice_ms = int(os.getenv("MONITOR_CATCHUP_SLICE_MINUTES", "15")) * 60 * 1000
+        self.catchup_max_age_ms = int(os.getenv("MONITOR_CATCHUP_MAX_HOURS", "24")) * 3600 * 1000
+        self.catchup_lag_ms = 60 * 1000  # Leave the most recent minute to live polling
+        self._load_checkpoints()
         self._running = True 
+        self.loop = None  # Event loop run_async runs on, for stop() to wake it
+        self.finished = threading.Event()  # Set once run_async has saved its final checkpoints and closed MongoDB
 
     def _initialize_monitors(self):
         """Initialize service-specific monitors."""
@@ -501,36 +940,374 @@ class MonitorAgent(AssistantAgent):
             "databricks": DatabricksMonitor(config["databricks"], self.logger, self.analyzer_agent, self.email_agent, self.ws_manager, self.mode)
         }
 
+    def _load_checkpoints(self):
+        """Seed each monitor's cursors from the persisted checkpoints, bounded by the catch-up horizon."""
+        oldest_allowed = int(time.time() * 1000) - self.catchup_max_age_ms
+        for source, monitor in self.service_monitors.items():
+            cursors = self.checkpoints.cursors(source)
+            for log_group, cursor in cursors.items():
+                if cursor.timestamp < oldest_allowed:
+                    self.logger.warning(f"Checkpoint for {source} {log_group} is older than the catch-up horizon, replaying from {datetime.fromtimestamp(oldest_allowed / 1000)}")
+                    cursor.skip_to(oldest_allowed - 1)
+                monitor.reader.restore(log_group, cursor)
+            if cursors:
+                self.logger.info(f"Loaded {len(cursors)} checkpoints for {source}")
+
+    def save_checkpoints(self):
+        """Persist every monitor's cursors; a shard worker or leased replica only persists the log groups it scans."""
+        if self.shard_supervisor is not None:
+            return  # The shard workers own the checkpoints
+        assigned = self.current_assignment()
+        for source, monitor in self.service_monitors.items():
+            cursors = monitor.reader.cursors
+            if assigned is not None:
+                cursors = {group: cursor for group, cursor in list(cursors.items()) if group in assigned.get(source, ())}
+            self.checkpoints.update(source, cursors)
+        self.checkpoints.save()
+
+    def join_shard(self, link, assignment, rate_share=1.0):
+        """Run as a shard worker: scan only the log groups assigned to it and hand incidents to the parent over link.
+
+        rate_share is the fraction of the API quotas this worker may use, 1 / the number of workers.
+        """
+        self.shard = assignment
+        governor.set_share(rate_share)
+        self.shard_count = 1
+        self.k8s_watch_enabled = False  # The parent runs the Kubernetes watch
+        self.incident_queue = link
+        self.correlator = None  # The parent correlates incidents across shards
+        for monitor in self.service_monitors.values():
+            monitor.incident_queue = link
+            monitor.correlator = None
+            if isinstance(monitor, SnowflakeMonitor):
+                # Semi-autonomous workers have no analyzer to take the Snowflake connection from
+                monitor.snowflake_enabled = link.snowflake_enabled
+        self.scan_engine.partition = assignment.filter
+        assignment.start()
+
+    def current_assignment(self):
+        """Return {source: log groups} this process scans when the work is split, or None when it scans them all."""
+        if self.shard is not None:
+            return self.shard.snapshot()
+        if self.leases is not None:
+            return self.leased_groups()
+        if self.replica_leases:
+            return self.assigned_groups  # Leases already released: keep to what was scanned here
+        return None
+
+    def apply_assignment(self, assigned):
+        """Adopt newly assigned log groups from their checkpoints and hand over the ones now scanned elsewhere."""
+        oldest_allowed = int(time.time() * 1000) - self.catchup_max_age_ms
+        gained = {source: groups - self.assigned_groups.get(source, set()) for source, groups in assigned.items()}
+        lost = {source: groups - assigned.get(source, set()) for source, groups in self.assigned_groups.items()}
+        if any(lost.values()):
+            self.save_checkpoints_for(lost)
+        if any(gained.values()):
+            self.checkpoints.reload()
+        for source, monitor in self.service_monitors.items():
+            owned = assigned.get(source, set())
+            for group in [group for group in monitor.reader.cursors if group not in owned]:
+                del monitor.reader.cursors[group]
+            self.checkpoints.release(source, lost.get(source, ()))
+            if gained.get(source):
+                # The previous owner saves on every pass, so at most one pass is read again here
+                stored = self.checkpoints.cursors(source)
+                for group in gained[source] & set(stored):
+                    cursor = stored[group]
+                    if cursor.timestamp < oldest_allowed:
+                        cursor.skip_to(oldest_allowed - 1)
+                    monitor.reader.restore(group, cursor)
+        if self.assigned_groups and (any(gained.values()) or any(lost.values())):
+            self.logger.info(f"Log group assignment changed: {sum(map(len, gained.values()))} log groups gained, {sum(map(len, lost.values()))} handed over")
+        self.assigned_groups = assigned
+
+    def save_checkpoints_for(self, groups_by_source):
+        """Persist the cursors of the given log groups before another shard or replica takes them over."""
+        for source, groups in groups_by_source.items():
+            cursors = self.service_monitors[source].reader.cursors
+            self.checkpoints.update(source, {group: cursors[group] for group in groups if group in cursors})
+        self.checkpoints.save()
+
+    async def enable_leases(self, loop):
+        """Split the log groups (and the Kubernetes watch) with the other replicas through MongoDB leases.
+
+        The listed log groups are offered as partitions before the first heartbeat, so the catch-up already
+        covers this replica's share.
+        """
+        self.leases = await loop.run_in_executor(None, open_lease_manager, self.logger)
+        if self.leases is None:
+            return
+        self.lease_listener = lambda: loop.call_soon_threadsafe(self.rules_changed.set)
+        self.leases.add_listener(self.lease_listener)
+        self.scan_engine.partition = self.lease_filter
+        if self.k8s_watch_enabled:
+            self.leases.offer(K8S_WATCH_LEASE, [K8S_WATCH_LEASE])
+        active_data_sources = self.get_active_data_sources()
+        for source, monitor in self.service_monitors.items():
+            if source in active_data_sources:
+                await self.scan_engine.list_log_groups(source, monitor)
+        await loop.run_in_executor(None, self.leases.heartbeat)
+
+    def lease_filter(self, source, groups):
+        """ScanEngine partition under replica leases: offer every listed log group and keep the ones leased here."""
+        keys = {f"monitor:{source}:{group}": group for group in groups}
+        self.leases.offer(f"monitor:{source}", keys)
+        return [group for key, group in keys.items() if self.leases.owns(key)]
+
+    def leased_groups(self):
+        """Return {source: log groups} this replica holds leases on."""
+        groups = {}
+        for key in self.leases.owned("monitor:"):
+            source, group = key[len("monitor:"):].split(":", 1)
+            groups.setdefault(source, set()).add(group)
+        return groups
+
+    def follow_leases(self, loop):
+        """Adopt the log groups gained and hand over the ones lost since the last pass; run the watch only where leased."""
+        # Every live replica scans the same account, so each uses an even share of the API quotas
+        rate_share = 1 / len(self.leases.members)
+        governor.set_share(rate_share)
+        if self.shard_supervisor is not None:
+            self.shard_supervisor.set_rate_share(rate_share)
+        if self.shard_supervisor is None:
+            self.apply_assignment(self.leased_groups())
+        if not self.k8s_watch_enabled:
+            return
+        if self.leases.owns(K8S_WATCH_LEASE) and self.k8s_watch is None:
+            self.enable_k8s_watch(loop)
+        elif not self.leases.owns(K8S_WATCH_LEASE) and self.k8s_watch is not None:
+            self.logger.info("Kubernetes watch lease moved to another replica, stopping the watch here")
+            self.k8s_watch.stop()
+            self.k8s_watch = None
+
+    async def supervise_shards(self, loop):
+        """Scan in worker processes: keep their log group shares balanced and continue what they report here."""
+        self.shard_supervisor = ShardSupervisor(
+            self.shard_count, self.mode, self.handle_shard_message, loop,
+            snowflake_enabled=getattr(self.analyzer_agent, "snowflake_conn", None) is not None,
+            load_factor=float(os.getenv("MONITOR_SHARD_LOAD_FACTOR", "1.25")),
+            logger=self.logger
+        )
+        self.shard_supervisor.start()
+        interval = float(os.getenv("MONITOR_SHARD_REBALANCE_SECONDS", "30"))
+        try:
+            while self._running:
+                if self.leases is not None:
+                    self.follow_leases(loop)
+                active_data_sources = self.get_active_data_sources()
+                groups = {}
+                for source, monitor in self.service_monitors.items():
+                    if source in active_data_sources:
+                        groups[source] = await self.scan_engine.list_log_groups(source, monitor)
+                self.shard_supervisor.rebalance(groups)
+                self.shard_supervisor.check_workers()
+                try:
+                    await asyncio.wait_for(self.rules_changed.wait(), timeout=interval)
+                except asyncio.TimeoutError:
+                    pass
+                self.rules_changed.clear()
+        finally:
+            await loop.run_in_executor(None, self.shard_supervisor.stop)
+
+    async def handle_shard_message(self, kind, payload):
+        """Continue a shard worker's report here: broadcast it, or correlate and analyse its incident."""
+        if kind == "broadcast":
+            if self.ws_manager:
+                await self.ws_manager.broadcast(payload)
+        elif kind == "incident":
+            await self.service_monitors[payload["source"]].queue_analysis(incident_from_payload(payload), payload.get("key"))
+        elif kind == "approval" and self.email_agent:
+            await self.email_agent.handle_error(
+                payload["error_message"], source=payload["source"], reference=payload["reference"],
+                incident=incident_from_payload(payload)
+            )
+
+    async def catch_up(self, active_data_sources):
+        """Replay everything between the stored checkpoints and now before switching to live polling."""
+        until = int(time.time() * 1000) - self.catchup_lag_ms
+        semaphore = asyncio.Semaphore(self.catchup_concurrency)
+
+        async def drain(monitor, group):
+            async with semaphore:
+                await monitor.catch_up(group, until, self.catchup_slice_ms)
+
+        tasks = []
+        for source, monitor in self.service_monitors.items():
+            if source not in active_data_sources:
+                continue
+            for group in await self.scan_engine.list_log_groups(source, monitor):
+                if group in monitor.reader.cursors and monitor.reader.cursors[group].timestamp <= until:
+                    tasks.append(drain(monitor, group))
+        if not tasks:
+            return
+        self.logger.info(f"Catching up {len(tasks)} log groups with concurrency {self.catchup_concurrency}...")
+        started = time.time()
+        await asyncio.gather(*tasks)
+        self.save_checkpoints()
+        self.logger.info(f"Catch-up complete in {time.time() - started:.1f}s, switching to live polling")
+
+    def enable_live_tail(self, loop, transport_factory=None):
+        """Stream events into every monitor as they arrive, keeping polling as the fallback.
+
+        transport_factory(monitor) returns the StreamTransport to use; by default a CloudWatch live tail
+        on the monitor's client.
+        """
+        transport_factory = transport_factory or (lambda monitor: CloudWatchLiveTailTransport(monitor.cloudwatch))
+        for monitor in self.service_monitors.values():
+            monitor.live_tail = LiveTailIngestor(
+                monitor, transport_factory(monitor), loop,
+                retry_seconds=int(os.getenv("MONITOR_LIVE_TAIL_RETRY_SECONDS", "300")),
+                logger=self.logger
+            )
+        self.logger.info("Live tail ingestion enabled, polling remains the fallback")
+
+    def enable_k8s_watch(self, loop, transport=None):
+        """Watch pods, nodes and events on the Kubernetes API alongside the EKS audit log polling.
+
+        transport is the WatchTransport to use; by default the API server configured by the K8S_* variables.
+        """
+        monitor = self.service_monitors.get("eks")
+        if monitor is None:
+            return
+        try:
+            transport = transport or KubernetesApiTransport.from_env()
+        except Exception as e:
+            self.logger.error(f"Kubernetes watch not started: {e}")
+            return
+        self.k8s_watch = KubernetesWatchDetector(
+            monitor, transport, loop,
+            resources=tuple(os.getenv("K8S_WATCH_RESOURCES", "pods,nodes,events").split(",")),
+            not_ready_seconds=int(os.getenv("K8S_NODE_NOT_READY_SECONDS", "120")),
+            max_backoff=float(os.getenv("K8S_WATCH_MAX_BACKOFF_SECONDS", "60")),
+            logger=self.logger
+        )
+        self.k8s_watch.start()
+
+    async def analyze_incident(self, job):
+        """Incident queue handler: run the detecting monitor's analysis for a queued error."""
+        await job.monitor.analyze_incident(job)
+
+    async def record_rule_trigger(self, rule, log_group, event, occurrences=1, breach=None):
+        """Broadcast a fired rule and stamp its last_triggered time; breach holds the detector readings of a sustained rule."""
+        self.logger.info(f"Rule '{rule.name}' ({rule.condition}) triggered by event {event.get('eventId')} in {log_group} ({occurrences} occurrences)")
+        details = f"Rule '{rule.name}' triggered\n\nCondition: {rule.condition}\nLog group: {log_group}\nOccurrences: {occurrences}"
+        if breach is not None:
+            details += (
+                f"\nEntity: {breach['entity']}\nSustained for: {breach['sustained_seconds']}s"
+                f"\nLatest: {breach['value']}  Smoothed: {breach['smoothed']}  Peak: {breach['peak']}  p95: {breach['p95']}"
+            )
+        if self.ws_manager:
+            await self.ws_manager.broadcast({
+                "agent": "RulesEngine",
+                "status": "rule triggered",
+                "time": datetime.now().strftime("%H:%M:%S"),
+                "details": details,
+                "reference": rule.rule_id
+            })
+        if not rule.rule_id or not ObjectId.is_valid(rule.rule_id):
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(
+                self.scan_engine.executor,
+                lambda: self.rules_collection.update_one({"_id": ObjectId(rule.rule_id)}, {"$set": {"last_triggered": datetime.utcnow()}})
+            )
+        except Exception as e:
+            self.logger.error(f"Failed to update last_triggered for rule {rule.rule_id}: {e}")
+
     def get_active_data_sources(self):
-        """Fetch data sources from active rules in the rules_engine database."""
+        """Return data sources of the active rules from the in-memory rule index."""
         try:
-            active_rules = self.rules_collection.find({"status": "Active"})
+            active_rules = self.rule_index.active_rules()
             data_sources = set(rule["data_source"] for rule in active_rules)
+            self.real_time_sources = real_time_sources(active_rules, self.real_time_rules)
+            if self.pattern_compiler.update(active_rules):
+                self.logger.info(f"Recompiled CloudWatch filter patterns for {len(active_rules)} active rules")
+            if self.rule_compiler.update(active_rules):
+                self.logger.info(f"Compiled {len(active_rules)} active rules")
             self.logger.info(f"Active data sources: {data_sources}")
             return data_sources
         except Exception as e:
-            self.logger.error(f"Error fetching active rules from MongoDB: {e}")
+            self.logger.error(f"Error reading active rules: {e}")
             return set()
 
     async def run_async(self):
         self.logger.info(f"Starting CloudWatch logs monitoring for active rules in {self.mode} mode...")
+        loop = asyncio.get_running_loop()
+        self.rules_changed = asyncio.Event()
+        self.loop = loop
+        self.rule_index.add_listener(lambda: loop.call_soon_threadsafe(self.rules_changed.set))
         try:
+            await loop.run_in_executor(self.scan_engine.executor, self.rule_index.start)
+            if self.ingestion_mode == "live_tail":
+                self.enable_live_tail(loop)
+            if self.replica_leases and self.shard is None:
+                await self.enable_leases(loop)
+            if self.k8s_watch_enabled and self.leases is None:
+                self.enable_k8s_watch(loop)
+            if self.mode == "autonomous" and self.analyzer_agent:
+                self.incident_queue.start()
+            if self.shard_count > 1:
+                await self.supervise_shards(loop)
+                return
+            if self.shard is not None:
+                self.shard.on_change = lambda: loop.call_soon_threadsafe(self.rules_changed.set)
+                await loop.run_in_executor(None, self.shard.ready.wait)
+                self.apply_assignment(self.shard.snapshot())
+            elif self.leases is not None:
+                self.follow_leases(loop)
+            await self.catch_up(self.get_active_data_sources())
             while self._running:  # Check stop flag
+                if self.shard is not None:
+                    if self.shard.stopped.is_set():
+                        break
+                    self.apply_assignment(self.shard.snapshot())
+                elif self.leases is not None:
+                    self.follow_leases(loop)
                 active_data_sources = self.get_active_data_sources()
-                for source, monitor in self.service_monitors.items():
+                active_sources = []
+                for source in self.service_monitors:
                     if source in active_data_sources:
-                        log_groups = monitor.get_recent_log_groups(monitor.config.get("log_group_prefix"))
-                        for group in log_groups:
-                            await monitor.search_errors(group)
+                        active_sources.append(source)
+                        self.poll_scheduler.set_real_time(source, source in self.real_time_sources)
                     else:
-                        self.logger.info(f"Skipping {source} log monitoring: No active rules for '{source}'")
-                await asyncio.sleep(10)
+                        self.logger.debug(f"Skipping {source} log monitoring: No active rules for '{source}'")
+                        if self.leases is not None:
+                            self.leases.withdraw(f"monitor:{source}")
+                due_monitors = {source: self.service_monitors[source] for source in self.poll_scheduler.due(active_sources)}
+                if due_monitors:
+                    stats = await self.scan_engine.run_pass(
+                        due_monitors, interval=min(self.poll_scheduler.interval(source) for source in due_monitors)
+                    )
+                    for source in due_monitors:
+                        self.poll_scheduler.record(source, stats["events"].get(source, 0))
+                    self.save_checkpoints()
+                # Rule edits wake the loop so they take effect without waiting for the next due source
+                await self.poll_scheduler.wait(active_sources, wake=self.rules_changed)
+                self.rules_changed.clear()
         except asyncio.CancelledError:
             self.logger.info("Monitoring stopped by user")
         except Exception as e:
             self.logger.error(f"Error in monitoring loop: {e}")
         finally:
+            for monitor in self.service_monitors.values():
+                if monitor.live_tail is not None:
+                    monitor.live_tail.stop()
+            if self.k8s_watch is not None:
+                self.k8s_watch.stop()
+            self.rule_index.stop()
+            if self.correlator is not None:
+                await self.correlator.flush()
+            # The flushed groups were just queued; analyse them (within a bound) rather than discard them
+            await self.incident_queue.stop(drain_timeout=self.shutdown_drain_seconds)
+            self.save_checkpoints()
+            if self.leases is not None:
+                # Released only after the final checkpoints, so the replicas taking over resume from them
+                close_lease_manager(self.lease_listener, [f"monitor:{source}" for source in self.service_monitors] + [K8S_WATCH_LEASE])
+                self.leases = None
+            self.scan_engine.shutdown()
             self.mongo_client.close()
+            self.finished.set()
 
     def run(self):
         """Synchronous wrapper for running the async monitor loop."""
@@ -543,8 +1320,41 @@ class MonitorAgent(AssistantAgent):
             loop.run_until_complete(loop.shutdown_asyncgens())
             loop.close()
 
+    def get_scan_stats(self):
+        """Return timing statistics for the most recent scan pass."""
+        return dict(
+            self.scan_engine.last_pass,
+            log_group_catalog=log_group_catalog.get_stats(),
+            rate_governor=governor.get_stats(),
+            sliding_windows=self.window_evaluator.engine.get_stats(),
+            metric_detectors=self.metric_evaluator.engine.get_stats(),
+            incidents=self.incident_folder.get_stats(),
+            lateness={source: monitor.reader.get_stats() for source, monitor in self.service_monitors.items()},
+            incident_queue=self.incident_queue.get_stats(),
+            correlation=self.correlator.get_stats() if self.correlator is not None else None,
+            rule_index=self.rule_index.get_stats(),
+            poll_cadence=self.poll_scheduler.get_cadence(),
+            scan_strategy_latency=self.strategy_selector.get_stats(),
+            live_tail={source: monitor.live_tail.get_stats() for source, monitor in self.service_monitors.items() if monitor.live_tail is not None},
+            k8s_watch=self.k8s_watch.get_stats() if self.k8s_watch is not None else None,
+            shards=self.shard_supervisor.get_stats() if self.shard_supervisor is not None else None,
+            leases=self.leases.get_stats() if self.leases is not None else None
+        )
+
     def stop(self):
-        """Stop the monitoring loop and clean up resources."""
+        """Signal the monitoring loop to stop; it saves its checkpoints and closes MongoDB on the way out."""
         self._running = False  # Set stop flag
         self.logger.info("Stopping MonitorAgent")
-        self.mongo_client.close()
\ No newline at end of file
+        if self.loop is None:
+            self.mongo_client.close()  # Never started, so there is no loop to clean up after it
+            self.finished.set()
+            return
+        try:
+            # Wake the loop from its poll wait so it stops now rather than after the next due source
+            self.loop.call_soon_threadsafe(self.rules_changed.set)
+        except RuntimeError:
+            pass  # The loop has already closed
+
+    def wait_stopped(self, timeout=None):
+        """Block until the monitoring loop has finished shutting down; returns False on timeout."""
+        return self.finished.wait(timeout)
\ No newline at end of file
@@ -1,5 +1,4 @@
 # monitor.py
-import boto3
 import time
 import logging
 import json
@@ -12,6 +11,9 @@ from pymongo import MongoClient
 from openai import OpenAI
 
 from autogen import AssistantAgent
+from aws_clients import get_client
+from log_group_catalog import catalog
+from rate_governor import governor
 
 # Load environment variables from .env file
 load_dotenv()
@@ -70,10 +72,10 @@ class MonitorAgent(AssistantAgent):
         )
 
     def _get_boto_client(self, region_name):
-        """Creates or retrieves a boto3 client for a specific region."""
+        """Creates or retrieves a boto3 client for a specific region; its calls go through the rate governor."""
         if region_name not in self.boto_clients:
             self.logger.info(f"Initializing Boto3 client for region: {region_name}")
-            self.boto_clients[region_name] = boto3.client("logs", region_name=region_name)
+            self.boto_clients[region_name] = get_client("logs", region_name=region_name, governed=True)
         return self.boto_clients[region_name]
 
     def _load_active_rules(self):
@@ -147,12 +149,7 @@ class MonitorAgent(AssistantAgent):
         # 2. Find and Search Log Groups
         try:
             boto_client = self._get_boto_client(config['region'])
-            paginator = boto_client.get_paginator('describe_log_groups')
-            
-            log_groups_to_search = []
-            for page in paginator.paginate(logGroupNamePrefix=config['log_prefix']):
-                for group in page['logGroups']:
-                    log_groups_to_search.append(group['logGroupName'])
+            log_groups_to_search = catalog.get(boto_client, config['region'], config['log_prefix'])
             
             self.logger.info(f"Found {len(log_groups_to_search)} log groups for prefix '{config['log_prefix']}'")
 
@@ -166,7 +163,8 @@ class MonitorAgent(AssistantAgent):
         """Executes the CloudWatch search and triggers the workflow if events are found."""
         try:
             now = int(time.time() * 1000)
-            response = client.filter_log_events(
+            response = governor.call(
+                client, "filter_log_events",
                 logGroupName=log_group,
                 startTime=self.startup_time,
                 endTime=now,
@@ -209,7 +207,7 @@ class MonitorAgent(AssistantAgent):
                 
                 # 3. Trigger Analyzer Agent
                 if self.analyzer_agent:
-                    analysis_result = self.analyzer_agent.analyze_error(error_message, source=rule.get('data_source'))
+                    analysis_result = await self.analyzer_agent.analyze_error(error_message, source=rule.get('data_source'))
                     analysis_timestamp = datetime.now().strftime("%H:%M:%S")
                     analysis_details = f"Root cause identified: {analysis_result.get('root_cause', 'Unknown')}"
                     await self._async_broadcast("ErrorAnalyzer", "analysis complete", analysis_timestamp, analysis_details, ref)
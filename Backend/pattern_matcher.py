@@ -0,0 +1,30 @@
+import re
+
+
+class MultiPatternMatcher:
+    """Finds every occurrence of a set of literal tokens in one pass over a message."""
+    def __init__(self, literals):
+        self.literals = sorted({literal for literal in literals if literal}, key=len, reverse=True)
+        # A zero-width lookahead lets the scan report a match at every position, so overlapping tokens are
+        # not swallowed; shorter tokens starting at the same position are recovered from the containment map.
+        self.contained = {
+            literal: frozenset(other for other in self.literals if other in literal)
+            for literal in self.literals
+        }
+        self.regex = None
+        if self.literals:
+            self.regex = re.compile("(?=(" + "|".join(re.escape(literal) for literal in self.literals) + "))")
+
+    def find(self, text):
+        """Return the set of literal tokens occurring in text."""
+        if self.regex is None:
+            return frozenset()
+        found = set()
+        total = len(self.literals)
+        for match in self.regex.finditer(text):
+            literal = match.group(1)
+            if literal not in found:
+                found.update(self.contained[literal])
+                if len(found) == total:
+                    break
+        return found
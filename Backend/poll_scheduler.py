@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import time
+
+
+def real_time_sources(rules, enabled):
+    """Return the data sources whose active rules ask for real-time evaluation, or none unless enabled.
+
+    Rules are saved with real_time on by default, so honouring the flag is an explicit opt-in; otherwise every
+    source with an active rule would be held at real_time_interval and never back off while idle.
+    """
+    if not enabled:
+        return set()
+    return {rule["data_source"] for rule in rules if rule.get("real_time")}
+
+
+class SourceCadence:
+    """Polling state for one source: its current interval and when it is next due."""
+    __slots__ = ("interval", "next_due", "real_time", "last_found", "idle_passes", "polls")
+
+    def __init__(self, interval, now):
+        self.interval = interval
+        self.next_due = now
+        self.real_time = False
+        self.last_found = 0
+        self.idle_passes = 0
+        self.polls = 0
+
+
+class PollScheduler:
+    """Per-source polling cadence: tightens while passes find events, backs off exponentially while idle.
+
+    Sources flagged real_time (see real_time_sources) never poll slower than real_time_interval.
+    """
+    def __init__(self, base_interval=10, min_interval=2, max_interval=120, real_time_interval=2, backoff=2.0, tighten=0.5):
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.real_time_interval = real_time_interval
+        self.backoff = backoff
+        self.tighten = tighten
+        self.sources = {}
+        self.lock = threading.Lock()
+
+    def _cadence(self, source, now):
+        cadence = self.sources.get(source)
+        if cadence is None:
+            cadence = self.sources[source] = SourceCadence(self.base_interval, now)
+        return cadence
+
+    def set_real_time(self, source, real_time):
+        """Flag a source as real-time; switching it on makes it due immediately."""
+        with self.lock:
+            now = time.monotonic()
+            cadence = self._cadence(source, now)
+            if real_time and not cadence.real_time:
+                cadence.interval = min(cadence.interval, self.real_time_interval)
+                cadence.next_due = min(cadence.next_due, now)
+            cadence.real_time = real_time
+
+    def record(self, source, found):
+        """Record how many events a poll of source found and schedule its next poll."""
+        with self.lock:
+            now = time.monotonic()
+            cadence = self._cadence(source, now)
+            cadence.polls += 1
+            cadence.last_found = found
+            if found:
+                cadence.idle_passes = 0
+                interval = max(self.min_interval, min(cadence.interval, self.base_interval) * self.tighten)
+            else:
+                cadence.idle_passes += 1
+                interval = min(self.max_interval, cadence.interval * self.backoff)
+            if cadence.real_time:
+                interval = min(interval, self.real_time_interval)
+            cadence.interval = interval
+            cadence.next_due = now + interval
+
+    def interval(self, source):
+        """Return the current polling interval of a source."""
+        with self.lock:
+            return self._cadence(source, time.monotonic()).interval
+
+    def due(self, sources=None):
+        """Return the sources (optionally limited to the given ones) whose next poll is due."""
+        with self.lock:
+            now = time.monotonic()
+            candidates = self.sources if sources is None else sources
+            return [source for source in candidates if self._cadence(source, now).next_due <= now]
+
+    def seconds_until_due(self, sources=None):
+        """Return how long until the next of the given sources is due."""
+        with self.lock:
+            now = time.monotonic()
+            candidates = list(self.sources if sources is None else sources)
+            if not candidates:
+                return self.base_interval
+            return max(0.0, min(self._cadence(source, now).next_due for source in candidates) - now)
+
+    async def wait(self, sources=None, wake=None):
+        """Sleep until one of the sources is due, or until the wake event is set."""
+        delay = self.seconds_until_due(sources)
+        if wake is None:
+            await asyncio.sleep(delay)
+            return
+        try:
+            await asyncio.wait_for(wake.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+
+    def wait_blocking(self, sources=None):
+        """Blocking counterpart of wait() for synchronous loops."""
+        time.sleep(self.seconds_until_due(sources))
+
+    def get_cadence(self):
+        """Return the current interval, time to next poll and last result per source."""
+        with self.lock:
+            now = time.monotonic()
+            return {
+                source: {
+                    "interval_seconds": round(cadence.interval, 2),
+                    "next_poll_in_seconds": round(max(0.0, cadence.next_due - now), 2),
+                    "real_time": cadence.real_time,
+                    "last_found": cadence.last_found,
+                    "idle_passes": cadence.idle_passes,
+                    "polls": cadence.polls
+                }
+                for source, cadence in self.sources.items()
+            }
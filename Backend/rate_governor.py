@@ -0,0 +1,159 @@
+import logging
+import random
+import threading
+import time
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, HTTPClientError
+
+# Starting (and maximum) request rates per second, per account and region, from the CloudWatch Logs quotas
+DEFAULT_RATES = {
+    "FilterLogEvents": 5,
+    "DescribeLogGroups": 5,
+    "CreateLogGroup": 5,
+    "CreateLogStream": 50,
+    "PutLogEvents": 800,
+    "StartQuery": 5,
+    "GetQueryResults": 5,
+    "StopQuery": 5,
+    "StartLiveTail": 5,
+}
+FALLBACK_RATE = 5
+THROTTLE_CODES = {"ThrottlingException", "Throttling", "TooManyRequestsException", "RequestLimitExceeded"}
+TRANSIENT_CODES = {"RequestTimeout", "RequestTimeoutException", "InternalFailure", "InternalError", "ServiceUnavailable", "ServiceUnavailableException"}
+
+
+class AdaptiveTokenBucket:
+    """Token bucket whose refill rate grows additively on success and halves on throttling (AIMD)."""
+    def __init__(self, rate, max_rate=None, min_rate=0.2, increase=0.5, decrease=0.5):
+        self.rate = float(rate)
+        self.max_rate = float(max_rate or rate)
+        self.min_rate = min_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.capacity = max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Block until a token is available."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def on_success(self):
+        """Additively raise the rate, by roughly `increase` requests/second per second of successful calls."""
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+            self.capacity = max(1.0, self.rate)
+
+    def on_throttle(self):
+        """Multiplicatively cut the rate and drain the burst allowance."""
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.capacity = max(1.0, self.rate)
+            self.tokens = min(self.tokens, 0.0)
+
+    def rescale(self, factor):
+        """Multiply the current and maximum rates by factor, e.g. when the quota is split a different way."""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.max_rate = max(self.min_rate, self.max_rate * factor)
+            self.rate = min(self.max_rate, max(self.min_rate, self.rate * factor))
+            self.capacity = max(1.0, self.rate)
+            self.tokens = min(self.tokens, self.capacity)
+
+
+class RateGovernor:
+    """Shared per-(API, region) rate governor with adaptive rates and jittered retry on throttling.
+
+    The quotas are per account and region, so a process that is one of several scanning the same account only
+    uses its share of them (see set_share).
+    """
+    def __init__(self, rates=None, max_attempts=5, base_backoff=0.5, max_backoff=20, logger=None):
+        self.rates = dict(DEFAULT_RATES, **(rates or {}))
+        self.share = 1.0
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.logger = logger or logging.getLogger("MONITOR")
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.throttles = {}
+
+    def bucket(self, api, region):
+        """Return the token bucket for an API in a region."""
+        key = (api, region)
+        with self.lock:
+            if key not in self.buckets:
+                self.buckets[key] = AdaptiveTokenBucket(self.rates.get(api, FALLBACK_RATE) * self.share)
+            return self.buckets[key]
+
+    def set_share(self, share):
+        """Limit this process to a fraction of every quota, e.g. 1 / N when N processes scan the same account."""
+        with self.lock:
+            if share == self.share:
+                return
+            factor = share / self.share
+            self.share = share
+            buckets = list(self.buckets.values())
+        for bucket in buckets:
+            bucket.rescale(factor)
+        self.logger.info(f"Rate governor using {share:.2%} of the API quotas")
+
+    def call(self, client, operation, **kwargs):
+        """Invoke client.<operation>(**kwargs) through the governor, retrying with full jitter.
+
+        Throttled calls also lower the API's rate. Connection errors, timeouts and 5xx responses are retried the
+        same way without touching the rate, since governed clients leave all retrying to the governor.
+        """
+        api = client.meta.method_to_api_mapping.get(operation, operation)
+        region = client.meta.region_name
+        bucket = self.bucket(api, region)
+        method = getattr(client, operation)
+        for attempt in range(self.max_attempts):
+            bucket.acquire()
+            try:
+                result = method(**kwargs)
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") in THROTTLE_CODES:
+                    bucket.on_throttle()
+                    with self.lock:
+                        self.throttles[(api, region)] = self.throttles.get((api, region), 0) + 1
+                    reason = f"throttled, rate lowered to {bucket.rate:.2f}/s"
+                elif e.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0) >= 500 or e.response.get("Error", {}).get("Code") in TRANSIENT_CODES:
+                    reason = f"failed with {e.response.get('Error', {}).get('Code')}"
+                else:
+                    raise
+                if attempt == self.max_attempts - 1:
+                    raise
+            except (BotoConnectionError, HTTPClientError) as e:
+                if attempt == self.max_attempts - 1:
+                    raise
+                reason = f"failed with {type(e).__name__}"
+            else:
+                bucket.on_success()
+                return result
+            delay = random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+            self.logger.warning(f"{api} {reason} in {region}, retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+    def get_stats(self):
+        """Return the current rate and throttle count per (API, region)."""
+        with self.lock:
+            return {
+                f"{api}:{region}": {"rate": round(bucket.rate, 2), "throttles": self.throttles.get((api, region), 0)}
+                for (api, region), bucket in self.buckets.items()
+            }
+
+
+governor = RateGovernor()
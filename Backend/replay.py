@@ -0,0 +1,189 @@
+"""Replay recorded CloudWatch events through a monitor's detection logic without AWS.
+
+Usage:
+    python replay.py --source eks capture.jsonl [more.jsonl ...] [--speed 10] [--log-group NAME]
+
+Each capture line is a CloudWatch event ({"timestamp", "message", "eventId", "logStreamName", "logGroupName"})
+or a filter_log_events response ({"events": [...]}). Events are served by LocalLogsClient and read through the
+monitor's own IncrementalLogReader, then detected one at a time so per-event latency can be measured.
+
+--speed 0 (the default) replays as fast as possible; --speed N makes each event visible N times faster than it
+was recorded, and latency is measured from the moment an event becomes visible.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from bisect import bisect_left
+from cloudwatch_reader import IncrementalLogReader
+from rate_governor import governor
+from template_miner import IncidentFolder
+from monitor import WindowsMonitor, SnowflakeMonitor, KubernetesMonitor, DatabricksMonitor
+
+MONITORS = {
+    "windows": WindowsMonitor,
+    "snowflake": SnowflakeMonitor,
+    "eks": KubernetesMonitor,
+    "databricks": DatabricksMonitor,
+}
+LOCAL_API = "LocalFilterLogEvents"
+PAGE_SIZE = 10000
+
+
+class _LocalMeta:
+    region_name = "local"
+    method_to_api_mapping = {"filter_log_events": LOCAL_API, "describe_log_groups": "LocalDescribeLogGroups"}
+
+
+class LocalLogsClient:
+    """In-memory stand-in for the CloudWatch Logs client, serving recorded events per log group.
+
+    Filter patterns are not evaluated: every event in the time range is returned, so detection sees a
+    superset of what CloudWatch would have sent.
+    """
+    meta = _LocalMeta()
+
+    def __init__(self, events_by_group):
+        self.events = {
+            group: sorted(events, key=lambda event: (event["timestamp"], event["eventId"]))
+            for group, events in events_by_group.items()
+        }
+        self.timestamps = {group: [event["timestamp"] for event in events] for group, events in self.events.items()}
+        self.calls = 0
+
+    def filter_log_events(self, logGroupName, startTime=0, endTime=None, nextToken=None, limit=PAGE_SIZE, **kwargs):
+        self.calls += 1
+        events = self.events.get(logGroupName, [])
+        position = int(nextToken) if nextToken else bisect_left(self.timestamps.get(logGroupName, []), startTime)
+        page = []
+        while position < len(events) and len(page) < limit:
+            event = events[position]
+            if endTime is not None and event["timestamp"] > endTime:
+                break
+            page.append(event)
+            position += 1
+        response = {"events": page}
+        if page and position < len(events) and (endTime is None or events[position]["timestamp"] <= endTime):
+            response["nextToken"] = str(position)
+        return response
+
+    def describe_log_groups(self, logGroupNamePrefix="", **kwargs):
+        return {"logGroups": [{"logGroupName": group} for group in self.events if group.startswith(logGroupNamePrefix)]}
+
+
+def load_capture(paths, default_group):
+    """Read JSONL captures into {log_group: [event, ...]}, filling in missing event IDs."""
+    events_by_group = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8-sig") as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                for index, event in enumerate(record.get("events", [record])):
+                    group = event.get("logGroupName") or default_group
+                    events_by_group.setdefault(group, []).append({
+                        "timestamp": int(event["timestamp"]),
+                        "message": event["message"],
+                        "eventId": event.get("eventId") or f"{os.path.basename(path)}:{number}:{index}",
+                        "logStreamName": event.get("logStreamName", "replay")
+                    })
+    return events_by_group
+
+
+class IncidentRecorder:
+    """Stand-in WebSocket manager that counts the incidents a monitor broadcasts."""
+    def __init__(self):
+        self.incidents = 0
+        self.messages = 0
+
+    async def broadcast(self, message):
+        self.messages += 1
+        if message.get("status") == "error detected":
+            self.incidents += 1
+
+
+def build_monitor(source, client, recorder, work_dir, fold):
+    config = {
+        "region": "local",
+        "log_group": None,
+        "error_log_file": os.path.join(work_dir, f"{source}_errors.log"),
+        "fix_queue_file": os.path.join(work_dir, "fix_queue.json")
+    }
+    logger = logging.getLogger("REPLAY")
+    monitor = MONITORS[source](config, logger, None, None, recorder, "autonomous")
+    monitor.source = source
+    monitor.cloudwatch = client
+    monitor.reader = IncrementalLogReader(client, start_time=0)
+    if fold:
+        monitor.incident_folder = IncidentFolder()
+    return monitor
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def replay(monitor, events_by_group, speed=0, poll_interval=0.05):
+    """Feed every recorded event through monitor detection; returns (elapsed_seconds, latencies_seconds).
+
+    At full speed latency is each event's detection time; with a speed multiplier it runs from the moment
+    the event became visible, so it also includes polling delay and queueing behind earlier events.
+    """
+    timestamps = [event["timestamp"] for events in events_by_group.values() for event in events]
+    first, last = min(timestamps), max(timestamps)
+    latencies = []
+    started = time.perf_counter()
+    while True:
+        now = time.perf_counter()
+        # The recorded time every event up to which is visible now
+        visible_until = last if speed <= 0 else first + int((now - started) * 1000 * speed)
+        for log_group in events_by_group:
+            for event in monitor.fetch_new_events(log_group, end_time=visible_until):
+                available = time.perf_counter() if speed <= 0 else started + (event["timestamp"] - first) / 1000 / speed
+                await monitor.process_new_events(log_group, [event])
+                latencies.append(time.perf_counter() - available)
+        if visible_until >= last:
+            break
+        await asyncio.sleep(poll_interval)
+    return time.perf_counter() - started, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded CloudWatch events through a monitor")
+    parser.add_argument("captures", nargs="+", help="JSONL capture files")
+    parser.add_argument("--source", required=True, choices=sorted(MONITORS), help="Monitor to replay into")
+    parser.add_argument("--log-group", default="replay", help="Log group for events without logGroupName")
+    parser.add_argument("--speed", type=float, default=0, help="Replay speed multiplier; 0 replays as fast as possible")
+    parser.add_argument("--no-fold", action="store_true", help="Report every detected error instead of folding repeats")
+    parser.add_argument("--log-level", default="CRITICAL", help="Level for the monitor's own logging (detections log at ERROR)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("REPLAY").setLevel(args.log_level.upper())
+    # The stand-in client is local, so the CloudWatch request quotas do not apply to it
+    governor.rates[LOCAL_API] = 1e9
+    events_by_group = load_capture(args.captures, args.log_group)
+    client = LocalLogsClient(events_by_group)
+    recorder = IncidentRecorder()
+    with tempfile.TemporaryDirectory() as work_dir:
+        monitor = build_monitor(args.source, client, recorder, work_dir, fold=not args.no_fold)
+        elapsed, latencies = asyncio.run(replay(monitor, events_by_group, speed=args.speed))
+    count = len(latencies)
+    print(f"{monitor.service_name}: {count} events from {len(events_by_group)} log groups in {elapsed:.3f}s ({count / elapsed if elapsed else 0:.0f} events/s, {client.calls} filter_log_events calls)")
+    print(f"  incidents emitted: {recorder.incidents}" + ("" if args.no_fold else f" ({monitor.incident_folder.get_stats()['folded']} folded repeats)"))
+    print(
+        "  per-event latency ms: "
+        f"p50 {_percentile(latencies, 0.5) * 1000:.3f}  p95 {_percentile(latencies, 0.95) * 1000:.3f}  "
+        f"p99 {_percentile(latencies, 0.99) * 1000:.3f}  max {max(latencies, default=0) * 1000:.3f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,455 @@
+import json
+import logging
+import re
+import threading
+from event_decoder import LazyEvent
+from pattern_matcher import MultiPatternMatcher
+
+# Condition grammar, tried in order against the whole condition (case-insensitive):
+#   windowed count   <subject> [>|>=|=] N [times] in N <unit>     "Pod crash count > 2 in 5 minutes"
+#   repeated count   <subject> [>|>=] N times                      "Windows Update fails > 3 times"
+#   sustained        <subject> <op> <value> for [>] N <unit>       "CPU usage > 90% for 5 minutes"
+#   contains         <subject> contains|has '<text>'               "Syslog contains 'Out of memory'"
+#   comparison       <subject> <op> <value> [occurs]               "Pod status = ImagePullBackOff"
+#   event            <phrase> [detected|logged|occurs|...]         "Kernel panic detected"
+_UNIT = r"(?P<unit>seconds?|secs?|minutes?|mins?|hours?|hrs?|days?)"
+_OP = r"(?P<op>>=|<=|!=|>|<|=)"
+WINDOWED_COUNT = re.compile(r"^(?P<subject>.+?)\s+(?:(?P<op>>=|>|=)\s*)?(?P<count>\d+)\s+(?:times\s+)?in\s+(?P<window>\d+)\s*" + _UNIT + r"$")
+REPEATED_COUNT = re.compile(r"^(?P<subject>.+?)\s+(?:(?P<op>>=|>|=)\s*)?(?P<count>\d+)\s+times$")
+SUSTAINED = re.compile(r"^(?P<subject>.+?)\s*" + _OP + r"\s*(?P<value>\S+(?:\s+(?:seconds?|secs?|minutes?|mins?|hours?|hrs?))?)\s+for\s+(?:>\s*)?(?P<duration>\d+)\s*" + _UNIT + r"$")
+CONTAINS = re.compile(r"^(?P<subject>.+?)\s+(?:contains|has)\s+['\"](?P<value>.+)['\"]$")
+COMPARISON = re.compile(r"^(?P<subject>.+?)\s*" + _OP + r"\s*(?P<value>.+?)(?:\s+occurs)?$")
+
+UNIT_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+DEFAULT_REPEAT_WINDOW = 24 * 3600  # "fails > 3 times" with no window counts over a day
+FILLER_WORDS = {"detected", "logged", "occurs", "occurred", "unexpectedly", "event", "count", "is", "a", "an", "the"}
+
+# Subjects that map onto a parsed JSON field, per data source: (dotted path, scale into the condition's units)
+SUBJECT_FIELDS = {
+    "windows": {"event id": [("EventID", 1)]},
+    "databricks": {
+        "status": [("status", 1)],
+        "query status": [("status", 1)],
+        "cluster status": [("status", 1)],
+    },
+    "snowflake": {
+        "query status": [("QUERY_HISTORY.EXECUTION_STATUS", 1)],
+        "query duration": [("QUERY_HISTORY.TOTAL_ELAPSED_TIME", 0.001)],
+        "warehouse status": [("WAREHOUSE_LOAD_HISTORY.STATE", 1)],
+    },
+}
+
+# Numeric metrics sampled from events for sustained rules, per data source: JSON fields as (dotted path, scale
+# into the condition's units) and elapsed-time spans as (start path, end path, scale). Subjects without an
+# entry are sampled from "<subject>: N" in the message text.
+METRIC_FIELDS = {
+    "eks": {
+        # Container Insights performance events
+        "cpu usage": {"paths": [("pod_cpu_utilization", 1), ("node_cpu_utilization", 1)]},
+        "memory usage": {"paths": [("pod_memory_utilization", 1), ("node_memory_utilization", 1)]},
+    },
+    "databricks": {
+        "spark job latency": {"spans": [("start_time_ms", "end_time_ms", 0.001)]},
+        "query duration": {"spans": [("start_time_ms", "end_time_ms", 0.001)]},
+        "query latency": {"spans": [("start_time_ms", "end_time_ms", 0.001)]},
+    },
+    "snowflake": {
+        "query duration": {"paths": [("QUERY_HISTORY.TOTAL_ELAPSED_TIME", 0.001)]},
+    },
+}
+
+# Fields naming the entity a metric sample belongs to, so each pod, node, host or user is its own series
+METRIC_ENTITY_FIELDS = {
+    "eks": ("PodName", "NodeName"),
+    "windows": ("ComputerName",),
+    "linux": ("hostname", "host"),
+    "databricks": ("user_name",),
+    "snowflake": ("QUERY_HISTORY.WAREHOUSE_NAME", "QUERY_HISTORY.USER_NAME"),
+}
+
+# Canonical spellings of values that appear verbatim in raw events, restored from the lower-cased condition.
+# Matching is case-insensitive, but CloudWatch filter patterns are not, so push-down needs the real spelling.
+CANONICAL_VALUES = {
+    "eks": {
+        value.lower(): value
+        for value in ("ImagePullBackOff", "ErrImagePull", "CrashLoopBackOff", "OOMKilled", "NotReady", "Evicted", "CreateContainerConfigError")
+    },
+}
+
+# Event phrases with a known meaning per data source, checked before the generic word match. This is the only
+# phrase table: filter_patterns pushes down the literals of the predicates built here.
+EVENT_PHRASES = {
+    "windows": [
+        (r"event\s*id\s*=?\s*(\d+)", lambda m: FieldCompare([("EventID", 1)], "=", [m.group(1)])),
+        (r"service stops", lambda m: FieldCompare([("EventID", 1)], "=", ["7031", "7034"])),
+        (r"bsod|blue screen", lambda m: FieldCompare([("EventID", 1)], "=", ["41", "1001"])),
+        (r"windows update fails", lambda m: FieldCompare([("EventID", 1)], "=", ["20"])),
+    ],
+    "snowflake": [
+        (r"query fails", lambda m: FieldCompare([("QUERY_HISTORY.EXECUTION_STATUS", 1)], "=", ["FAIL", "INCIDENT"])),
+        (r"login fail|failed login", lambda m: FieldCompare([("LOGIN_HISTORY.IS_SUCCESS", 1)], "=", ["NO"])),
+        (r"connection timeout", lambda m: Contains(["timeout", "timed out"])),
+        (r"warehouse suspended", lambda m: Contains(["suspended"])),
+    ],
+    "eks": [
+        (r"oom|out of memory", lambda m: Contains(["OOMKilled"])),
+        (r"crash", lambda m: Contains(["CrashLoopBackOff"])),
+        (r"restart", lambda m: Contains(["Back-off restarting", "CrashLoopBackOff"])),
+    ],
+    "databricks": [
+        (r"fail", lambda m: FieldCompare([("status", 1)], "=", ["FAILED"])),
+    ],
+}
+
+
+def parse_duration(amount, unit):
+    """Convert an amount and a unit word into seconds."""
+    return int(amount) * UNIT_SECONDS[unit[0].lower()]
+
+
+def parse_value(text):
+    """Parse a condition value into a number (percentages and durations normalised) or a list of alternatives."""
+    text = text.strip().strip("'\"")
+    duration = re.match(r"^(\d+(?:\.\d+)?)\s*" + _UNIT + r"$", text, re.IGNORECASE)
+    if duration:
+        return float(duration.group(1)) * UNIT_SECONDS[duration.group("unit")[0].lower()]
+    number = re.match(r"^(\d+(?:\.\d+)?)\s*%?", text)
+    if number:
+        return float(number.group(1))
+    return [alternative.strip() for alternative in text.split("/") if alternative.strip()]
+
+
+def _to_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class FieldCompare:
+    """Predicate comparing a JSON field of the event against a number or a set of alternatives."""
+    __slots__ = ("paths", "op", "values", "number", "spellings", "literals", "literal_mode")
+
+    def __init__(self, paths, op, values):
+        self.paths = paths
+        self.op = op
+        self.number = values if isinstance(values, float) else None
+        self.values = None if self.number is not None else {str(value).lower() for value in values}
+        self.spellings = [] if self.number is not None else [str(value) for value in values]  # As written, for push-down
+        # For equality every match must contain one of the values verbatim, which lets callers prefilter
+        if op == "=" and self.values:
+            self.literals = sorted(self.values)
+        elif op == "=" and self.number is not None and self.number.is_integer() and all(scale == 1 for _, scale in paths):
+            self.literals = [str(int(self.number))]
+        else:
+            self.literals = []
+        self.literal_mode = "prefilter"  # A literal hit is necessary but the field still has to be compared
+
+    def __call__(self, message, lowered, event):
+        for path, scale in self.paths:
+            field = event.field(path)
+            if field is None:
+                continue
+            if self.number is not None:
+                number = _to_number(field)
+                if number is not None and _compare(number * scale, self.op, self.number):
+                    return True
+            else:
+                matched = str(field).lower() in self.values
+                if matched == (self.op != "!="):
+                    return True
+        return False
+
+
+class Contains:
+    """Predicate matching when any of the given lower-case substrings appears in the message."""
+    __slots__ = ("substrings", "spellings", "literals", "literal_mode")
+
+    def __init__(self, substrings):
+        self.spellings = list(substrings)
+        self.substrings = [substring.lower() for substring in substrings]
+        self.literals = list(self.substrings)
+        self.literal_mode = "any"
+
+    def __call__(self, message, lowered, event):
+        return any(substring in lowered for substring in self.substrings)
+
+
+class AllWords:
+    """Predicate matching when every word of a phrase appears in the message."""
+    __slots__ = ("words", "spellings", "literals", "literal_mode")
+
+    def __init__(self, words):
+        self.spellings = list(words)
+        self.words = [word.lower() for word in words]
+        self.literals = list(self.words)
+        self.literal_mode = "all"
+
+    def __call__(self, message, lowered, event):
+        return all(word in lowered for word in self.words)
+
+
+def _compare(left, op, right):
+    if op == ">":
+        return left > right
+    if op == ">=":
+        return left >= right
+    if op == "<":
+        return left < right
+    if op == "<=":
+        return left <= right
+    if op == "!=":
+        return left != right
+    return left == right
+
+
+class CountThreshold:
+    """Aggregation firing when matching events within a sliding window exceed a count."""
+    __slots__ = ("op", "count", "window_seconds")
+
+    def __init__(self, op, count, window_seconds):
+        self.op = op or ">="
+        self.count = count
+        self.window_seconds = window_seconds
+
+    def tripped(self, observed):
+        return _compare(observed, self.op, self.count)
+
+
+class MetricSampler:
+    """Extracts a numeric sample of one metric, and the entity it describes, from a raw event."""
+    __slots__ = ("words", "paths", "spans", "entity_paths", "pattern")
+
+    def __init__(self, subject, paths=(), spans=(), entity_paths=()):
+        self.words = subject.split()
+        self.paths = list(paths)
+        self.spans = list(spans)
+        self.entity_paths = list(entity_paths)
+        # "load average: 5.1", "cpu_usage=93%" and "\"cpuUsage\": 93" all match the subject words
+        words = r"[\s_\-]*".join(re.escape(word) for word in subject.split())
+        self.pattern = re.compile(words + r"[\"'\s]*[:=]?[\"'\s]*(-?\d+(?:\.\d+)?)", re.IGNORECASE)
+
+    def sample(self, message, event):
+        """Return the metric's value in the event (a LazyEvent of the message), or None if it carries none."""
+        for path, scale in self.paths:
+            number = _to_number(event.field(path))
+            if number is not None:
+                return number * scale
+        for start_path, end_path, scale in self.spans:
+            start = _to_number(event.field(start_path))
+            end = _to_number(event.field(end_path))
+            if start is not None and end is not None:
+                return (end - start) * scale
+        match = self.pattern.search(message)
+        return float(match.group(1)) if match else None
+
+    def entity(self, event):
+        """Return the pod, node, host or user the sample describes, or None."""
+        for path in self.entity_paths:
+            value = event.field(path)
+            if value:
+                return str(value)
+        return None
+
+
+def metric_sampler(data_source, subject):
+    """Build the MetricSampler for a metric subject of a data source."""
+    fields = METRIC_FIELDS.get(data_source, {}).get(subject, {})
+    return MetricSampler(subject, fields.get("paths", ()), fields.get("spans", ()), METRIC_ENTITY_FIELDS.get(data_source, ()))
+
+
+class SustainedThreshold:
+    """Aggregation firing when a numeric metric stays past a threshold for a duration."""
+    __slots__ = ("metric", "op", "value", "duration_seconds", "sampler")
+
+    def __init__(self, metric, op, value, duration_seconds, sampler=None):
+        self.metric = metric
+        self.op = op
+        self.value = value
+        self.duration_seconds = duration_seconds
+        self.sampler = sampler  # Set for numeric metrics; state rules such as "status = NotReady for 2 minutes" have none
+
+    def breached(self, value):
+        return _compare(value, self.op, self.value)
+
+
+class CompiledRule:
+    """Executable form of one rule: a per-event predicate plus an optional aggregation."""
+    __slots__ = ("rule_id", "name", "data_source", "condition", "action", "priority", "real_time", "predicate", "aggregation")
+
+    def __init__(self, rule, predicate, aggregation=None):
+        self.rule_id = str(rule.get("_id", rule.get("id", "")))
+        self.name = rule.get("name", "")
+        self.data_source = rule.get("data_source", "")
+        self.condition = rule.get("condition", "")
+        self.action = rule.get("action")
+        self.priority = rule.get("priority")
+        self.real_time = rule.get("real_time", True)
+        self.predicate = predicate
+        self.aggregation = aggregation
+
+    @property
+    def kind(self):
+        if isinstance(self.aggregation, CountThreshold):
+            return "count"
+        if isinstance(self.aggregation, SustainedThreshold):
+            return "sustained"
+        return "match"
+
+
+def _normalise_subject(subject):
+    return re.sub(r"\s+", " ", subject.strip().lower())
+
+
+def _event_predicate(data_source, phrase):
+    for regex, build in EVENT_PHRASES.get(data_source, []):
+        match = re.search(regex, phrase)
+        if match:
+            return build(match)
+    words = [word for word in re.findall(r"[a-z0-9_.\-]+", phrase) if word not in FILLER_WORDS]
+    return AllWords(words) if words else None
+
+
+def _comparison_predicate(data_source, subject, op, value):
+    fields = SUBJECT_FIELDS.get(data_source, {}).get(subject)
+    if fields is None:
+        # Single-word subjects like "status" still resolve when the source exposes them as a field
+        fields = SUBJECT_FIELDS.get(data_source, {}).get(subject.split(" ")[-1])
+    if fields is not None:
+        return FieldCompare(fields, op, value)
+    if op == "=" and isinstance(value, list):
+        # Unmapped "<thing> status = Value" matches the value appearing in the raw event, e.g. a pod reason
+        canonical = CANONICAL_VALUES.get(data_source, {})
+        return Contains([canonical.get(alternative, alternative) for alternative in value])
+    return None
+
+
+def compile_condition(data_source, condition):
+    """Compile a condition into (predicate, aggregation); predicate is None when no event can match it."""
+    text = condition.strip()
+    lowered = text.lower()
+    match = WINDOWED_COUNT.match(lowered)
+    if match:
+        subject = re.sub(r"\s+count$", "", _normalise_subject(match.group("subject")))
+        aggregation = CountThreshold(match.group("op"), int(match.group("count")), parse_duration(match.group("window"), match.group("unit")))
+        return _event_predicate(data_source, subject), aggregation
+    match = REPEATED_COUNT.match(lowered)
+    if match:
+        subject = _normalise_subject(match.group("subject"))
+        return _event_predicate(data_source, subject), CountThreshold(match.group("op"), int(match.group("count")), DEFAULT_REPEAT_WINDOW)
+    match = SUSTAINED.match(lowered)
+    if match:
+        subject = _normalise_subject(match.group("subject"))
+        value = parse_value(match.group("value"))
+        duration = parse_duration(match.group("duration"), match.group("unit"))
+        if isinstance(value, float):
+            return None, SustainedThreshold(subject, match.group("op"), value, duration, metric_sampler(data_source, subject))
+        # A state held for a duration, e.g. "Node status = NotReady for > 2 minutes"
+        return _comparison_predicate(data_source, subject, match.group("op"), value), SustainedThreshold(subject, "=", 1.0, duration)
+    match = CONTAINS.match(text)
+    if match:
+        return Contains([match.group("value")]), None
+    match = COMPARISON.match(lowered)
+    if match:
+        subject = _normalise_subject(match.group("subject"))
+        value = parse_value(re.sub(r"\s+of\s+.*$", "", match.group("value")))
+        predicate = _comparison_predicate(data_source, subject, match.group("op"), value)
+        if predicate is None and isinstance(value, float):
+            return None, SustainedThreshold(subject, match.group("op"), value, 0, metric_sampler(data_source, subject))
+        return predicate or _event_predicate(data_source, lowered), None
+    return _event_predicate(data_source, lowered), None
+
+
+class RuleSet:
+    """Compiled active rules for one data source, evaluated once per event."""
+    def __init__(self, rules):
+        self.rules = [rule for rule in rules if rule.predicate is not None]
+        self.matcher = MultiPatternMatcher(
+            literal for rule in self.rules for literal in rule.predicate.literals
+        )
+
+    def match(self, message, event=None):
+        """Return the compiled rules matching the raw event message, scanning it once for every rule literal.
+
+        Field predicates read the message through event, the LazyEvent the caller shares with its other detectors.
+        """
+        if not self.rules:
+            return []
+        lowered = message.lower()
+        found = self.matcher.find(lowered)
+        if event is None:
+            event = LazyEvent(message)
+        matched = []
+        for rule in self.rules:
+            predicate = rule.predicate
+            if predicate.literal_mode == "any":
+                if not found.isdisjoint(predicate.literals):
+                    matched.append(rule)
+                continue
+            if predicate.literal_mode == "all":
+                if all(literal in found for literal in predicate.literals):
+                    matched.append(rule)
+                continue
+            if predicate.literals and found.isdisjoint(predicate.literals):
+                continue
+            if predicate(message, lowered, event):
+                matched.append(rule)
+        return matched
+
+
+class RuleCompiler:
+    """Compiles active rules into per-source RuleSets, caching compiled conditions across reloads."""
+    def __init__(self, logger=None):
+        self.logger = logger or logging.getLogger("MONITOR")
+        self.lock = threading.Lock()
+        self.cache = {}  # (data_source, condition) -> (predicate, aggregation)
+        self.rules_key = None
+        self.rule_sets = {}
+        self.compiled = {}
+
+    def compile_rule(self, rule):
+        """Compile a single rule document, reusing a cached compilation of the same condition."""
+        key = (rule.get("data_source", ""), rule.get("condition", ""))
+        if key not in self.cache:
+            try:
+                self.cache[key] = compile_condition(*key)
+            except Exception as e:
+                self.logger.error(f"Failed to compile rule condition '{key[1]}': {e}")
+                self.cache[key] = (None, None)
+            if self.cache[key] == (None, None):
+                self.logger.warning(f"Rule condition '{key[1]}' for {key[0]} has no event predicate")
+        predicate, aggregation = self.cache[key]
+        return CompiledRule(rule, predicate, aggregation)
+
+    def update(self, rules):
+        """Recompile when the active rules changed; returns True when the rule sets were rebuilt."""
+        # Keyed on every field of the rules, so edits to name, action or priority reach the compiled rules too
+        rules_key = tuple(sorted(json.dumps(rule, sort_keys=True, default=str) for rule in rules))
+        with self.lock:
+            if rules_key == self.rules_key:
+                return False
+            compiled = {}
+            for rule in rules:
+                compiled.setdefault(rule.get("data_source", ""), []).append(self.compile_rule(rule))
+            self.compiled = compiled
+            self.rule_sets = {source: RuleSet(source_rules) for source, source_rules in compiled.items()}
+            self.rules_key = rules_key
+        return True
+
+    def rule_set(self, data_source):
+        """Return the RuleSet for a data source (empty if it has no active rules)."""
+        with self.lock:
+            return self.rule_sets.get(data_source) or RuleSet([])
+
+    def rules_for(self, data_source):
+        """Return every compiled rule for a data source, including aggregation-only ones."""
+        with self.lock:
+            return list(self.compiled.get(data_source, []))
+
+    def metric_rules(self, data_source):
+        """Return the sustained rules of a data source that are evaluated on numeric samples."""
+        with self.lock:
+            return [
+                rule for rule in self.compiled.get(data_source, [])
+                if rule.kind == "sustained" and rule.aggregation.sampler is not None
+            ]
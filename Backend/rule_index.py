@@ -0,0 +1,144 @@
+import logging
+import threading
+from pymongo.errors import OperationFailure, PyMongoError
+
+RULE_FIELDS = {"name": 1, "data_source": 1, "condition": 1, "action": 1, "priority": 1, "real_time": 1, "status": 1, "type": 1}
+# Updates touching only these fields do not change what the monitors evaluate
+BOOKKEEPING_FIELDS = {"last_triggered", "updated_at"}
+
+
+class ActiveRuleIndex:
+    """In-memory index of active rules, loaded once and kept current by a change stream or a version poll."""
+    def __init__(self, collection, logger=None, poll_interval=1.0):
+        self.collection = collection
+        self.logger = logger or logging.getLogger("MONITOR")
+        self.poll_interval = poll_interval
+        self.rules = {}  # str(_id) -> rule document
+        self.version = 0
+        self.mode = None  # 'change_stream' or 'poll' once started
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.resume_token = None
+        self.stamp = None
+
+    def add_listener(self, callback):
+        """Register a callable run (on the watcher thread) whenever the active rules change."""
+        self.listeners.append(callback)
+
+    def _notify(self):
+        for callback in list(self.listeners):
+            try:
+                callback()
+            except Exception as e:
+                self.logger.error(f"Rule index listener failed: {e}")
+
+    def load(self):
+        """Replace the index with a fresh read of the active rules."""
+        rules = {str(rule["_id"]): rule for rule in self.collection.find({"status": "Active"}, RULE_FIELDS)}
+        with self.lock:
+            changed = rules != self.rules
+            self.rules = rules
+            if changed:
+                self.version += 1
+        if changed:
+            self.logger.info(f"Loaded {len(rules)} active rules (version {self.version})")
+            self._notify()
+        return changed
+
+    def _apply(self, change):
+        operation = change.get("operationType")
+        rule_id = str(change.get("documentKey", {}).get("_id"))
+        if operation == "update":
+            updated = set(change.get("updateDescription", {}).get("updatedFields", {}))
+            removed = set(change.get("updateDescription", {}).get("removedFields", []))
+            if (updated | removed) <= BOOKKEEPING_FIELDS:
+                return
+        if operation in ("insert", "update", "replace"):
+            document = change.get("fullDocument")
+            with self.lock:
+                if document is not None and document.get("status") == "Active":
+                    self.rules[rule_id] = {key: document[key] for key in ("_id", *RULE_FIELDS) if key in document}
+                elif self.rules.pop(rule_id, None) is None:
+                    return
+                self.version += 1
+        elif operation == "delete":
+            with self.lock:
+                if self.rules.pop(rule_id, None) is None:
+                    return
+                self.version += 1
+        elif operation in ("drop", "rename", "invalidate"):
+            self.resume_token = None
+            self.load()
+            return
+        else:
+            return
+        self.logger.info(f"Rule {rule_id} changed ({operation}), active rule index now at version {self.version}")
+        self._notify()
+
+    def _watch(self):
+        """Follow the change stream until stopped; returns False if change streams are unavailable."""
+        try:
+            with self.collection.watch(full_document="updateLookup", resume_after=self.resume_token, max_await_time_ms=1000) as stream:
+                self.mode = "change_stream"
+                self.load()  # Catch changes made between the initial load and opening the stream
+                while not self.stopped.is_set():
+                    change = stream.try_next()
+                    if stream.resume_token is not None:
+                        self.resume_token = stream.resume_token
+                    if change is not None:
+                        self._apply(change)
+            return True
+        except OperationFailure as e:
+            # Standalone servers (code 40573) and restricted users cannot open change streams
+            self.logger.warning(f"Rule change stream unavailable ({e}), falling back to polling every {self.poll_interval}s")
+            return False
+
+    def _version_stamp(self):
+        latest = self.collection.find_one({}, {"updated_at": 1}, sort=[("updated_at", -1)])
+        return (self.collection.count_documents({}), latest.get("updated_at") if latest else None)
+
+    def _poll(self):
+        self.mode = "poll"
+        while not self.stopped.wait(self.poll_interval):
+            stamp = self._version_stamp()
+            if stamp != self.stamp:
+                self.stamp = stamp
+                self.load()
+
+    def _run(self):
+        backoff = 1
+        while not self.stopped.is_set():
+            try:
+                if self._watch():
+                    return
+                self.stamp = self._version_stamp()
+                self._poll()
+                return
+            except PyMongoError as e:
+                self.logger.error(f"Rule index watcher error: {e}, retrying in {backoff}s")
+                self.stopped.wait(backoff)
+                backoff = min(backoff * 2, 30)
+
+    def start(self):
+        """Load the active rules and start following changes in the background."""
+        self.load()
+        if self.thread is None:
+            self.stopped.clear()
+            self.thread = threading.Thread(target=self._run, name="rule-index", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+            self.thread = None
+
+    def active_rules(self):
+        with self.lock:
+            return list(self.rules.values())
+
+    def get_stats(self):
+        with self.lock:
+            return {"mode": self.mode, "version": self.version, "active_rules": len(self.rules)}
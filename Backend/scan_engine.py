@@ -0,0 +1,86 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ScanEngine:
+    """Fans log-group scans out across sources with bounded concurrency and reports per-pass timing."""
+    def __init__(self, logger, max_concurrency=16, strategy_selector=None):
+        self.logger = logger
+        self.strategy_selector = strategy_selector  # Picks per-group reads or batched Insights queries per source
+        self.max_concurrency = max_concurrency
+        # boto3 clients are blocking, so every CloudWatch call runs on this pool instead of the event loop
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="cloudwatch-scan")
+        self.last_pass = {}
+        self.partition = None  # Optional callable(source, groups) returning the groups this process scans
+
+    async def list_log_groups(self, source, monitor, partitioned=True):
+        """List a monitor's log groups on the scan pool, keeping only this process's share when partitioned."""
+        loop = asyncio.get_running_loop()
+        try:
+            groups = await loop.run_in_executor(self.executor, monitor.get_recent_log_groups, monitor.config.get("log_group_prefix"))
+        except Exception as e:
+            self.logger.error(f"Error listing log groups for {source}: {e}")
+            return []
+        if partitioned and self.partition is not None:
+            return self.partition(source, groups)
+        return groups
+
+    async def run_pass(self, monitors, interval=None):
+        """Scan every log group of the given {source: monitor} mapping once, returning pass statistics.
+
+        interval is the shortest current polling interval of the sources; a pass slower than it is logged.
+        """
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        group_durations = {}
+        source_events = {source: 0 for source in monitors}
+
+        async def scan(source, monitor, group):
+            async with semaphore:
+                group_started = time.perf_counter()
+                found = await monitor.search_errors(group) or 0  # Awaited first: += would read the count before the await
+                source_events[source] += found
+                group_durations[f"{source}:{group}"] = time.perf_counter() - group_started
+
+        async def scan_batch(source, monitor, groups):
+            async with semaphore:
+                batch_started = time.perf_counter()
+                found = await monitor.search_errors_batch(groups) or 0
+                source_events[source] += found
+                group_durations[f"{source}:insights({len(groups)} groups)"] = time.perf_counter() - batch_started
+
+        async def scan_source(source, monitor):
+            groups = await self.list_log_groups(source, monitor)
+            strategy = "filter"
+            if self.strategy_selector is not None and getattr(monitor, "insights", None) is not None:
+                strategy = self.strategy_selector.choose(source, len(groups))
+            source_started = time.perf_counter()
+            if strategy == "insights" and groups:
+                await scan_batch(source, monitor, groups)
+            else:
+                await asyncio.gather(*(scan(source, monitor, group) for group in groups))
+            if self.strategy_selector is not None:
+                self.strategy_selector.record(source, strategy, time.perf_counter() - source_started, len(groups))
+            return len(groups)
+
+        counts = await asyncio.gather(*(scan_source(source, monitor) for source, monitor in monitors.items()))
+        duration = time.perf_counter() - started
+        slowest = max(group_durations.items(), key=lambda item: item[1], default=(None, 0.0))
+        self.last_pass = {
+            "sources": len(monitors),
+            "log_groups": sum(counts),
+            "events": source_events,
+            "duration_seconds": round(duration, 3),
+            "slowest_group": slowest[0],
+            "slowest_group_seconds": round(slowest[1], 3),
+            "finished_at": time.time()
+        }
+        self.logger.info(f"Scan pass complete: {self.last_pass['log_groups']} log groups across {len(monitors)} sources in {duration:.2f}s")
+        if interval is not None and duration > interval:
+            self.logger.warning(f"Scan pass took {duration:.2f}s, longer than the {interval:.1f}s polling interval (slowest: {slowest[0]} at {slowest[1]:.2f}s)")
+        return self.last_pass
+
+    def shutdown(self):
+        """Release the scan thread pool."""
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,275 @@
+import asyncio
+import hashlib
+import logging
+import math
+import multiprocessing
+import queue
+import threading
+import time
+from bisect import bisect_right
+from incident import Incident
+from rate_governor import governor
+
+
+def _hash(key):
+    return int(hashlib.md5(key.encode("utf-8")).hexdigest()[:16], 16)
+
+
+class HashRing:
+    """Consistent hash ring over member names, with virtual nodes so keys spread evenly."""
+    def __init__(self, members, replicas=64):
+        self.members = sorted(set(members))
+        points = sorted((_hash(f"{member}#{replica}"), member) for member in self.members for replica in range(replicas))
+        self.points = [point for point, _ in points]
+        self.owners_at = [member for _, member in points]
+
+    def preference(self, key):
+        """Yield the members in ring order starting from the key's position, each once."""
+        if not self.points:
+            return
+        start = bisect_right(self.points, _hash(key))
+        seen = set()
+        for offset in range(len(self.points)):
+            member = self.owners_at[(start + offset) % len(self.points)]
+            if member not in seen:
+                seen.add(member)
+                yield member
+                if len(seen) == len(self.members):
+                    return
+
+    def owner(self, key):
+        return next(self.preference(key), None)
+
+    def assign(self, keys, load_factor=1.25):
+        """Map keys to members by consistent hashing with bounded loads.
+
+        No member takes more than load_factor times the average, so a few hot prefixes cannot pile onto one
+        member, while adding or removing a key still moves only a handful of others.
+        """
+        keys = sorted(set(keys))
+        if not self.members:
+            return {}
+        capacity = max(1, math.ceil(len(keys) / len(self.members) * load_factor))
+        load = {member: 0 for member in self.members}
+        assignment = {}
+        for key in keys:
+            for member in self.preference(key):
+                if load[member] < capacity:
+                    assignment[key] = member
+                    load[member] += 1
+                    break
+        return assignment
+
+
+class ShardLink:
+    """Worker-side end of the IPC queue, standing in for the parent's WebSocket manager, email agent and incident queue.
+
+    Incidents, approval requests and broadcasts are sent to the parent, which correlates and analyses them.
+    snowflake_enabled mirrors whether the parent's analyzer has a Snowflake connection; the worker's
+    SnowflakeMonitor takes it from here, since semi-autonomous workers have no analyzer.
+    """
+    def __init__(self, events, shard, snowflake_enabled=False):
+        self.events = events
+        self.shard = shard
+        self.snowflake_enabled = snowflake_enabled
+        self.logger = logging.getLogger("MONITOR")
+        self.stats = {"incidents": 0, "approvals": 0, "broadcasts": 0}
+
+    async def broadcast(self, message):
+        self.stats["broadcasts"] += 1
+        self.events.put(("broadcast", self.shard, message))
+
+    async def handle_error(self, error_message, source, reference, incident=None):
+        self.stats["approvals"] += 1
+        self.events.put(("approval", self.shard, {
+            "error_message": error_message, "source": source, "reference": reference,
+            "incident": incident.to_dict() if incident is not None else None
+        }))
+
+    def start(self):
+        pass
+
+    async def put(self, job):
+        self.stats["incidents"] += 1
+        self.events.put(("incident", self.shard, {"source": job.monitor.source, "incident": job.incident.to_dict(), "key": job.key}))
+
+    async def stop(self, drain_timeout=0):
+        pass  # Incidents were sent to the parent as they were put
+
+    def get_stats(self):
+        return dict(self.stats, shard=self.shard)
+
+
+class ShardAssignment:
+    """The log groups the parent assigned to this worker, updated from its control queue.
+
+    The parent also sends the worker's share of the API quotas as a float whenever the number of replicas changes.
+    """
+    def __init__(self, control, on_change=None):
+        self.control = control
+        self.on_change = on_change
+        self.groups = None  # source -> set of log groups, None until the first assignment arrives
+        self.ready = threading.Event()
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name="shard-control", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            message = self.control.get()
+            if message is None:
+                self.stopped.set()
+                self.ready.set()
+                if self.on_change:
+                    self.on_change()
+                return
+            if isinstance(message, float):
+                governor.set_share(message)
+                continue
+            with self.lock:
+                self.groups = {source: set(groups) for source, groups in message.items()}
+            self.ready.set()
+            if self.on_change:
+                self.on_change()
+
+    def filter(self, source, groups):
+        """ScanEngine partition: keep the listed groups assigned to this worker."""
+        with self.lock:
+            assigned = (self.groups or {}).get(source, set())
+        return [group for group in groups if group in assigned]
+
+    def snapshot(self):
+        with self.lock:
+            return {source: set(groups) for source, groups in (self.groups or {}).items()}
+
+
+def run_shard(shard, shards, mode, snowflake_enabled, events, control):
+    """Worker process entry point: scan the log groups assigned over control, reporting back over events."""
+    from monitor import MonitorAgent  # Imported here so the parent can start workers before loading the monitors
+    link = ShardLink(events, shard, snowflake_enabled)
+    agent = MonitorAgent(
+        name=f"MonitorShard{shard}", llm_config=False, analyzer_agent=link if mode == "autonomous" else None,
+        email_agent=link, ws_manager=link, mode=mode
+    )
+    agent.join_shard(link, ShardAssignment(control), rate_share=1 / shards)
+    agent.run()
+
+
+class ShardSupervisor:
+    """Runs monitor worker processes, assigns them log groups by consistent hashing and relays what they report.
+
+    handler(kind, payload) is awaited on the parent's event loop for every incident, approval request and
+    broadcast a worker sends. Workers that exit are restarted with their current assignment.
+    """
+    def __init__(self, shards, mode, handler, loop, snowflake_enabled=False, load_factor=1.25, logger=None):
+        self.shards = shards
+        self.mode = mode
+        self.handler = handler
+        self.loop = loop
+        self.snowflake_enabled = snowflake_enabled
+        self.load_factor = load_factor
+        self.logger = logger or logging.getLogger("MONITOR")
+        self.context = multiprocessing.get_context("spawn")
+        self.events = self.context.Queue()
+        self.workers = {}  # shard -> (process, control queue)
+        self.ring = HashRing([str(shard) for shard in range(shards)])
+        self.assignment = {}  # shard -> {source: [log groups]}
+        self.rate_share = 1.0  # Share of the API quotas for all the workers together
+        self.stopped = threading.Event()
+        self.reader = threading.Thread(target=self._relay, name="shard-relay", daemon=True)
+        self.stats = {"incidents": 0, "approvals": 0, "broadcasts": 0, "restarts": 0, "moved_groups": 0}
+
+    def _start_worker(self, shard):
+        control = self.context.Queue()
+        process = self.context.Process(
+            target=run_shard, args=(shard, self.shards, self.mode, self.snowflake_enabled, self.events, control),
+            name=f"monitor-shard-{shard}", daemon=True
+        )
+        process.start()
+        self.workers[shard] = (process, control)
+        if self.rate_share != 1.0:
+            control.put(self.rate_share / self.shards)
+        if shard in self.assignment:
+            control.put(self.assignment[shard])
+
+    def set_rate_share(self, share):
+        """Split share of the API quotas evenly between the workers."""
+        if share == self.rate_share:
+            return
+        self.rate_share = share
+        for _, control in self.workers.values():
+            control.put(share / self.shards)
+
+    def start(self):
+        for shard in range(self.shards):
+            self._start_worker(shard)
+        self.reader.start()
+        self.logger.info(f"Started {self.shards} monitor shard processes")
+
+    def _relay(self):
+        while not self.stopped.is_set():
+            try:
+                kind, shard, payload = self.events.get(timeout=1)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            self.stats[kind + "s"] += 1
+            future = asyncio.run_coroutine_threadsafe(self.handler(kind, payload), self.loop)
+            try:
+                future.result()
+            except Exception as e:
+                self.logger.error(f"Failed to handle {kind} from monitor shard {shard}: {e}")
+
+    def rebalance(self, groups_by_source):
+        """Assign every listed log group to a shard, sending each worker its new share when it changed."""
+        keys = [f"{source}\t{group}" for source, groups in groups_by_source.items() for group in groups]
+        owners = self.ring.assign(keys, self.load_factor)
+        assignment = {shard: {} for shard in range(self.shards)}
+        for key, member in owners.items():
+            source, group = key.split("\t", 1)
+            assignment[int(member)].setdefault(source, []).append(group)
+        previous = {(shard, source, group) for shard, sources in self.assignment.items() for source, groups in sources.items() for group in groups}
+        current = {(shard, source, group) for shard, sources in assignment.items() for source, groups in sources.items() for group in groups}
+        if previous and current != previous:
+            moved = len({(source, group) for _, source, group in current - previous})
+            self.stats["moved_groups"] += moved
+            self.logger.info(f"Rebalanced monitor shards: {moved} log groups moved, {len(keys)} assigned")
+        for shard, share in assignment.items():
+            if share != self.assignment.get(shard):
+                self.workers[shard][1].put(share)
+        self.assignment = assignment
+
+    def check_workers(self):
+        """Restart worker processes that exited."""
+        for shard, (process, control) in list(self.workers.items()):
+            if not process.is_alive() and not self.stopped.is_set():
+                self.logger.warning(f"Monitor shard {shard} exited with code {process.exitcode}, restarting")
+                self.stats["restarts"] += 1
+                self._start_worker(shard)
+
+    def stop(self, timeout=10):
+        self.stopped.set()
+        for process, control in self.workers.values():
+            control.put(None)
+        deadline = time.monotonic() + timeout
+        for process, _ in self.workers.values():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+
+    def get_stats(self):
+        return dict(
+            self.stats,
+            shards=self.shards,
+            alive=sum(1 for process, _ in self.workers.values() if process.is_alive()),
+            log_groups={shard: sum(len(groups) for groups in share.values()) for shard, share in self.assignment.items()}
+        )
+
+
+def incident_from_payload(payload):
+    """Rebuild the Incident a worker sent."""
+    return Incident.from_dict(payload["incident"]) if payload.get("incident") else None
@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class BucketedCounter:
+    """Fixed-size ring of time buckets approximating an event count over a sliding window."""
+    __slots__ = ("bucket_width", "counts", "head", "total", "last_seen")
+
+    def __init__(self, window_seconds, buckets):
+        self.bucket_width = window_seconds / buckets
+        self.counts = [0] * buckets
+        self.head = None  # Absolute index of the newest bucket
+        self.total = 0
+        self.last_seen = 0.0
+
+    def _advance(self, slot):
+        if self.head is None:
+            self.head = slot
+            return
+        if slot <= self.head:
+            return
+        size = len(self.counts)
+        # Each expired bucket is cleared once, so the cost is amortised O(1) per update
+        for step in range(1, min(slot - self.head, size) + 1):
+            index = (self.head + step) % size
+            self.total -= self.counts[index]
+            self.counts[index] = 0
+        self.head = slot
+
+    def add(self, timestamp, amount=1):
+        """Count an event at timestamp (seconds) and return the windowed total."""
+        slot = int(timestamp // self.bucket_width)
+        self._advance(slot)
+        self.last_seen = max(self.last_seen, timestamp)
+        if slot <= self.head - len(self.counts):
+            return self.total  # Older than the window
+        self.counts[slot % len(self.counts)] += amount
+        self.total += amount
+        return self.total
+
+    def count(self, timestamp):
+        """Return the windowed total as of timestamp."""
+        self._advance(int(timestamp // self.bucket_width))
+        return self.total
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.total = 0
+
+
+class SlidingWindowEngine:
+    """Keyed sliding-window counters for windowed rules, with bounded memory and idle-key eviction."""
+    def __init__(self, buckets_per_window=60, max_keys=50000, sweep_every=1000):
+        self.buckets_per_window = buckets_per_window
+        self.max_keys = max_keys
+        self.sweep_every = sweep_every
+        self.counters = OrderedDict()  # (rule_id, key) -> (BucketedCounter, window_seconds)
+        self.lock = threading.Lock()
+        self.updates = 0
+        self.evicted = 0
+
+    def record(self, rule_id, key, window_seconds, timestamp=None):
+        """Count one matching event for (rule, key) and return the count within the rule's window."""
+        timestamp = timestamp if timestamp is not None else time.time()
+        counter_key = (rule_id, key)
+        with self.lock:
+            entry = self.counters.get(counter_key)
+            if entry is None or entry[1] != window_seconds:
+                buckets = max(1, min(self.buckets_per_window, int(window_seconds)))
+                entry = (BucketedCounter(window_seconds, buckets), window_seconds)
+                self.counters[counter_key] = entry
+                if len(self.counters) > self.max_keys:
+                    self.counters.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self.counters.move_to_end(counter_key)
+            total = entry[0].add(timestamp)
+            self.updates += 1
+            if self.updates % self.sweep_every == 0:
+                self._sweep(timestamp)
+            return total
+
+    def reset(self, rule_id, key):
+        """Clear a key's window after its threshold tripped so one burst fires once."""
+        with self.lock:
+            entry = self.counters.get((rule_id, key))
+            if entry is not None:
+                entry[0].reset()
+
+    def _sweep(self, now):
+        idle = [
+            counter_key for counter_key, (counter, window_seconds) in self.counters.items()
+            if now - counter.last_seen > window_seconds
+        ]
+        for counter_key in idle:
+            del self.counters[counter_key]
+        self.evicted += len(idle)
+
+    def get_stats(self):
+        with self.lock:
+            return {"keys": len(self.counters), "updates": self.updates, "evicted": self.evicted}
+
+
+class WindowedRuleEvaluator:
+    """Feeds count-threshold rule matches into a SlidingWindowEngine and reports which ones trip."""
+    def __init__(self, engine=None):
+        self.engine = engine or SlidingWindowEngine()
+
+    def observe(self, rule, key, timestamp):
+        """Record a match of a count rule; returns the windowed count if the threshold tripped, else None."""
+        aggregation = rule.aggregation
+        observed = self.engine.record(rule.rule_id, key, aggregation.window_seconds, timestamp)
+        if aggregation.tripped(observed):
+            self.engine.reset(rule.rule_id, key)
+            return observed
+        return None
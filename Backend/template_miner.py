@@ -0,0 +1,154 @@
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+WILDCARD = "<*>"
+
+# Variable fragments replaced before tokenizing so they never split otherwise identical messages
+MASKS = [
+    re.compile(r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}"),
+    re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?"),
+    re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b"),
+    re.compile(r"\b0x[0-9a-fA-F]+\b"),
+    re.compile(r"\b[0-9a-fA-F]{16,}\b"),
+]
+# Whitespace and JSON punctuation, so compact audit-log JSON still yields one token per key and value
+TOKEN_SPLIT = re.compile(r'[\s,:{}\[\]"=]+')
+
+
+class LogCluster:
+    """A mined log template and the number of messages assigned to it."""
+    __slots__ = ("cluster_id", "template", "size")
+
+    def __init__(self, cluster_id, tokens):
+        self.cluster_id = cluster_id
+        self.template = list(tokens)
+        self.size = 1
+
+    @property
+    def template_text(self):
+        return " ".join(self.template)
+
+
+class TemplateMiner:
+    """Streaming Drain-style template miner: a fixed-depth parse tree keyed by token count and leading tokens."""
+    def __init__(self, depth=4, similarity_threshold=0.5, max_children=100, max_tokens=128, max_clusters=5000):
+        self.depth = max(3, depth)
+        self.similarity_threshold = similarity_threshold
+        self.max_children = max_children
+        self.max_tokens = max_tokens
+        self.max_clusters = max_clusters
+        self.root = {}
+        self.clusters = OrderedDict()  # cluster_id -> (LogCluster, leaf list), least recently used first
+        self.next_id = 1
+        self.lock = threading.Lock()
+
+    def tokenize(self, message):
+        for mask in MASKS:
+            message = mask.sub(WILDCARD, message)
+        tokens = [token for token in TOKEN_SPLIT.split(message) if token]
+        return [WILDCARD if any(char.isdigit() for char in token) else token for token in tokens[:self.max_tokens]]
+
+    def _leaf(self, tokens):
+        node = self.root.setdefault(len(tokens), {})
+        for token in tokens[:self.depth - 2]:
+            if token in node:
+                node = node[token]
+            elif len(node) < self.max_children:
+                node = node.setdefault(token, {})
+            else:
+                node = node.setdefault(WILDCARD, {})
+        return node.setdefault(None, [])
+
+    @staticmethod
+    def _similarity(template, tokens):
+        same = sum(1 for a, b in zip(template, tokens) if a == b and a != WILDCARD)
+        return same / len(tokens) if tokens else 1.0
+
+    def add(self, message):
+        """Assign a message to its template, creating or generalising one; returns the LogCluster."""
+        tokens = self.tokenize(message)
+        with self.lock:
+            leaf = self._leaf(tokens)
+            best, best_score = None, -1.0
+            for cluster in leaf:
+                score = self._similarity(cluster.template, tokens)
+                if score > best_score:
+                    best, best_score = cluster, score
+            if best is not None and best_score >= self.similarity_threshold:
+                best.template = [a if a == b else WILDCARD for a, b in zip(best.template, tokens)]
+                best.size += 1
+                self.clusters.move_to_end(best.cluster_id)
+                return best
+            cluster = LogCluster(self.next_id, tokens)
+            self.next_id += 1
+            leaf.append(cluster)
+            self.clusters[cluster.cluster_id] = (cluster, leaf)
+            if len(self.clusters) > self.max_clusters:
+                _, (evicted, evicted_leaf) = self.clusters.popitem(last=False)
+                evicted_leaf.remove(evicted)
+            return cluster
+
+
+class IncidentWindow:
+    """Errors sharing a template and entity within the fold window, reported as one incident."""
+    __slots__ = ("reference", "fingerprint", "template", "first_seen", "last_seen", "occurrences")
+
+    def __init__(self, fingerprint, template, timestamp):
+        self.reference = str(uuid.uuid4())
+        self.fingerprint = fingerprint
+        self.template = template
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.occurrences = 1
+
+
+class IncidentFolder:
+    """Folds repeated errors into open incidents keyed by (source, template fingerprint, entity)."""
+    def __init__(self, window_seconds=600, miner=None, max_open=10000):
+        self.window_seconds = window_seconds
+        self.miner = miner or TemplateMiner()
+        self.max_open = max_open
+        self.open = OrderedDict()
+        self.by_reference = {}  # reference -> IncidentWindow of the open incidents
+        self.lock = threading.Lock()
+        self.stats = {"incidents": 0, "folded": 0}
+
+    def fold(self, source, message, timestamp=None, entity=None):
+        """Return (incident, is_new) for an error; is_new is False when it joined an incident still in its window."""
+        timestamp = timestamp if timestamp is not None else time.time()
+        cluster = self.miner.add(message)
+        fingerprint = f"{source}:{cluster.cluster_id}"
+        key = (fingerprint, entity)
+        with self.lock:
+            incident = self.open.get(key)
+            if incident is not None and timestamp - incident.last_seen <= self.window_seconds:
+                incident.occurrences += 1
+                incident.last_seen = max(incident.last_seen, timestamp)
+                incident.template = cluster.template_text
+                self.open.move_to_end(key)
+                self.stats["folded"] += 1
+                return incident, False
+            if incident is not None:
+                del self.by_reference[incident.reference]
+            incident = IncidentWindow(fingerprint, cluster.template_text, timestamp)
+            self.open[key] = incident
+            self.open.move_to_end(key)
+            self.by_reference[incident.reference] = incident
+            if len(self.open) > self.max_open:
+                _, evicted = self.open.popitem(last=False)
+                del self.by_reference[evicted.reference]
+            self.stats["incidents"] += 1
+            return incident, True
+
+    def occurrences(self, reference):
+        """Return how many errors the incident with this reference has folded, or None once it is no longer open."""
+        with self.lock:
+            incident = self.by_reference.get(reference)
+            return incident.occurrences if incident is not None else None
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, open=len(self.open), templates=len(self.miner.clusters))
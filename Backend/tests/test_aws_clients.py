@@ -0,0 +1,18 @@
+from aws_clients import clear_clients, get_client
+
+
+def test_governed_clients_leave_throttle_retries_to_the_governor():
+    clear_clients()
+    governed = get_client("logs", region_name="us-east-1", aws_access_key_id="AKIA", aws_secret_access_key="secret", governed=True)
+    plain = get_client("logs", region_name="us-east-1", aws_access_key_id="AKIA", aws_secret_access_key="secret")
+    assert governed is not plain
+    assert governed.meta.config.retries["total_max_attempts"] == 1
+    assert plain.meta.config.retries["total_max_attempts"] == 4
+
+
+def test_new_session_token_gets_a_new_client():
+    clear_clients()
+    first = get_client("logs", region_name="us-east-1", aws_access_key_id="ASIA", aws_secret_access_key="secret", aws_session_token="one")
+    second = get_client("logs", region_name="us-east-1", aws_access_key_id="ASIA", aws_secret_access_key="secret", aws_session_token="two")
+    assert first is not second
+    assert get_client("logs", region_name="us-east-1", aws_access_key_id="ASIA", aws_secret_access_key="secret", aws_session_token="two") is second
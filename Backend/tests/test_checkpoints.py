@@ -0,0 +1,35 @@
+from checkpoints import CheckpointStore
+from cloudwatch_reader import LogGroupCursor
+
+
+def consumed_cursor(timestamp, message, stream="host-1"):
+    cursor = LogGroupCursor(0)
+    cursor.advance({"timestamp": timestamp, "logStreamName": stream, "message": message})
+    return cursor
+
+
+def test_cursors_survive_a_restart(tmp_path):
+    path = str(tmp_path / "checkpoints.json")
+    store = CheckpointStore(path)
+    store.update("windows", {"/windows/system": consumed_cursor(1500, "EventID: 7003")})
+    store.save()
+    restored = CheckpointStore(path).cursors("windows")["/windows/system"]
+    assert restored.timestamp == 1500
+    assert restored.streams == {"host-1": 1500}
+    assert not restored.is_new({"timestamp": 1500, "logStreamName": "host-1", "message": "EventID: 7003"})
+
+
+def test_save_keeps_log_groups_written_by_another_process(tmp_path):
+    path = str(tmp_path / "checkpoints.json")
+    first, second = CheckpointStore(path), CheckpointStore(path)
+    first.update("eks", {"/aws/eks/a": consumed_cursor(1000, "OOMKilled")})
+    first.save()
+    second.update("eks", {"/aws/eks/b": consumed_cursor(2000, "OOMKilled")})
+    second.save()
+    assert set(CheckpointStore(path).cursors("eks")) == {"/aws/eks/a", "/aws/eks/b"}
+
+
+def test_corrupt_file_starts_without_checkpoints(tmp_path):
+    path = tmp_path / "checkpoints.json"
+    path.write_text("{not json", encoding="utf-8")
+    assert CheckpointStore(str(path)).cursors("windows") == {}
@@ -0,0 +1,100 @@
+from types import SimpleNamespace
+from cloudwatch_reader import IncrementalLogReader, LogGroupCursor
+from insights_scanner import InsightsBatchScanner
+
+
+class PagedClient:
+    """Serves filter_log_events from fixed pages, recording the arguments of each call."""
+    meta = SimpleNamespace(method_to_api_mapping={"filter_log_events": "FilterLogEvents"}, region_name="us-east-1")
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.calls = []
+
+    def filter_log_events(self, **kwargs):
+        self.calls.append(kwargs)
+        index = int(kwargs.get("nextToken", 0))
+        page = {"events": self.pages[index]}
+        if index + 1 < len(self.pages):
+            page["nextToken"] = str(index + 1)
+        return page
+
+
+def event(timestamp, message, stream="host-1"):
+    return {"timestamp": timestamp, "logStreamName": stream, "message": message, "eventId": f"{timestamp}-{message}"}
+
+
+def test_read_follows_every_page_and_returns_events_in_order():
+    client = PagedClient([[event(1200, "b"), event(1100, "a")], [], [event(1300, "c")]])
+    reader = IncrementalLogReader(client, start_time=1000)
+    events = reader.read("/windows/system", filter_pattern="7003", end_time=2000)
+    assert [e["message"] for e in events] == ["a", "b", "c"]
+    assert len(client.calls) == 3
+    assert client.calls[0] == {"logGroupName": "/windows/system", "startTime": 1000, "endTime": 2000, "filterPattern": "7003"}
+
+
+def test_read_starts_at_the_cursor_and_skips_consumed_events():
+    client = PagedClient([[event(1100, "a"), event(1200, "b")]])
+    reader = IncrementalLogReader(client, start_time=1000)
+    for consumed in reader.read("/windows/system", end_time=2000)[:1]:
+        reader.advance("/windows/system", consumed)
+    assert [e["message"] for e in reader.read("/windows/system", end_time=2000)] == ["b"]
+    assert client.calls[-1]["startTime"] == 1100
+
+
+def test_streamed_event_is_not_consumed_again_when_polled():
+    cursor = LogGroupCursor(1000)
+    streamed = {"timestamp": 1500, "logStreamName": "pod-a", "message": "OOMKilled", "eventId": None}
+    polled = {"timestamp": 1500, "logStreamName": "pod-a", "message": "OOMKilled", "eventId": "37589265012345678901234567"}
+    cursor.advance(streamed)
+    assert not cursor.is_new(polled)
+    assert cursor.is_new(dict(polled, message="CrashLoopBackOff"))
+
+
+def test_insights_result_is_not_consumed_again_when_polled():
+    cursor = LogGroupCursor(0)
+    log_group, event = InsightsBatchScanner._to_event([
+        {"field": "@timestamp", "value": "2024-01-01 00:00:00.250"},
+        {"field": "@message", "value": "Service Spooler stopped"},
+        {"field": "@log", "value": "123456789012:/windows/system"},
+        {"field": "@logStream", "value": "host-1"},
+    ])
+    cursor.advance(event)
+    polled = {"timestamp": 1704067200250, "logStreamName": "host-1", "message": "Service Spooler stopped", "eventId": "3758926501"}
+    assert log_group == "/windows/system"
+    assert not cursor.is_new(polled)
+
+
+def test_lagging_stream_holds_back_the_read_start_until_idle():
+    cursor = LogGroupCursor(0, allowed_lateness=100, stream_idle=1000)
+    cursor.advance(event(500, "a", stream="host-1"))
+    cursor.advance(event(900, "b", stream="host-2"))
+    assert cursor.start == 400
+    assert cursor.is_new(event(450, "late", stream="host-1"))
+    cursor.advance(event(2000, "c", stream="host-2"))
+    assert cursor.start == 1900
+    assert "host-1" not in cursor.streams
+
+
+def test_late_events_are_read_once_and_counted():
+    client = PagedClient([[event(1500, "on time")]])
+    reader = IncrementalLogReader(client, start_time=1000, allowed_lateness_ms=500)
+    for consumed in reader.read("/windows/system", end_time=2000):
+        reader.advance("/windows/system", consumed)
+    client.pages = [[event(1500, "on time"), event(1200, "late")]]  # Ingested after the first read
+    late = reader.read("/windows/system", end_time=2000)
+    assert [e["message"] for e in late] == ["late"]
+    reader.advance("/windows/system", late[0])
+    assert reader.read("/windows/system", end_time=2000) == []
+    stats = reader.get_stats()
+    assert stats["late_events"] == 1 and stats["max_lateness_ms"] == 300
+
+
+def test_recent_events_are_held_back_for_reordering():
+    client = PagedClient([[event(1000, "a"), event(1900, "b"), event(1950, "c")]])
+    reader = IncrementalLogReader(client, start_time=0, reorder_delay_ms=200)
+    assert [e["message"] for e in reader.read("/windows/system", end_time=2000)] == ["a"]
+    assert reader.get_stats()["held_events"] == 2
+    reader.configure(reorder_max_events=1)
+    assert [e["message"] for e in reader.read("/windows/system", end_time=2000)] == ["a", "b"]
+    assert reader.get_stats()["forced_releases"] == 1
@@ -0,0 +1,55 @@
+import asyncio
+from correlation import IncidentCorrelator
+from incident import Incident
+
+
+def pod_incident(reference, pod, detected_at):
+    return Incident(reference, "kubernetes", "OOMKilled", fields={"namespace": "demo-app", "pod": pod, "container": "app"}, detected_at=detected_at)
+
+
+def test_pods_sharing_a_namespace_are_analysed_separately():
+    correlator = IncidentCorrelator(window_seconds=60, hold_seconds=5)
+    _, first = correlator.correlate(pod_incident("A", "api-1", 100.0))
+    _, second = correlator.correlate(pod_incident("B", "worker-1", 101.0))
+    assert first and second
+
+
+def test_cross_source_incident_joins_a_held_group():
+    correlator = IncidentCorrelator(window_seconds=60, hold_seconds=5)
+    group, _ = correlator.correlate(Incident("A", "snowflake", "query failed", fields={"user_name": "alice"}, detected_at=100.0))
+    joined, is_primary = correlator.correlate(Incident("B", "databricks", "query failed", fields={"user_name": "alice"}, detected_at=101.0))
+    assert not is_primary and joined is group
+
+
+def test_incident_after_release_starts_its_own_group():
+    correlator = IncidentCorrelator(window_seconds=60, hold_seconds=5)
+    group, _ = correlator.correlate(pod_incident("A", "api-1", 100.0))
+    group.released = True
+    later, is_primary = correlator.correlate(pod_incident("B", "api-1", 102.0))
+    assert is_primary and later is not group
+
+
+def test_each_joined_source_is_analysed_with_the_group_as_context():
+    correlator = IncidentCorrelator(window_seconds=60, hold_seconds=5)
+    released = []
+
+    async def release(incident):
+        released.append(incident)
+
+    async def scenario():
+        snowflake = Incident("A", "snowflake", "login failed", fields={"user_name": "alice"}, detected_at=100.0)
+        databricks = Incident("B", "databricks", "job failed", fields={"user_name": "alice"}, detected_at=101.0)
+        repeat = Incident("C", "databricks", "job failed again", fields={"user_name": "alice"}, detected_at=102.0)
+        group, _ = correlator.correlate(snowflake)
+        correlator.hold(group, release)
+        for incident in (databricks, repeat):
+            joined, is_primary = correlator.correlate(incident)
+            assert not is_primary and joined is group
+        assert correlator.attach(group, databricks, release)
+        assert not correlator.attach(group, repeat, release)  # The databricks analysis covers its repeat
+        await correlator.flush()
+
+    asyncio.run(scenario())
+    assert [(incident.reference, incident.source) for incident in released] == [("A", "snowflake"), ("B", "databricks")]
+    assert released[1].get("correlated_references") == ["A", "C"]
+    assert "(Ref: A)" in released[1].summary and "(Ref: B)" in released[0].summary
@@ -0,0 +1,28 @@
+import json
+import logging
+from types import SimpleNamespace
+from agent import DatabricksErrorAnalyzer
+from incident import Incident
+
+EVENT = {"table_name": "main.default.protected_table", "user_name": "analyst@example.com",
+         "error_message": "Permission denied", "query_text": "INSERT INTO main.default.protected_table VALUES (1)"}
+
+
+def _analyzer():
+    return DatabricksErrorAnalyzer(SimpleNamespace(logger=logging.getLogger("test")))
+
+
+def test_incident_fields_are_used_when_complete():
+    incident = Incident("REF-1", "databricks", "Databricks query failed", fields=EVENT)
+    info = _analyzer()._extract_databricks_info("no json here", incident)
+    assert info["table_name"] == "main.default.protected_table"
+    assert info["user_name"] == "analyst@example.com"
+    assert info["required_permission"] == "MODIFY"
+
+
+def test_message_is_parsed_when_incident_lacks_table_and_user():
+    incident = Incident("REF-2", "databricks", "Databricks query failed", fields={"status": "FAILED"})
+    info = _analyzer()._extract_databricks_info(f"Databricks error: {json.dumps(EVENT)}", incident)
+    assert info["table_name"] == "main.default.protected_table"
+    assert info["user_name"] == "analyst@example.com"
+    assert info["query_text"].startswith("INSERT INTO")
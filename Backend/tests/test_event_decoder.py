@@ -0,0 +1,147 @@
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from types import SimpleNamespace
+import pytest
+import event_decoder
+from event_decoder import LazyEvent
+from monitor import KubernetesMonitor
+from rule_compiler import RuleCompiler
+
+AUDIT = json.dumps({
+    "kind": "Event",
+    "annotations": {"note": 'quoted "objectRef": {"name": "decoy"}'},
+    "objectRef": {"namespace": "demo-app", "name": "api-1", "resource": "pods"},
+    "requestObject": {"status": {"containerStatuses": [
+        {"name": "app", "lastState": {"terminated": {"reason": "OOMKilled"}}, "restartCount": 3}
+    ]}},
+    "user": {"username": "system:node:ip-10-0-0-1"},
+    "stage": "ResponseComplete",
+})
+
+
+class CountingDecoder:
+    def __init__(self):
+        self.decoded = []
+
+    def raw_decode(self, raw, offset):
+        value, end = json.JSONDecoder().raw_decode(raw, offset)
+        self.decoded.append(value)
+        return value, end
+
+
+def test_fields_are_decoded_on_demand_and_only_once(monkeypatch):
+    decoder = CountingDecoder()
+    monkeypatch.setattr(event_decoder, "_DECODER", decoder)
+    monkeypatch.setattr(event_decoder.json, "loads", lambda raw: pytest.fail("whole message decoded"))
+    event = LazyEvent(AUDIT)
+    assert decoder.decoded == []
+    assert event.path("objectRef.name") == "api-1"
+    assert event.path("objectRef.name") == "api-1"
+    assert event.path("objectRef.namespace") == "demo-app"
+    assert event.get("objectRef")["resource"] == "pods"
+    assert event.path("requestObject.status.containerStatuses")[0]["restartCount"] == 3
+    # Only each requested leaf was decoded, once, and the quoted decoy in a string value was skipped
+    assert decoder.decoded == [
+        "api-1", "demo-app", {"namespace": "demo-app", "name": "api-1", "resource": "pods"},
+        [{"name": "app", "lastState": {"terminated": {"reason": "OOMKilled"}}, "restartCount": 3}],
+    ]
+
+
+def test_nested_keys_are_not_found_in_later_sibling_objects():
+    event = LazyEvent(json.dumps({"a": {"x": 1}, "b": {"key": 2}}))
+    assert event.path("a.key", "default") == "default"
+    assert event.path("b.key") == 2
+
+
+def test_malformed_json_raises_and_keeps_the_raw_message():
+    event = LazyEvent("Container app in pod demo-app/api-1 killed due to OutOfMemory")
+    assert event.contains("OutOfMemory")
+    with pytest.raises(json.JSONDecodeError):
+        event.get("objectRef")
+    truncated = LazyEvent('{"objectRef": {"namespace": "demo-app", "name": "api-1"}, "requestObject": {"status": {"contai')
+    assert truncated.path("objectRef.name") == "api-1"
+    with pytest.raises(json.JSONDecodeError):
+        truncated.path("requestObject.status.containerStatuses")
+
+
+@pytest.mark.parametrize("key", ["kind", "objectRef", "requestObject", "user", "stage", "missing", "name"])
+def test_get_matches_the_decoded_dict(key):
+    assert LazyEvent(AUDIT).get(key, "default") == json.loads(AUDIT).get(key, "default")
+
+
+def lookup(data, path):
+    for part in path.split("."):
+        if not isinstance(data, dict) or part not in data:
+            return None
+        data = data[part]
+    return data
+
+
+@pytest.mark.parametrize("path", [
+    "objectRef.namespace", "objectRef.name", "user.username", "requestObject.status.containerStatuses",
+    "objectRef.missing", "stage.length", "annotations.note",
+])
+def test_path_matches_walking_the_decoded_dict(path):
+    assert LazyEvent(AUDIT).path(path) == lookup(json.loads(AUDIT), path)
+
+
+def test_field_reads_plain_text_and_malformed_messages_as_missing(monkeypatch):
+    monkeypatch.setattr(event_decoder.json, "loads", lambda raw: pytest.fail("plain text decoded"))
+    assert LazyEvent("kernel: Out of memory: Killed process 1234").field("objectRef.name") is None
+    monkeypatch.undo()
+    assert LazyEvent('{"objectRef": {"name": "api-1"}, "stage": ').field("stage") is None
+    assert LazyEvent(AUDIT).field("objectRef.name") == "api-1"
+
+
+def kubernetes_monitor(tmp_path):
+    monitor = KubernetesMonitor.__new__(KubernetesMonitor)
+    monitor.logger = logging.getLogger("test")
+    monitor.cooldown_tracker = {}
+    monitor.cooldown_period = 60
+    monitor.reported_states = OrderedDict()
+    monitor.max_reported_states = 100
+    monitor.incident_folder = None
+    monitor.analysis_source = "kubernetes"
+    monitor.ws_manager = None
+    monitor.mode = "semi-autonomous"
+    monitor.email_agent = None
+    monitor.window_evaluator = None
+    monitor.config = {"error_log_file": str(tmp_path / "kubernetes_errors.log")}
+    return monitor
+
+
+def test_malformed_audit_event_falls_back_to_the_raw_message(tmp_path):
+    monitor = kubernetes_monitor(tmp_path)
+    message = '{"objectRef": {"name": "api-1"}, "requestObject": {"status": "OOMKilled: Container app in pod demo-app/api-1 killed due to OutOfMemory'
+    asyncio.run(monitor.process_event("/aws/eks/audit", {"timestamp": 1000, "message": message}))
+    assert list(monitor.cooldown_tracker) == ["demo-app/api-1"]
+    assert "Container app in pod demo-app/api-1" in (tmp_path / "kubernetes_errors.log").read_text(encoding="utf-8")
+
+
+def test_rule_metric_and_built_in_detection_share_one_decode(tmp_path, monkeypatch):
+    decoder = CountingDecoder()
+    monkeypatch.setattr(event_decoder, "_DECODER", decoder)
+    monkeypatch.setattr(event_decoder.json, "loads", lambda raw: pytest.fail("whole message decoded"))
+    monitor = kubernetes_monitor(tmp_path)
+    monitor.source = "eks"
+    monitor.rule_compiler = RuleCompiler()
+    monitor.rule_compiler.update([
+        {"_id": "r1", "data_source": "eks", "condition": "Pod status = OOMKilled"},
+        {"_id": "r2", "data_source": "eks", "condition": "Memory usage > 90% for 5 minutes"},
+    ])
+    monitor.metric_evaluator = SimpleNamespace(observe=lambda rule, key, value, timestamp: None)
+    fired = []
+
+    async def handler(rule, log_group, event, occurrences, breach=None):
+        fired.append(rule.rule_id)
+
+    monitor.rule_trigger_handler = handler
+    asyncio.run(monitor.process_new_events("/aws/eks/audit", [{"timestamp": 1000, "message": AUDIT}], advance=False))
+    assert fired == ["r1"]
+    assert list(monitor.cooldown_tracker) == ["demo-app/api-1"]
+    # The rule dedupe and the OOMKilled detector read the same container statuses, decoded once between them
+    statuses = [value for value in decoder.decoded if isinstance(value, list)]
+    assert len(statuses) == 1
+    assert decoder.decoded.count({"namespace": "demo-app", "name": "api-1", "resource": "pods"}) == 1
@@ -0,0 +1,104 @@
+from filter_patterns import FilterPatternCompiler, PatternTerm, translate_condition
+from rule_compiler import RuleCompiler
+
+SNOWFLAKE_RULES = [{"data_source": "snowflake", "condition": "Query fails more than 3 times"}]
+
+
+# SnowflakeMonitor.base_filter_term_for("/snowflake/QUERY_HISTORY")
+SNOWFLAKE_BASE = PatternTerm("json", '$.QUERY_HISTORY.ERROR_CODE != "None"', fallback=("ERROR_CODE",))
+
+
+def test_monitor_without_base_term_is_read_unfiltered():
+    # A monitor without a base term inspects every record itself
+    compiler = FilterPatternCompiler()
+    compiler.update(SNOWFLAKE_RULES)
+    assert compiler.pattern_for("snowflake", "/snowflake/QUERY_HISTORY", None) is None
+    assert compiler.insights_filter_for("snowflake", "/snowflake/QUERY_HISTORY", None) is None
+
+
+def test_snowflake_query_history_is_pushed_down_next_to_metric_rules():
+    compiler = FilterPatternCompiler()
+    compiler.update(SNOWFLAKE_RULES + [
+        {"data_source": "snowflake", "name": "Credits", "condition": "Credit usage > 80% of daily limit"},
+        {"data_source": "snowflake", "name": "Slow queries", "condition": "Query duration > 300 seconds for 5 minutes"},
+    ])
+    pattern = compiler.pattern_for("snowflake", "/snowflake/QUERY_HISTORY", SNOWFLAKE_BASE)
+    # Metric rules keep every event carrying their metric, the failing-query rule and the base term their fields
+    assert pattern is not None
+    for term in ("ERROR_CODE", "TOTAL_ELAPSED_TIME", "credit", "Credit", "FAIL", "INCIDENT"):
+        assert term in pattern
+    expression = compiler.insights_filter_for("snowflake", "/snowflake/QUERY_HISTORY", SNOWFLAKE_BASE)
+    assert expression.startswith('(QUERY_HISTORY.ERROR_CODE != "None") or ')
+
+
+def test_metric_rule_terms_select_samples_under_the_threshold():
+    terms = _pushed_terms("eks", "CPU usage > 90% for 5 minutes")
+    assert {"pod_cpu_utilization", "node_cpu_utilization", "usage", "Usage"} <= terms
+    # A rule no event can match needs no events
+    assert translate_condition("eks", "Event detected") == []
+
+
+def test_rule_terms_widen_the_monitor_base_filter():
+    compiler = FilterPatternCompiler()
+    compiler.update([{"data_source": "eks", "condition": "Pod status = CrashLoopBackOff"}])
+    pattern = compiler.pattern_for("eks", "/aws/eks/cluster", PatternTerm("text", "OOMKilled"))
+    assert pattern.startswith("?OOMKilled ?CrashLoopBackOff ")
+
+
+def _pushed_terms(data_source, condition):
+    return {term.expression for term in translate_condition(data_source, condition)}
+
+
+def test_push_down_covers_every_literal_the_rule_matches():
+    restart = _pushed_terms("eks", "Pod restart > 5 in 15 minutes")
+    assert {"Back-off restarting", "CrashLoopBackOff"} <= restart
+    query_fails = _pushed_terms("snowflake", "Query fails")
+    assert {'$.QUERY_HISTORY.EXECUTION_STATUS = "FAIL"', '$.QUERY_HISTORY.EXECUTION_STATUS = "INCIDENT"'} <= query_fails
+    timeout = _pushed_terms("snowflake", "Connection timeout")
+    assert {"timeout", "Timeout", "timed out", "Timed out"} <= timeout
+
+
+def test_pushed_text_terms_select_every_event_the_predicate_matches():
+    rule = {"_id": "r1", "data_source": "eks", "condition": "Pod restart > 5 in 15 minutes"}
+    compiler = RuleCompiler()
+    compiler.update([rule])
+    rule_set = compiler.rule_set("eks")
+    terms = _pushed_terms("eks", rule["condition"])
+    messages = [
+        "Warning BackOff Back-off restarting failed container app in pod web-1",
+        "pod web-2 is in CrashLoopBackOff",
+        "back-off restarting failed container",
+        "pod web-3 started",
+    ]
+    for message in messages:
+        # CloudWatch keeps an event when any ?term occurs in it verbatim
+        if rule_set.match(message):
+            assert any(term in message for term in terms), message
+
+
+def test_json_base_filter_falls_back_to_text_next_to_text_rules():
+    compiler = FilterPatternCompiler()
+    compiler.update([{"data_source": "windows", "condition": "Event log contains 'disk failure'"}])
+    pattern = compiler.pattern_for("windows", "/windows/system", PatternTerm("json", "$.EventID = 7003", fallback=("7003",)))
+    assert pattern.startswith('?7003 ?"disk failure" ')
+
+
+def test_multi_word_and_range_rules_push_down_a_superset():
+    assert "Kernel" in _pushed_terms("macos", "Kernel panic detected")
+    assert _pushed_terms("snowflake", "Query duration > 5 minutes") == {"TOTAL_ELAPSED_TIME"}
+
+
+def test_snowflake_field_terms_only_apply_to_their_view_log_group():
+    compiler = FilterPatternCompiler()
+    compiler.update([
+        {"data_source": "snowflake", "condition": "Query fails"},
+        {"data_source": "snowflake", "condition": "Failed login detected"},
+    ])
+    query_history = compiler.pattern_for("snowflake", "/snowflake/QUERY_HISTORY", SNOWFLAKE_BASE)
+    assert "EXECUTION_STATUS" in query_history and "IS_SUCCESS" not in query_history
+    login_base = PatternTerm("json", '$.LOGIN_HISTORY.ERROR_CODE != "None"', fallback=("ERROR_CODE",))
+    login_history = compiler.pattern_for("snowflake", "/snowflake/LOGIN_HISTORY", login_base)
+    assert login_history.startswith('{ ($.LOGIN_HISTORY.ERROR_CODE != "None") || ($.LOGIN_HISTORY.IS_SUCCESS = "NO") ')
+    assert "EXECUTION_STATUS" not in login_history
+    expression = compiler.insights_filter_for("snowflake", "/snowflake/LOGIN_HISTORY", login_base)
+    assert "EXECUTION_STATUS" not in expression
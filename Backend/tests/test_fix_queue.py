@@ -0,0 +1,47 @@
+import asyncio
+import json
+import logging
+from incident_queue import AnalysisJob
+from monitor import WindowsMonitor
+from template_miner import IncidentFolder
+
+EVENT = {"timestamp": 1000, "message": json.dumps({"EventID": 7003, "ComputerName": "HOST-1"})}
+
+
+class FakeAnalyzer:
+    logger = logging.getLogger("test")
+
+    def __init__(self):
+        self.incidents = []
+
+    async def analyze_error(self, error_message, source=None, incident=None):
+        self.incidents.append(incident)
+        return {"root_cause": "Spooler dependency missing", "remediation_steps": []}
+
+
+def windows_monitor(tmp_path):
+    monitor = WindowsMonitor.__new__(WindowsMonitor)
+    monitor.logger = logging.getLogger("test")
+    monitor.source = "windows"
+    monitor.incident_folder = IncidentFolder()
+    monitor.analyzer_agent = FakeAnalyzer()
+    monitor.ws_manager = None
+    monitor.config = {"fix_queue_file": str(tmp_path / "fix_queue.json")}
+    return monitor
+
+
+def test_folded_occurrences_reach_the_fix_queue_entry(tmp_path):
+    monitor = windows_monitor(tmp_path)
+
+    async def scenario():
+        incident = await monitor.open_incident("/windows/system", EVENT, "Windows Error Detected", entity="HOST-1/Spooler")
+        for _ in range(2):
+            assert await monitor.open_incident("/windows/system", EVENT, "Windows Error Detected", entity="HOST-1/Spooler") is None
+        await monitor.analyze_incident(AnalysisJob(monitor, incident))
+        return incident
+
+    incident = asyncio.run(scenario())
+    entry = json.loads((tmp_path / "fix_queue.json").read_text(encoding="utf-8"))
+    assert entry["reference"] == incident.reference
+    assert entry["incident"]["n"] == 3
+    assert monitor.analyzer_agent.incidents[0].occurrences == 3
@@ -0,0 +1,26 @@
+import dataclasses
+import pytest
+from incident import Incident
+
+
+def test_round_trip_keeps_every_field():
+    incident = Incident("REF-1", "kubernetes", "OOMKilled", log_group="/aws/eks/audit",
+                        fields={"namespace": "demo-app", "pod": "api-1"}, fingerprint="eks:3", occurrences=4, detected_at=100.5)
+    assert Incident.from_dict(incident.to_dict()) == incident
+    assert Incident.from_json(incident.to_json()) == incident
+
+
+def test_defaults_are_left_out_of_the_wire_format():
+    incident = Incident("REF-2", "windows", "EventID 7003", detected_at=1.0)
+    assert incident.to_dict() == {"ref": "REF-2", "src": "windows", "sum": "EventID 7003", "at": 1.0}
+    assert Incident.from_dict(incident.to_dict()) == incident
+
+
+def test_incident_and_its_fields_are_read_only():
+    incident = Incident("REF-3", "databricks", "Permission denied", fields={"table_name": "main.default.t"})
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        incident.summary = "changed"
+    with pytest.raises(TypeError):
+        incident.fields["table_name"] = "other"
+    folded = incident.with_occurrences(3)
+    assert folded.occurrences == 3 and incident.occurrences == 1
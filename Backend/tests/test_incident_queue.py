@@ -0,0 +1,112 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from incident_queue import AnalysisJob, IncidentQueue
+
+
+def test_stop_drains_queued_incidents_within_the_timeout():
+    analysed = []
+
+    async def handler(job):
+        await asyncio.sleep(0.01)
+        analysed.append(job.key)
+
+    async def scenario():
+        queue = IncidentQueue(handler, workers=1)
+        queue.start()
+        for key in ("a", "b", "c"):
+            await queue.put(AnalysisJob(None, None, key))
+        await queue.stop(drain_timeout=5)
+
+    asyncio.run(scenario())
+    assert analysed == ["a", "b", "c"]
+
+
+def test_stop_without_a_drain_discards_queued_incidents():
+    analysed = []
+
+    async def handler(job):
+        await asyncio.sleep(1)
+        analysed.append(job.key)
+
+    async def scenario():
+        queue = IncidentQueue(handler, workers=1)
+        queue.start()
+        for key in ("a", "b"):
+            await queue.put(AnalysisJob(None, None, key))
+        await queue.stop()
+        return queue.get_stats()
+
+    stats = asyncio.run(scenario())
+    assert analysed == [] and stats["depth"] == 0
+
+
+def run_with_busy_worker(policy, keys):
+    """Queue keys behind a first job that holds the only worker, then release it and drain."""
+    analysed = []
+    release = None
+
+    async def handler(job):
+        if job.key == "first":
+            await release.wait()
+        analysed.append(job.key)
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        queue = IncidentQueue(handler, maxsize=1, workers=1, policy=policy)
+        queue.start()
+        await queue.put(AnalysisJob(None, None, "first"))
+        await asyncio.sleep(0)  # Let the worker take the first job
+        for key in keys:
+            await queue.put(AnalysisJob(None, SimpleNamespace(reference=key), key))
+        release.set()
+        await queue.stop(drain_timeout=5)
+        return queue.get_stats()
+
+    return analysed, asyncio.run(scenario())
+
+
+def test_full_queue_drops_the_oldest_incident():
+    analysed, stats = run_with_busy_worker("drop-oldest", ["a", "b"])
+    assert analysed == ["first", "b"]
+    assert stats["dropped"] == 1
+
+
+def test_full_queue_coalesces_incidents_with_the_same_key():
+    analysed, stats = run_with_busy_worker("coalesce", ["pod-1", "pod-1"])
+    assert analysed == ["first", "pod-1"]
+    assert stats["coalesced"] == 1 and stats["dropped"] == 0
+
+
+def test_full_queue_blocks_the_producer_until_a_slot_frees():
+    analysed = []
+    release = None
+
+    async def handler(job):
+        await release.wait()
+        analysed.append(job.key)
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        queue = IncidentQueue(handler, maxsize=1, workers=1, policy="block")
+        queue.start()
+        await queue.put(AnalysisJob(None, None, "a"))
+        await asyncio.sleep(0)
+        await queue.put(AnalysisJob(None, None, "b"))
+        blocked = asyncio.create_task(queue.put(AnalysisJob(None, None, "c")))
+        await asyncio.sleep(0.01)
+        waiting = not blocked.done()
+        release.set()
+        await blocked
+        await queue.stop(drain_timeout=5)
+        return waiting
+
+    assert asyncio.run(scenario())
+    assert analysed == ["a", "b", "c"]
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        IncidentQueue(None, policy="drop-newest")
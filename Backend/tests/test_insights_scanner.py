@@ -0,0 +1,109 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+from cloudwatch_reader import IncrementalLogReader
+from insights_scanner import MAX_GROUPS_PER_QUERY, RESULT_LIMIT, InsightsBatchScanner, ScanStrategySelector
+from monitor import WindowsMonitor
+
+API_NAMES = {"start_query": "StartQuery", "get_query_results": "GetQueryResults", "stop_query": "StopQuery"}
+
+
+class InsightsClient:
+    """Serves Logs Insights queries from canned (status, rows) per query, recording every call."""
+    def __init__(self, outcomes, region):
+        # A region per test gives each test its own governor buckets
+        self.meta = SimpleNamespace(method_to_api_mapping=API_NAMES, region_name=region)
+        self.outcomes = list(outcomes)
+        self.started = []
+        self.stopped = []
+
+    def start_query(self, **kwargs):
+        self.started.append(kwargs)
+        return {"queryId": f"q{len(self.started)}"}
+
+    def get_query_results(self, queryId):
+        status, rows = self.outcomes[int(queryId[1:]) - 1]
+        return {"status": status, "results": rows}
+
+    def stop_query(self, queryId):
+        self.stopped.append(queryId)
+        return {"success": True}
+
+
+def row(group, timestamp, message):
+    return [
+        {"field": "@timestamp", "value": timestamp},
+        {"field": "@message", "value": message},
+        {"field": "@log", "value": f"123456789012:{group}"},
+        {"field": "@logStream", "value": "host-1"},
+    ]
+
+
+def test_each_batch_is_one_query_and_rows_go_to_their_group():
+    client = InsightsClient([("Complete", [
+        row("/windows/b", "2024-01-01 00:00:01.000", "second"),
+        row("/windows/a", "2024-01-01 00:00:00.500", "first"),
+    ])], "insights-batch")
+    reader = IncrementalLogReader(client, start_time=1704067200000)
+    events, scanned_until, fallback = InsightsBatchScanner(client, poll_interval=0).scan(reader, [(["/windows/a", "/windows/b"], "EventID = 7003")])
+    assert len(client.started) == 1
+    assert client.started[0]["logGroupNames"] == ["/windows/a", "/windows/b"]
+    assert "| filter EventID = 7003 |" in client.started[0]["queryString"]
+    assert [e["message"] for e in events["/windows/a"]] == ["first"]
+    assert [e["message"] for e in events["/windows/b"]] == ["second"]
+    assert fallback == [] and scanned_until % 1000 == 999
+
+
+def test_query_hitting_the_result_limit_falls_back_to_per_group_reads():
+    full = [row("/windows/a", "2024-01-01 00:00:00.000", f"event {i}") for i in range(RESULT_LIMIT)]
+    client = InsightsClient([("Complete", full), ("Failed", [])], "insights-limit")
+    reader = IncrementalLogReader(client, start_time=0)
+    events, _, fallback = InsightsBatchScanner(client, poll_interval=0).scan(reader, [(["/windows/a"], None), (["/windows/b"], None)])
+    assert events == {}
+    assert sorted(fallback) == ["/windows/a", "/windows/b"]
+
+
+def test_queries_past_the_timeout_are_stopped():
+    client = InsightsClient([("Running", [])], "insights-timeout")
+    reader = IncrementalLogReader(client, start_time=0)
+    events, _, fallback = InsightsBatchScanner(client, poll_interval=0, timeout=0).scan(reader, [(["/windows/a"], None)])
+    assert client.stopped == ["q1"]
+    assert events == {} and fallback == ["/windows/a"]
+
+
+def test_monitor_batches_log_groups_up_to_the_per_query_limit():
+    monitor = WindowsMonitor.__new__(WindowsMonitor)
+    monitor.logger = logging.getLogger("test")
+    monitor.live_tail = None
+    monitor.pattern_compiler = None
+    monitor.executor = None
+    monitor.reader = IncrementalLogReader(None, start_time=0)
+    calls = []
+
+    def scan(reader, batches):
+        calls.append(batches)
+        return {}, None, []
+
+    monitor.insights = SimpleNamespace(scan=scan)
+    groups = [f"/windows/host-{i}" for i in range(MAX_GROUPS_PER_QUERY * 2 + 20)]
+    assert asyncio.run(monitor.search_errors_batch(groups)) == 0
+    assert [len(batch) for batch, _ in calls[0]] == [MAX_GROUPS_PER_QUERY, MAX_GROUPS_PER_QUERY, 20]
+    assert {expression for _, expression in calls[0]} == {"(EventID = 7003)"}
+
+
+def test_selector_uses_filter_reads_below_the_group_threshold():
+    selector = ScanStrategySelector(min_groups=20)
+    assert selector.choose("windows", 5) == "filter"
+    assert ScanStrategySelector(mode="insights").choose("windows", 5) == "insights"
+
+
+def test_selector_switches_to_the_faster_strategy_and_reprobes_the_other():
+    selector = ScanStrategySelector(min_groups=20, probe_every=3, alpha=1.0)
+    assert selector.choose("windows", 100) == "insights"  # Insights is probed first
+    selector.record("windows", "insights", 10.0, 100)
+    assert selector.choose("windows", 100) == "filter"
+    selector.record("windows", "filter", 2.0, 100)
+    assert [selector.choose("windows", 100) for _ in range(3)] == ["filter", "filter", "insights"]
+    selector.record("windows", "insights", 1.0, 100)
+    assert selector.choose("windows", 100) == "insights"
+    assert selector.get_stats() == {"windows:insights": 0.01, "windows:filter": 0.02}
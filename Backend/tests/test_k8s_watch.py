@@ -0,0 +1,249 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+import pytest
+import benchmark_decoding
+import k8s_watch
+from event_decoder import LazyEvent
+from k8s_watch import KubernetesApiTransport, KubernetesWatchDetector, ResourceWatch, WatchExpired, WatchTransport, pod_detections
+from monitor import KubernetesMonitor
+from rule_compiler import RuleCompiler
+
+
+def test_not_ready_is_reported_again_for_longer_rules():
+    compiler = RuleCompiler()
+    compiler.update([{"_id": "r1", "data_source": "eks", "condition": "Node status = NotReady for > 5 minutes"}])
+    monitor = SimpleNamespace(source="eks", service_name="Kubernetes", rule_compiler=compiler)
+    detector = KubernetesWatchDetector(monitor, transport=None, loop=None, not_ready_seconds=120)
+    assert detector._next_report(-1) == 120
+    assert detector._next_report(121.5) == 300
+    assert detector._next_report(300.2) is None
+
+
+def pod(name, version, restarts=0, reason=None):
+    status = {"name": "app", "restartCount": restarts, "state": {"running": {}}}
+    if reason == "OOMKilled":
+        status["lastState"] = {"terminated": {"reason": "OOMKilled"}}
+    elif reason:
+        status["state"] = {"waiting": {"reason": reason}}
+    return {
+        "metadata": {"name": name, "namespace": "demo-app", "uid": f"uid-{name}", "resourceVersion": version},
+        "spec": {"nodeName": "ip-10-0-0-1"},
+        "status": {"containerStatuses": [status]},
+    }
+
+
+class ScriptedTransport(WatchTransport):
+    """Answers lists and watches from a script; a watch step is a list of events or an exception to raise."""
+    def __init__(self, lists, watches):
+        self.lists = list(lists)
+        self.watches = list(watches)
+        self.listed = 0
+        self.watched_from = []
+
+    def list_objects(self, resource):
+        self.listed += 1
+        return self.lists.pop(0)
+
+    def watch(self, resource, resource_version, stopped):
+        self.watched_from.append(resource_version)
+        if not self.watches:
+            stopped.set()
+            return
+        step = self.watches.pop(0)
+        if isinstance(step, Exception):
+            raise step
+        yield from step
+
+
+class RecordingStop:
+    """Stands in for the watch's stop event, recording reconnect delays instead of sleeping."""
+    def __init__(self):
+        self.event = threading.Event()
+        self.delays = []
+
+    def is_set(self):
+        return self.event.is_set()
+
+    def set(self):
+        self.event.set()
+
+    def wait(self, delay):
+        self.delays.append(delay)
+
+
+def scripted_watch(transport, monkeypatch):
+    monkeypatch.setattr(k8s_watch.random, "uniform", lambda low, high: high)
+    observed = []
+    detector = SimpleNamespace(
+        transport=transport, logger=logging.getLogger("test"), base_backoff=1.0, max_backoff=3.0,
+        stats={"bookmarks": 0, "reconnects": 0, "relists": 0},
+        observe_list=lambda resource, items: observed.append(("LIST", [item["metadata"]["name"] for item in items])),
+        observe=lambda resource, event_type, obj: observed.append((event_type, obj["metadata"]["name"])),
+    )
+    watch = ResourceWatch(detector, "pods")
+    watch.stopped = RecordingStop()
+    return watch, detector, observed
+
+
+def test_watch_lists_first_and_resumes_from_the_last_version(monkeypatch):
+    transport = ScriptedTransport(
+        [([pod("api-1", "10")], "10")],
+        [[{"type": "ADDED", "object": pod("api-2", "11")}, {"type": "BOOKMARK", "object": {"metadata": {"resourceVersion": "15"}}}]],
+    )
+    watch, detector, observed = scripted_watch(transport, monkeypatch)
+    watch._run()
+    assert observed == [("LIST", ["api-1"]), ("ADDED", "api-2")]
+    # The second watch resumes after the bookmark, which is never observed as an object
+    assert transport.watched_from == ["10", "15"]
+    assert transport.listed == 1 and detector.stats["bookmarks"] == 1
+
+
+def test_expired_watch_relists_and_failures_back_off(monkeypatch):
+    transport = ScriptedTransport(
+        [([pod("api-1", "10")], "10"), ([pod("api-1", "30")], "30")],
+        [
+            ConnectionResetError("reset"), ConnectionResetError("reset"), ConnectionResetError("reset"),
+            WatchExpired("too old resource version"),
+            [{"type": "MODIFIED", "object": pod("api-1", "31")}],
+            ConnectionResetError("reset"),
+        ],
+    )
+    watch, detector, observed = scripted_watch(transport, monkeypatch)
+    watch._run()
+    assert transport.watched_from == ["10", "10", "10", "10", "30", "31", "31"]
+    assert observed == [("LIST", ["api-1"]), ("LIST", ["api-1"]), ("MODIFIED", "api-1")]
+    # Doubling from base_backoff up to max_backoff, and back to the base once events flow again
+    assert watch.stopped.delays == [1.0, 2.0, 3.0, 1.0]
+    assert detector.stats["relists"] == 1 and detector.stats["reconnects"] == 4
+
+
+class FakeApiServer(BaseHTTPRequestHandler):
+    """Serves /api/v1/pods as a paged list and a watch stream; resourceVersion 'old' is gone."""
+    def do_GET(self):
+        query = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+        self.server.requests.append(query)
+        if query.get("watch") != "true":
+            page = {"items": [pod("api-1", "5")], "metadata": {"resourceVersion": "7", "continue": "next"}}
+            if query.get("continue") == "next":
+                page = {"items": [pod("api-2", "7")], "metadata": {"resourceVersion": "7"}}
+            self._send(200, json.dumps(page).encode())
+        elif query.get("resourceVersion") == "old":
+            self._send(410, b'{"kind": "Status", "code": 410}')
+        else:
+            events = [{"type": "ADDED", "object": pod("api-3", "8")}, {"type": "ERROR", "object": {"code": 410, "message": "too old"}}]
+            self._send(200, b"".join(json.dumps(event).encode() + b"\n" for event in events))
+
+    def _send(self, code, body):
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def api_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeApiServer)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_api_transport_pages_lists_and_streams_watches(api_server):
+    transport = KubernetesApiTransport(f"http://127.0.0.1:{api_server.server_address[1]}", token="t", timeout_seconds=5)
+    items, version = transport.list_objects("pods")
+    assert [item["metadata"]["name"] for item in items] == ["api-1", "api-2"] and version == "7"
+    events = transport.watch("pods", version, threading.Event())
+    assert next(events)["object"]["metadata"]["name"] == "api-3"
+    with pytest.raises(WatchExpired):
+        next(events)  # A 410 ERROR event in the stream
+    with pytest.raises(WatchExpired):
+        list(transport.watch("pods", "old", threading.Event()))  # A 410 response to the watch request
+    watch_request = api_server.requests[2]
+    assert watch_request["resourceVersion"] == "7" and watch_request["allowWatchBookmarks"] == "true"
+
+
+def kubernetes_monitor(tmp_path):
+    monitor = KubernetesMonitor.__new__(KubernetesMonitor)
+    monitor.logger = logging.getLogger("test")
+    monitor.cooldown_tracker = {}
+    monitor.cooldown_period = 60
+    monitor.reported_states = OrderedDict()
+    monitor.max_reported_states = 100
+    monitor.incident_folder = None
+    monitor.analysis_source = "kubernetes"
+    monitor.ws_manager = None
+    monitor.mode = "semi-autonomous"
+    monitor.email_agent = None
+    monitor.rule_trigger_handler = None
+    monitor.window_evaluator = None
+    monitor.config = {"error_log_file": str(tmp_path / "kubernetes_errors.log")}
+    return monitor
+
+
+def audit_event(status_pod):
+    """The kubelet's status update for a pod, as the EKS audit log records it."""
+    return json.dumps({
+        "kind": "Event", "stage": "ResponseComplete", "verb": "patch",
+        "objectRef": {"resource": "pods", "namespace": "demo-app", "name": status_pod["metadata"]["name"], "subresource": "status"},
+        "requestObject": {"status": status_pod["status"]},
+        "user": {"username": "system:node:ip-10-0-0-1"},
+    })
+
+
+def test_watch_and_audit_log_report_an_oom_kill_once(tmp_path):
+    monitor = kubernetes_monitor(tmp_path)
+    oom = pod("api-1", "12", restarts=2, reason="OOMKilled")
+    [(_, _, watch_message)] = pod_detections(oom)
+
+    async def scenario():
+        await monitor.process_event(k8s_watch.WATCH_LOG_GROUP, {"timestamp": 1000, "message": json.dumps(watch_message)})
+        monitor.cooldown_tracker["demo-app/api-1"]["timestamp"] -= 120  # The cooldown has passed
+        await monitor.process_event("/aws/eks/cluster/audit", {"timestamp": 2000, "message": audit_event(oom)})
+        monitor.cooldown_tracker["demo-app/api-1"]["timestamp"] -= 120
+        await monitor.process_event("/aws/eks/cluster/audit", {"timestamp": 3000, "message": audit_event(pod("api-1", "20", restarts=3, reason="OOMKilled"))})
+
+    asyncio.run(scenario())
+    reports = (tmp_path / "kubernetes_errors.log").read_text(encoding="utf-8").count("killed due to OutOfMemory")
+    assert reports == 2  # Restart 2 once across both paths, then restart 3
+
+
+def test_rules_fire_once_per_container_state_across_paths(tmp_path):
+    monitor = kubernetes_monitor(tmp_path)
+    compiler = RuleCompiler()
+    compiler.update([{"_id": "r1", "data_source": "eks", "condition": "Pod status = CrashLoopBackOff"}])
+    fired = []
+
+    async def handler(rule, log_group, event, occurrences, breach=None):
+        fired.append(log_group)
+
+    monitor.rule_trigger_handler = handler
+    crashing = pod("api-1", "12", restarts=4, reason="CrashLoopBackOff")
+    [(_, _, watch_message)] = pod_detections(crashing)
+
+    async def scenario():
+        rule_set = compiler.rule_set("eks")
+        await monitor.evaluate_rules(rule_set, k8s_watch.WATCH_LOG_GROUP, {"message": json.dumps(watch_message)})
+        await monitor.evaluate_rules(rule_set, "/aws/eks/cluster/audit", {"message": audit_event(crashing)})
+        await monitor.evaluate_rules(rule_set, "/aws/eks/cluster/audit", {"message": audit_event(pod("api-1", "20", restarts=5, reason="CrashLoopBackOff"))})
+
+    asyncio.run(scenario())
+    assert fired == [k8s_watch.WATCH_LOG_GROUP, "/aws/eks/cluster/audit"]
+
+
+def test_decoding_benchmark_drives_a_fully_initialised_monitor():
+    # process_event logs and drops its own errors, so monitor state the harness lacks shows up only as no detections
+    _, detected = asyncio.run(benchmark_decoding._process(benchmark_decoding.synthetic_messages(8), LazyEvent))
+    assert detected == [("demo-app", "stress-demo-0", "stress"), ("demo-app", "stress-demo-4", "stress")]
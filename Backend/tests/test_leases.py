@@ -0,0 +1,58 @@
+import mongomock
+import pytest
+from leases import LeaseManager
+
+KEYS = {f"eks:/aws/eks/cluster-{i}" for i in range(12)}
+
+
+@pytest.fixture
+def database():
+    return mongomock.MongoClient()["lease_test"]
+
+
+def replica(database, name):
+    manager = LeaseManager(database["partition_leases"], database["replicas"], replica_id=name, lease_seconds=30)
+    manager.offer("eks", KEYS)
+    return manager
+
+
+def settle(*managers, rounds=3):
+    for _ in range(rounds):
+        for manager in managers:
+            manager.heartbeat()
+
+
+def test_replicas_split_the_partitions_without_overlap(database):
+    first, second = replica(database, "a"), replica(database, "b")
+    first.heartbeat()
+    assert first.owned() == KEYS
+    settle(second, first)
+    assert first.owned() and second.owned()
+    assert first.owned().isdisjoint(second.owned())
+    assert first.owned() | second.owned() == KEYS
+
+
+def test_state_moves_with_the_lease(database):
+    first = replica(database, "a")
+    first.heartbeat()
+    for key in KEYS:
+        first.set_state(key, {"timestamp": 1000})
+    second = replica(database, "b")
+    settle(second, first)
+    moved = second.owned()
+    assert moved and all(second.state(key) == {"timestamp": 1000} for key in moved)
+
+
+def test_stopped_replica_hands_everything_over(database):
+    first, second = replica(database, "a"), replica(database, "b")
+    settle(first, second)
+    first.stop()
+    second.heartbeat()
+    assert second.owned() == KEYS
+
+
+def test_work_item_claim_is_exclusive_until_it_expires(database):
+    first, second = replica(database, "a"), replica(database, "b")
+    assert first.claim("fix:REF-1", 60)
+    assert not second.claim("fix:REF-1", 60)
+    assert first.claim("fix:REF-1", 60)
@@ -0,0 +1,53 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+from cloudwatch_reader import IncrementalLogReader
+from live_tail import CloudWatchLiveTailTransport, LiveTailIngestor, LocalStreamTransport
+
+
+def test_groups_are_polled_once_after_their_session_restarts():
+    monitor = SimpleNamespace(service_name="Kubernetes", filter_pattern_for=lambda log_group: None)
+    ingestor = LiveTailIngestor(monitor, LocalStreamTransport(), asyncio.new_event_loop())
+    try:
+        assert not ingestor.subscribe("group-a")
+        assert ingestor.subscribe("group-a")
+        # group-b joins group-a's session, which restarts it
+        assert not ingestor.subscribe("group-b")
+        assert not ingestor.subscribe("group-a")
+        assert ingestor.subscribe("group-a")
+        assert ingestor.subscribe("group-b")
+    finally:
+        ingestor.stop()
+
+
+def test_clients_without_start_live_tail_stay_on_polling():
+    monitor = SimpleNamespace(service_name="Kubernetes", filter_pattern_for=lambda log_group: None)
+    ingestor = LiveTailIngestor(monitor, CloudWatchLiveTailTransport(SimpleNamespace()), asyncio.new_event_loop())
+    assert not ingestor.subscribe("group-a")
+    assert not ingestor.subscribe("group-a")
+    assert ingestor.get_stats()["sessions"] == 0
+
+
+def test_streamed_events_advance_the_cursor_on_the_event_loop():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    reader = IncrementalLogReader(None, start_time=0)
+    processed = []
+
+    async def process_new_events(log_group, events, advance=True):
+        assert threading.current_thread() is thread
+        for event in events:
+            reader.advance(log_group, event)
+            processed.append(event["message"])
+
+    monitor = SimpleNamespace(service_name="Kubernetes", reader=reader, process_new_events=process_new_events)
+    ingestor = LiveTailIngestor(monitor, LocalStreamTransport(), loop)
+    event = {"timestamp": 1000, "logStreamName": "pod-a", "message": "OOMKilled", "eventId": None}
+    try:
+        ingestor.deliver("group-a", [event])
+        ingestor.deliver("group-a", [dict(event)])
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+    assert processed == ["OOMKilled"]
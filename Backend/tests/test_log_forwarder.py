@@ -0,0 +1,33 @@
+import logging
+import pytest
+
+pytest.importorskip("win32evtlog", reason="the forwarder reads the Windows event log")
+from log_forwarder import LogForwarderAgent
+
+
+class FakeLeases:
+    def __init__(self, owned):
+        self.owned = set(owned)
+
+    def owns(self, key):
+        return key in self.owned
+
+    def state(self, key):
+        return None
+
+
+def forwarder(owned):
+    agent = LogForwarderAgent.__new__(LogForwarderAgent)
+    agent.logger = logging.getLogger("test")
+    agent.poll_sources = ["windows", "snowflake:QUERY_HISTORY", "databricks"]
+    agent.leases = FakeLeases(owned)
+    agent.leased_sources = set()
+    return agent
+
+
+def test_windows_is_forwarded_by_every_replica_without_a_lease():
+    agent = forwarder(owned=["forwarder:databricks"])
+    assert agent.lease_key("windows") is None
+    assert agent.owned_sources() == ["windows", "databricks"]
+    assert agent.leased_sources == {"databricks"}
+    assert forwarder(owned=[]).owned_sources() == ["windows"]
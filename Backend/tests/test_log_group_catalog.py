@@ -0,0 +1,51 @@
+import threading
+from types import SimpleNamespace
+from log_group_catalog import LogGroupCatalog
+
+
+class CatalogClient:
+    """Lists a fixed set of log groups two per page, counting describe_log_groups calls."""
+    meta = SimpleNamespace(method_to_api_mapping={"describe_log_groups": "DescribeLogGroups"}, region_name="us-east-1")
+
+    def __init__(self, names):
+        self.names = names
+        self.calls = 0
+        self.called = threading.Event()
+
+    def describe_log_groups(self, logGroupNamePrefix, nextToken="0"):
+        self.calls += 1
+        self.called.set()
+        start = int(nextToken)
+        page = {"logGroups": [{"logGroupName": name} for name in self.names[start:start + 2]]}
+        if start + 2 < len(self.names):
+            page["nextToken"] = str(start + 2)
+        return page
+
+
+def test_listing_is_paginated_and_then_served_from_cache():
+    client = CatalogClient(["/aws/eks/a", "/aws/eks/b", "/aws/eks/c"])
+    catalog = LogGroupCatalog(ttl=300)
+    assert catalog.get(client, "us-east-1", "/aws/eks") == ["/aws/eks/a", "/aws/eks/b", "/aws/eks/c"]
+    assert catalog.get(client, "us-east-1", "/aws/eks") == ["/aws/eks/a", "/aws/eks/b", "/aws/eks/c"]
+    assert client.calls == 2
+    assert catalog.get_stats()["hits"] == 1
+
+
+def test_stale_entry_is_returned_while_refreshing_in_the_background():
+    client = CatalogClient(["/aws/eks/a"])
+    catalog = LogGroupCatalog(ttl=0, max_stale=3600)
+    catalog.get(client, "us-east-1", "/aws/eks")
+    client.called.clear()
+    client.names = ["/aws/eks/a", "/aws/eks/b"]
+    assert catalog.get(client, "us-east-1", "/aws/eks") == ["/aws/eks/a"]
+    assert client.called.wait(5)
+    assert catalog.get_stats()["stale_hits"] == 1
+
+
+def test_invalidated_prefix_is_fetched_again():
+    client = CatalogClient(["/windows/system"])
+    catalog = LogGroupCatalog(ttl=300)
+    catalog.get(client, "us-east-1", "/windows")
+    catalog.invalidate(prefix="/windows")
+    catalog.get(client, "us-east-1", "/windows")
+    assert client.calls == 2
@@ -0,0 +1,53 @@
+import random
+from metric_detectors import EWMA, P2Quantile, StreamingDetectorEngine, SustainedTimer
+from rule_compiler import SustainedThreshold
+
+
+def test_ewma_starts_at_the_first_sample_and_smooths_the_rest():
+    ewma = EWMA(alpha=0.5)
+    assert ewma.update(10) == 10
+    assert ewma.update(20) == 15
+    assert ewma.variance == 25
+
+
+def test_p2_estimates_a_high_quantile_in_constant_memory():
+    values = list(range(1, 10001))
+    random.Random(7).shuffle(values)
+    quantile = P2Quantile(0.95)
+    for value in values:
+        quantile.add(value)
+    assert len(quantile.heights) == 5
+    assert abs(quantile.value() - 9500) < 200
+
+
+def test_p2_answers_from_the_samples_before_five_arrive():
+    quantile = P2Quantile(0.5)
+    assert quantile.value() is None
+    for value in (30, 10, 20):
+        quantile.add(value)
+    assert quantile.value() == 20
+
+
+def test_timer_fires_once_per_breach():
+    timer = SustainedTimer()
+    assert [timer.update(True, t, 120) for t in (0, 60, 120, 180)] == [None, None, 120, None]
+    assert timer.update(False, 240, 120) is None
+    assert [timer.update(True, t, 120) for t in (300, 420)] == [None, 120]
+
+
+def cpu_breach(samples, max_gap_seconds=180):
+    engine = StreamingDetectorEngine(max_gap_seconds=max_gap_seconds)
+    threshold = SustainedThreshold("cpu usage", ">", 90, 300)
+    fired = [(t, engine.record("r1", "node-1", value, threshold, t)) for t, value in samples]
+    return [(t, breach["sustained_seconds"]) for t, breach in fired if breach]
+
+
+def test_single_dip_does_not_restart_a_sustained_breach():
+    samples = [(t, 95) for t in range(0, 360, 60)]
+    samples[2] = (120, 85)
+    assert cpu_breach(samples) == [(300, 300)]
+
+
+def test_gap_in_samples_restarts_the_breach():
+    samples = [(0, 95), (60, 95), (400, 95), (460, 95), (520, 95), (580, 95), (640, 95), (700, 95)]
+    assert cpu_breach(samples) == [(700, 300)]
@@ -0,0 +1,25 @@
+from pattern_matcher import MultiPatternMatcher
+from rule_compiler import RuleCompiler
+
+
+def test_overlapping_and_nested_literals_are_all_found():
+    matcher = MultiPatternMatcher(["oomkilled", "killed", "oom", "mkil", "crashloopbackoff", ""])
+    assert matcher.find("container oomkilled") == {"oomkilled", "killed", "oom", "mkil"}
+    assert matcher.find("nothing to see") == set()
+
+
+def test_empty_matcher_finds_nothing():
+    assert MultiPatternMatcher([]).find("oomkilled") == frozenset()
+
+
+def test_rule_set_matches_every_rule_of_a_source_in_one_scan():
+    compiler = RuleCompiler()
+    compiler.update([
+        {"_id": "r1", "data_source": "eks", "condition": "Pod status = OOMKilled"},
+        {"_id": "r2", "data_source": "eks", "condition": "Pod status = CrashLoopBackOff"},
+        {"_id": "r3", "data_source": "eks", "condition": "Logs contain 'Back-off restarting failed container'"},
+    ])
+    rules = compiler.rule_set("eks")
+    message = '{"reason": "OOMKilled", "message": "Back-off restarting failed container app"}'
+    assert sorted(rule.rule_id for rule in rules.match(message)) == ["r1", "r3"]
+    assert rules.match("Normal Scheduled pod") == []
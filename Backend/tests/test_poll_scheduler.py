@@ -0,0 +1,48 @@
+from poll_scheduler import PollScheduler, real_time_sources
+
+# As saved by the rules API, which turns real_time on unless the rule says otherwise
+DEFAULT_RULES = [{"data_source": "windows", "condition": "Event ID = 7000", "real_time": True}]
+
+
+def test_idle_source_with_default_rules_backs_off():
+    scheduler = PollScheduler(base_interval=10, max_interval=120, real_time_interval=2)
+    scheduler.set_real_time("windows", "windows" in real_time_sources(DEFAULT_RULES, enabled=False))
+    for _ in range(4):
+        scheduler.record("windows", 0)
+    assert scheduler.get_cadence()["windows"]["interval_seconds"] == 120
+
+
+def test_real_time_rules_cap_the_interval_once_enabled():
+    scheduler = PollScheduler(base_interval=10, max_interval=120, real_time_interval=2)
+    scheduler.set_real_time("windows", "windows" in real_time_sources(DEFAULT_RULES, enabled=True))
+    scheduler.record("windows", 0)
+    assert scheduler.get_cadence()["windows"]["interval_seconds"] == 2
+
+
+def test_finding_events_tightens_the_interval():
+    scheduler = PollScheduler(base_interval=10, min_interval=2, max_interval=120)
+    scheduler.record("eks", 3)
+    assert scheduler.interval("eks") == 5
+    scheduler.record("eks", 1)
+    assert scheduler.interval("eks") == 2.5
+    cadence = scheduler.get_cadence()["eks"]
+    assert cadence["last_found"] == 1 and cadence["idle_passes"] == 0 and cadence["polls"] == 2
+
+
+def test_busy_source_after_backing_off_tightens_from_the_base_interval():
+    scheduler = PollScheduler(base_interval=10, min_interval=2, max_interval=120)
+    for _ in range(5):
+        scheduler.record("eks", 0)
+    assert scheduler.interval("eks") == 120
+    scheduler.record("eks", 4)
+    assert scheduler.interval("eks") == 5
+
+
+def test_interval_never_drops_below_min_interval():
+    scheduler = PollScheduler(base_interval=10, min_interval=2, max_interval=120)
+    intervals = []
+    for _ in range(6):
+        scheduler.record("eks", 50)
+        intervals.append(scheduler.interval("eks"))
+    assert intervals == [5, 2.5, 2, 2, 2, 2]
+    assert scheduler.get_cadence()["eks"]["next_poll_in_seconds"] <= 2
@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError
+from rate_governor import DEFAULT_RATES, RateGovernor
+
+
+def test_share_splits_every_quota():
+    governor = RateGovernor()
+    existing = governor.bucket("FilterLogEvents", "us-east-1")
+    governor.set_share(0.25)
+    assert existing.rate == existing.max_rate == DEFAULT_RATES["FilterLogEvents"] * 0.25
+    assert governor.bucket("PutLogEvents", "us-east-1").max_rate == DEFAULT_RATES["PutLogEvents"] * 0.25
+    governor.set_share(0.5)
+    assert existing.max_rate == DEFAULT_RATES["FilterLogEvents"] * 0.5
+
+
+class FlakyClient:
+    """Fails filter_log_events with each queued error in turn, then succeeds."""
+    meta = SimpleNamespace(method_to_api_mapping={"filter_log_events": "FilterLogEvents"}, region_name="us-east-1")
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def filter_log_events(self, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return {"events": []}
+
+
+def client_error(code, status):
+    return ClientError({"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status}}, "FilterLogEvents")
+
+
+def test_transient_errors_are_retried_without_lowering_the_rate():
+    governor = RateGovernor(base_backoff=0)
+    client = FlakyClient(EndpointConnectionError(endpoint_url="https://logs.us-east-1.amazonaws.com"), client_error("InternalFailure", 500))
+    assert governor.call(client, "filter_log_events", logGroupName="group") == {"events": []}
+    assert client.calls == 3
+    assert governor.bucket("FilterLogEvents", "us-east-1").rate == DEFAULT_RATES["FilterLogEvents"]
+
+
+def test_client_errors_are_not_retried():
+    governor = RateGovernor(base_backoff=0)
+    client = FlakyClient(client_error("ResourceNotFoundException", 400))
+    with pytest.raises(ClientError):
+        governor.call(client, "filter_log_events", logGroupName="group")
+    assert client.calls == 1
@@ -0,0 +1,40 @@
+import json
+from replay import LocalLogsClient, load_capture
+
+
+def recorded(*timestamps):
+    return [{"timestamp": ts, "message": f"event {ts}", "eventId": str(ts), "logStreamName": "replay"} for ts in timestamps]
+
+
+def read_all(client, **kwargs):
+    pages, token = [], None
+    while True:
+        response = client.filter_log_events(logGroupName="/windows/system", nextToken=token, **kwargs)
+        pages.append([event["timestamp"] for event in response["events"]])
+        token = response.get("nextToken")
+        if not token:
+            return pages
+
+
+def test_pages_follow_on_from_the_token_in_timestamp_order():
+    client = LocalLogsClient({"/windows/system": recorded(400, 100, 300, 200, 500)})
+    assert read_all(client, limit=2) == [[100, 200], [300, 400], [500]]
+    assert client.calls == 3
+
+
+def test_time_range_bounds_the_pages():
+    client = LocalLogsClient({"/windows/system": recorded(100, 200, 300, 400, 500)})
+    assert read_all(client, startTime=150, endTime=400, limit=2) == [[200, 300], [400]]
+    assert read_all(client, startTime=600) == [[]]
+
+
+def test_capture_accepts_events_and_responses(tmp_path):
+    capture = tmp_path / "capture.jsonl"
+    lines = [
+        {"timestamp": 100, "message": "EventID: 7003", "logGroupName": "/windows/system"},
+        {"events": [{"timestamp": 200, "message": "EventID: 7000", "eventId": "e2"}]},
+    ]
+    capture.write_text("\n".join(json.dumps(line) for line in lines) + "\n\n", encoding="utf-8")
+    events = load_capture([str(capture)], "replay")
+    assert [e["eventId"] for e in events["/windows/system"]] == ["capture.jsonl:1:0"]
+    assert events["replay"] == [{"timestamp": 200, "message": "EventID: 7000", "eventId": "e2", "logStreamName": "replay"}]
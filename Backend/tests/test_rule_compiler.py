@@ -0,0 +1,112 @@
+from event_decoder import LazyEvent
+from rule_compiler import DEFAULT_REPEAT_WINDOW, AllWords, Contains, CountThreshold, FieldCompare, RuleCompiler, SustainedThreshold, compile_condition, parse_value
+
+
+def test_editing_a_rule_action_recompiles_it():
+    rule = {"_id": "r1", "data_source": "eks", "condition": "Pod status = OOMKilled", "name": "OOM", "action": "Send email", "priority": "Low"}
+    compiler = RuleCompiler()
+    assert compiler.update([rule])
+    edited = dict(rule, name="OOM kill", action="Trigger ErrorAnalyzer", priority="High")
+    assert compiler.update([edited])
+    compiled = compiler.rules_for("eks")[0]
+    assert (compiled.name, compiled.action, compiled.priority) == ("OOM kill", "Trigger ErrorAnalyzer", "High")
+    assert not compiler.update([dict(edited)])
+
+
+def matches(data_source, condition, message):
+    predicate, _ = compile_condition(data_source, condition)
+    return predicate(message, message.lower(), LazyEvent(message))
+
+
+def test_windowed_count():
+    predicate, aggregation = compile_condition("eks", "Pod crash count > 2 in 5 minutes")
+    assert isinstance(predicate, Contains) and predicate.spellings == ["CrashLoopBackOff"]
+    assert isinstance(aggregation, CountThreshold)
+    assert (aggregation.op, aggregation.count, aggregation.window_seconds) == (">", 2, 300)
+    assert not aggregation.tripped(2) and aggregation.tripped(3)
+    predicate, aggregation = compile_condition("linux", "Failed login 5 times in 1 hour")
+    assert isinstance(predicate, AllWords) and predicate.words == ["failed", "login"]
+    assert (aggregation.op, aggregation.count, aggregation.window_seconds) == (">=", 5, 3600)
+
+
+def test_repeated_count_defaults_to_a_day():
+    predicate, aggregation = compile_condition("windows", "Windows Update fails > 3 times")
+    assert isinstance(predicate, FieldCompare) and predicate.values == {"20"}
+    assert (aggregation.op, aggregation.count, aggregation.window_seconds) == (">", 3, DEFAULT_REPEAT_WINDOW)
+
+
+def test_sustained_numeric_metric():
+    predicate, aggregation = compile_condition("eks", "CPU usage > 90% for 5 minutes")
+    assert predicate is None
+    assert isinstance(aggregation, SustainedThreshold)
+    assert (aggregation.metric, aggregation.op, aggregation.value, aggregation.duration_seconds) == ("cpu usage", ">", 90.0, 300)
+    assert aggregation.breached(90.5) and not aggregation.breached(90)
+    event = LazyEvent('{"pod_cpu_utilization": 93.5, "PodName": "api-1"}')
+    assert aggregation.sampler.sample(event.raw, event) == 93.5
+    assert aggregation.sampler.entity(event) == "api-1"
+    assert aggregation.sampler.sample("cpu_usage=97%", LazyEvent("cpu_usage=97%")) == 97.0
+
+
+def test_sustained_state():
+    predicate, aggregation = compile_condition("eks", "Node status = NotReady for > 2 minutes")
+    assert isinstance(predicate, Contains) and predicate.spellings == ["NotReady"]
+    assert aggregation.duration_seconds == 120 and aggregation.sampler is None
+
+
+def test_contains_keeps_the_quoted_text():
+    predicate, aggregation = compile_condition("linux", "Syslog contains 'Out of Memory'")
+    assert isinstance(predicate, Contains) and predicate.spellings == ["Out of Memory"] and aggregation is None
+    assert matches("linux", "Syslog contains 'Out of Memory'", "kernel: out of memory: Killed process 1234")
+
+
+def test_field_comparison():
+    assert matches("databricks", "Query status = FAILED", '{"status": "FAILED"}')
+    assert not matches("databricks", "Query status = FAILED", '{"status": "SUCCEEDED"}')
+    assert matches("databricks", "Query status != SUCCEEDED", '{"status": "FAILED"}')
+    assert not matches("databricks", "Query status != SUCCEEDED", '{"status": "SUCCEEDED"}')
+    # A field the message does not carry never matches, whatever the operator
+    assert not matches("databricks", "Query status != SUCCEEDED", '{"query_id": "q1"}')
+    # Query duration is in milliseconds in the record and in seconds in the condition
+    predicate, aggregation = compile_condition("snowflake", "Query duration > 30 seconds")
+    assert predicate.number == 30.0 and aggregation is None
+    assert matches("snowflake", "Query duration > 30 seconds", '{"QUERY_HISTORY": {"TOTAL_ELAPSED_TIME": 45000}}')
+    assert not matches("snowflake", "Query duration > 30 seconds", '{"QUERY_HISTORY": {"TOTAL_ELAPSED_TIME": 12000}}')
+
+
+def test_unknown_field_falls_back_to_contains():
+    predicate, _ = compile_condition("eks", "Pod status = ImagePullBackOff/ErrImagePull")
+    assert isinstance(predicate, Contains) and predicate.spellings == ["ImagePullBackOff", "ErrImagePull"]
+    assert matches("eks", "Pod status = ImagePullBackOff", 'Back-off pulling image: reason "ImagePullBackOff"')
+
+
+def test_event_phrases():
+    predicate, _ = compile_condition("windows", "Service stops unexpectedly")
+    assert isinstance(predicate, FieldCompare) and predicate.values == {"7031", "7034"}
+    assert matches("windows", "Event ID 4625 detected", '{"EventID": 4625}')
+    assert not matches("windows", "Event ID 4625 detected", '{"EventID": 4624}')
+    predicate, aggregation = compile_condition("linux", "Kernel panic detected")
+    assert isinstance(predicate, AllWords) and predicate.words == ["kernel", "panic"] and aggregation is None
+    assert matches("linux", "Kernel panic detected", "Kernel panic - not syncing")
+    assert not matches("linux", "Kernel panic detected", "kernel: oops")
+
+
+def test_parse_value_units_and_percentages():
+    assert parse_value("90%") == 90.0
+    assert parse_value("2.5") == 2.5
+    assert parse_value("30 seconds") == 30.0
+    assert parse_value("2 mins") == 120.0
+    assert parse_value("1.5 hours") == 5400.0
+    assert parse_value("'Pending/Unknown'") == ["Pending", "Unknown"]
+
+
+def test_rules_that_fail_to_parse_are_dropped(caplog):
+    compiler = RuleCompiler()
+    compiler.update([
+        {"_id": "r1", "data_source": "linux", "condition": "the event"},
+        {"_id": "r2", "data_source": "linux", "condition": None},
+        {"_id": "r3", "data_source": "linux", "condition": "Kernel panic detected"},
+    ])
+    assert compile_condition("linux", "the event") == (None, None)
+    assert [rule.rule_id for rule in compiler.rule_set("linux").rules] == ["r3"]
+    assert "Failed to compile rule condition 'None'" in caplog.text
+    assert "Rule condition 'the event' for linux has no event predicate" in caplog.text
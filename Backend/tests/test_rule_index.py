@@ -0,0 +1,48 @@
+from rule_index import ActiveRuleIndex
+
+
+class RulesCollection:
+    """Answers find() with the active rules of a fixed document list."""
+    def __init__(self, documents):
+        self.documents = documents
+
+    def find(self, query, projection=None):
+        return [doc for doc in self.documents if doc.get("status") == query.get("status")]
+
+
+def rule(rule_id, status="Active", condition="Pod status = OOMKilled"):
+    return {"_id": rule_id, "data_source": "eks", "condition": condition, "status": status}
+
+
+def indexed(*documents):
+    index = ActiveRuleIndex(RulesCollection(list(documents)))
+    changes = []
+    index.add_listener(lambda: changes.append(index.version))
+    index.load()
+    return index, changes
+
+
+def test_load_keeps_only_active_rules():
+    index, changes = indexed(rule("r1"), rule("r2", status="Inactive"))
+    assert [r["_id"] for r in index.active_rules()] == ["r1"]
+    assert changes == [1]
+    assert not index.load()
+
+
+def test_change_events_update_the_index_in_place():
+    index, changes = indexed(rule("r1"))
+    index._apply({"operationType": "insert", "documentKey": {"_id": "r2"}, "fullDocument": rule("r2")})
+    index._apply({"operationType": "update", "documentKey": {"_id": "r1"}, "fullDocument": rule("r1", status="Inactive"),
+                  "updateDescription": {"updatedFields": {"status": "Inactive"}}})
+    assert [r["_id"] for r in index.active_rules()] == ["r2"]
+    index._apply({"operationType": "delete", "documentKey": {"_id": "r2"}})
+    assert index.active_rules() == []
+    assert changes == [1, 2, 3, 4]
+
+
+def test_bookkeeping_updates_do_not_notify():
+    index, changes = indexed(rule("r1"))
+    index._apply({"operationType": "update", "documentKey": {"_id": "r1"}, "fullDocument": rule("r1"),
+                  "updateDescription": {"updatedFields": {"last_triggered": "2024-01-01T00:00:00Z"}}})
+    index._apply({"operationType": "delete", "documentKey": {"_id": "unknown"}})
+    assert changes == [1]
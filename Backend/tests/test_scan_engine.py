@@ -0,0 +1,70 @@
+import asyncio
+import logging
+from scan_engine import ScanEngine
+
+
+class SlowMonitor:
+    config = {}
+
+    def get_recent_log_groups(self, prefix):
+        return ["group-a"]
+
+    async def search_errors(self, log_group):
+        await asyncio.sleep(0.05)
+        return 1
+
+
+def run_pass(interval):
+    engine = ScanEngine(logging.getLogger("MONITOR"))
+    try:
+        return asyncio.run(engine.run_pass({"windows": SlowMonitor()}, interval=interval))
+    finally:
+        engine.shutdown()
+
+
+def test_pass_slower_than_the_current_interval_is_logged(caplog):
+    with caplog.at_level(logging.WARNING, logger="MONITOR"):
+        stats = run_pass(interval=0.01)
+    assert stats["events"] == {"windows": 1}
+    assert "polling interval" in caplog.text
+
+
+def test_pass_within_the_current_interval_is_not_logged(caplog):
+    with caplog.at_level(logging.WARNING, logger="MONITOR"):
+        run_pass(interval=120)
+    assert "polling interval" not in caplog.text
+
+
+class CountingMonitor:
+    """Tracks how many of its log groups are being scanned at the same time."""
+    config = {}
+
+    def __init__(self, groups, tracker):
+        self.groups = groups
+        self.tracker = tracker
+
+    def get_recent_log_groups(self, prefix):
+        return self.groups
+
+    async def search_errors(self, log_group):
+        self.tracker["active"] += 1
+        self.tracker["peak"] = max(self.tracker["peak"], self.tracker["active"])
+        await asyncio.sleep(0.01)
+        self.tracker["active"] -= 1
+        return 2
+
+
+def test_groups_of_every_source_are_scanned_concurrently_up_to_the_limit():
+    tracker = {"active": 0, "peak": 0}
+    monitors = {
+        "windows": CountingMonitor([f"win-{i}" for i in range(6)], tracker),
+        "eks": CountingMonitor([f"eks-{i}" for i in range(6)], tracker),
+    }
+    engine = ScanEngine(logging.getLogger("MONITOR"), max_concurrency=4)
+    try:
+        stats = asyncio.run(engine.run_pass(monitors))
+    finally:
+        engine.shutdown()
+    assert tracker["peak"] == 4
+    assert stats["log_groups"] == 12
+    assert stats["events"] == {"windows": 12, "eks": 12}
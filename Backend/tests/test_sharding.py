@@ -0,0 +1,144 @@
+import logging
+import math
+import queue
+from collections import Counter
+from types import SimpleNamespace
+import sharding
+from monitor import MonitorAgent, SnowflakeMonitor
+from sharding import HashRing, ShardAssignment, ShardLink, ShardSupervisor
+
+KEYS = [f"windows\t/windows/host-{i}" for i in range(1000)]
+
+
+def ring(count):
+    return HashRing([str(member) for member in range(count)])
+
+
+def test_assignment_stays_within_the_load_factor():
+    for members in (3, 4, 7):
+        loads = Counter(ring(members).assign(KEYS, load_factor=1.25).values())
+        assert sum(loads.values()) == len(KEYS)
+        assert max(loads.values()) <= math.ceil(len(KEYS) / members * 1.25)
+
+
+def test_adding_a_shard_only_moves_keys_onto_it():
+    before, after = ring(4).assign(KEYS), ring(5).assign(KEYS)
+    moved = [key for key in KEYS if before[key] != after[key]]
+    assert moved and all(after[key] == "4" for key in moved)
+    assert len(moved) <= math.ceil(len(KEYS) / 5 * 1.25)
+
+
+def test_removing_a_shard_only_moves_its_keys():
+    before, after = ring(4).assign(KEYS), ring(3).assign(KEYS)
+    assert all(before[key] == "3" for key in KEYS if before[key] != after[key])
+
+
+class FakeProcess:
+    def __init__(self, target, args, name, daemon):
+        self.args = args
+        self.alive = False
+        self.exitcode = None
+
+    def start(self):
+        self.alive = True
+
+    def is_alive(self):
+        return self.alive
+
+
+class FakeContext:
+    """Stands in for the spawn context, so workers are recorded instead of started."""
+    def __init__(self):
+        self.processes = []
+
+    def Queue(self):
+        return queue.Queue()
+
+    def Process(self, **kwargs):
+        process = FakeProcess(**kwargs)
+        self.processes.append(process)
+        return process
+
+
+def supervisor(shards=3):
+    supervisor = ShardSupervisor(shards, "semi-autonomous", handler=None, loop=None, snowflake_enabled=True)
+    supervisor.context = FakeContext()
+    for shard in range(shards):
+        supervisor._start_worker(shard)
+    return supervisor
+
+
+def drain(control):
+    messages = []
+    while not control.empty():
+        messages.append(control.get_nowait())
+    return messages
+
+
+def test_rebalance_sends_only_changed_assignments():
+    shards = supervisor()
+    groups = [f"/windows/host-{i}" for i in range(30)]
+    shards.rebalance({"windows": groups})
+    first = {shard: drain(control) for shard, (_, control) in shards.workers.items()}
+    assert sorted(group for messages in first.values() for message in messages for group in message["windows"]) == sorted(groups)
+    shards.rebalance({"windows": groups + ["/windows/host-new"]})
+    resent = {shard: drain(control) for shard, (_, control) in shards.workers.items()}
+    assert sum(len(messages) for messages in resent.values()) == 1
+    assert shards.stats["moved_groups"] == 1
+
+
+def test_exited_worker_restarts_with_its_assignment_and_rate_share():
+    shards = supervisor()
+    shards.rebalance({"windows": [f"/windows/host-{i}" for i in range(30)]})
+    shards.set_rate_share(0.5)
+    process, _ = shards.workers[1]
+    process.alive = False
+    shards.check_workers()
+    restarted, control = shards.workers[1]
+    assert restarted is not process and restarted.alive
+    assert restarted.args[:4] == (1, 3, "semi-autonomous", True)
+    assert drain(control) == [0.5 / 3, shards.assignment[1]]
+    assert shards.stats["restarts"] == 1
+
+
+def test_assignment_messages_update_groups_rate_share_and_stop(monkeypatch):
+    shares = []
+    monkeypatch.setattr(sharding.governor, "set_share", shares.append)
+    control, changes = queue.Queue(), []
+    assignment = ShardAssignment(control, on_change=lambda: changes.append(assignment.snapshot()))
+    assignment.start()
+    control.put(0.25)
+    control.put({"windows": ["/windows/a", "/windows/b"]})
+    control.put(None)
+    assignment.thread.join(timeout=5)
+    assert shares == [0.25]
+    assert assignment.ready.is_set() and assignment.stopped.is_set()
+    assert changes[0] == {"windows": {"/windows/a", "/windows/b"}}
+    assert assignment.filter("windows", ["/windows/b", "/windows/c"]) == ["/windows/b"]
+    assert assignment.filter("eks", ["/aws/eks/x"]) == []
+
+
+def test_semi_autonomous_worker_keeps_snowflake_enabled(monkeypatch):
+    monkeypatch.setattr("monitor.governor.set_share", lambda share: None)
+    agent = MonitorAgent.__new__(MonitorAgent)
+    snowflake = SnowflakeMonitor.__new__(SnowflakeMonitor)
+    snowflake.snowflake_enabled = False  # What a worker without an analyzer starts with
+    agent.service_monitors = {"snowflake": snowflake}
+    agent.scan_engine = SimpleNamespace(partition=None)
+    assignment = SimpleNamespace(start=lambda: None, filter=lambda source, groups: groups)
+    agent.join_shard(ShardLink(queue.Queue(), 0, snowflake_enabled=True), assignment, rate_share=0.5)
+    assert snowflake.snowflake_enabled
+
+
+def test_autonomous_worker_takes_snowflake_from_the_flag_not_a_connection(monkeypatch):
+    monkeypatch.setattr("monitor.governor.set_share", lambda share: None)
+    link = ShardLink(queue.Queue(), 0, snowflake_enabled=True)
+    assert not hasattr(link, "snowflake_conn")
+    # The link stands in for the analyzer of autonomous workers
+    snowflake = SnowflakeMonitor({"region": "us-east-1"}, logging.getLogger("test"), link, link, link, "autonomous")
+    assert not snowflake.snowflake_enabled
+    agent = MonitorAgent.__new__(MonitorAgent)
+    agent.service_monitors = {"snowflake": snowflake}
+    agent.scan_engine = SimpleNamespace(partition=None)
+    agent.join_shard(link, SimpleNamespace(start=lambda: None, filter=lambda source, groups: groups), rate_share=0.5)
+    assert snowflake.snowflake_enabled
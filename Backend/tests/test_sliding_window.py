@@ -0,0 +1,35 @@
+from types import SimpleNamespace
+from rule_compiler import CountThreshold
+from sliding_window import BucketedCounter, SlidingWindowEngine, WindowedRuleEvaluator
+
+
+def test_counter_drops_events_that_slide_out_of_the_window():
+    counter = BucketedCounter(window_seconds=60, buckets=6)
+    for timestamp in (0, 15, 30):
+        counter.add(timestamp)
+    assert counter.count(59) == 3
+    assert counter.count(75) == 1
+    assert counter.count(200) == 0
+
+
+def test_counter_ignores_events_older_than_the_window():
+    counter = BucketedCounter(window_seconds=60, buckets=6)
+    counter.add(300)
+    assert counter.add(100) == 1
+
+
+def test_engine_evicts_the_least_recently_used_key_beyond_the_limit():
+    engine = SlidingWindowEngine(max_keys=2)
+    engine.record("r1", "pod-a", 60, timestamp=0)
+    engine.record("r1", "pod-b", 60, timestamp=1)
+    engine.record("r1", "pod-a", 60, timestamp=2)
+    engine.record("r1", "pod-c", 60, timestamp=3)
+    assert set(engine.counters) == {("r1", "pod-a"), ("r1", "pod-c")}
+    assert engine.get_stats()["evicted"] == 1
+
+
+def test_rule_trips_once_per_burst():
+    evaluator = WindowedRuleEvaluator()
+    rule = SimpleNamespace(rule_id="r1", aggregation=CountThreshold(">", 2, 300))
+    observed = [evaluator.observe(rule, "demo-app/api-1", timestamp) for timestamp in (0, 10, 20, 30)]
+    assert observed == [None, None, 3, None]
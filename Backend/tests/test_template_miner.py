@@ -0,0 +1,43 @@
+from template_miner import WILDCARD, IncidentFolder, TemplateMiner
+
+
+def test_variable_fragments_are_masked_before_tokenizing():
+    tokens = TemplateMiner().tokenize("Request 6f1c1f0e-0000-4000-8000-000000000000 from 10.0.0.12:443 failed after 30s")
+    assert tokens == ["Request", WILDCARD, "from", WILDCARD, "failed", "after", WILDCARD]
+
+
+def test_messages_differing_in_a_value_share_a_generalised_template():
+    miner = TemplateMiner()
+    first = miner.add("Service Spooler depends on FakeService which failed to start")
+    second = miner.add("Service Spooler depends on OtherService which failed to start")
+    assert second is first
+    assert first.size == 2
+    assert first.template_text == f"Service Spooler depends on {WILDCARD} which failed to start"
+    assert miner.add("Kernel panic detected") is not first
+
+
+def test_repeats_within_the_window_fold_into_one_incident_per_entity():
+    folder = IncidentFolder(window_seconds=600)
+    incident, is_new = folder.fold("eks", "Container app in pod demo-app/api-1 killed due to OutOfMemory", 0, entity="demo-app/api-1")
+    repeat, repeat_new = folder.fold("eks", "Container app in pod demo-app/api-1 killed due to OutOfMemory", 60, entity="demo-app/api-1")
+    other, other_new = folder.fold("eks", "Container app in pod demo-app/api-1 killed due to OutOfMemory", 61, entity="demo-app/api-2")
+    assert is_new and not repeat_new and other_new
+    assert repeat is incident and incident.occurrences == 2
+    assert other.reference != incident.reference
+
+
+def test_repeat_after_the_window_opens_a_new_incident():
+    folder = IncidentFolder(window_seconds=600)
+    first, _ = folder.fold("windows", "EventID: 7003 Spooler", 0)
+    later, is_new = folder.fold("windows", "EventID: 7003 Spooler", 601)
+    assert is_new and later is not first
+    assert folder.get_stats()["incidents"] == 2
+
+
+def test_open_incidents_report_their_folded_occurrences():
+    folder = IncidentFolder(window_seconds=600, max_open=1)
+    incident, _ = folder.fold("eks", "Container app in pod demo-app/api-1 killed due to OutOfMemory", 0, entity="demo-app/api-1")
+    folder.fold("eks", "Container app in pod demo-app/api-1 killed due to OutOfMemory", 10, entity="demo-app/api-1")
+    assert folder.occurrences(incident.reference) == 2
+    folder.fold("windows", "EventID: 7003 Spooler", 20)  # Evicts the pod's incident
+    assert folder.occurrences(incident.reference) is None
@@ -0,0 +1,30 @@
+import json
+from monitor import KubernetesMonitor, WindowsMonitor
+
+
+def monitor(cls):
+    return cls.__new__(cls)  # window_key needs no monitor state
+
+
+def audit_event(namespace, pod):
+    return {"message": json.dumps({"objectRef": {"namespace": namespace, "name": pod}, "requestObject": {}})}
+
+
+def test_pods_do_not_share_a_window():
+    key = monitor(KubernetesMonitor).window_key
+    first = key("/k8s/audit", audit_event("demo-app", "api-1"))
+    second = key("/k8s/audit", audit_event("demo-app", "worker-1"))
+    assert first == "demo-app/api-1"
+    assert first != second
+    assert key("/k8s/audit", audit_event("demo-app", "api-1")) == first
+
+
+def test_computers_do_not_share_a_window():
+    key = monitor(WindowsMonitor).window_key
+    first = key("/windows/system", {"message": json.dumps({"EventID": 7000, "ComputerName": "HOST-1"})})
+    second = key("/windows/system", {"message": json.dumps({"EventID": 7000, "ComputerName": "HOST-2"})})
+    assert first != second
+
+
+def test_events_without_the_fields_count_per_log_group():
+    assert monitor(WindowsMonitor).window_key("/windows/system", {"message": "not json"}) == "/windows/system"